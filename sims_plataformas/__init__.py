@@ -0,0 +1,20 @@
+"""Núcleo de carga y homologación de datos de plataformas y SIMs.
+
+No depende de Streamlit, así que puede usarse desde streamlit_app.py, desde la
+línea de comandos (``python -m sims_plataformas ingest ...``) o desde cualquier
+otro proceso:
+
+- sims_plataformas.plataformas: Excel de plataformas -> tabla 'datos'.
+- sims_plataformas.sims: Excel/CSV de operadores -> tabla 'sims'.
+- sims_plataformas.storage: conexiones de carga masiva, escritura concurrente e índices de consulta.
+- sims_plataformas.records: almacén columnar compacto para las filas que una carga conserva en memoria.
+- sims_plataformas.history: historial incremental (versiones con valid_from/valid_to).
+- sims_plataformas.browser: consultas paginadas y filtros en SQL para la interfaz.
+- sims_plataformas.export: exportación a Parquet particionado por plataforma u operador.
+- sims_plataformas.reconcile: conciliación de SIMs contra plataformas.
+- sims_plataformas.ledger: registro de archivos ya cargados (no se procesan dos veces).
+- sims_plataformas.jobs: cargas en segundo plano con progreso y cancelación.
+- sims_plataformas.metrics: tiempos por etapa, filas/s, memoria residente por etapa y perfil opcional.
+- sims_plataformas.synthetic y sims_plataformas.bench: archivos sintéticos y benchmarks con línea base.
+- sims_plataformas.log: logging por ejecución.
+"""
@@ -0,0 +1,383 @@
+"""Benchmarks de las rutas de carga de plataformas y SIMs sobre archivos sintéticos (ver synthetic).
+
+Hay casos por etapa (mapeo, lectura de CSV, limpieza, inserción) y de punta a punta. Cada
+caso corre en un proceso nuevo, así que su memoria pico (ru_maxrss) no arrastra la de los
+casos anteriores; esa memoria incluye la preparación de la entrada (p. ej. el lote limpio
+que recibe la inserción), que no cuenta en el tiempo. Los resultados se comparan con una
+línea base en JSON: un caso es regresión si su tiempo o su memoria superan los de la base
+en más de `tolerance`.
+
+Los microbenchmarks de proyección de filas (plataformas.proyeccion y su referencia
+plataformas.proyeccion_dict, el mapeo con diccionarios por fila) generan las filas en memoria
+por bloques, fuera del tiempo medido, y no necesitan los archivos sintéticos: su costo por
+fila es 1 / rows_per_s. Del mismo modo sims.limpieza_filas mide la limpieza fila por fila que
+reemplazó clean_sims_columns, con la misma entrada que sims.limpieza, y
+plataformas.insercion_filas la inserción con un execute por fila que bulk_insert_data_plataformas
+reemplazó por un executemany, con los mismos lotes que plataformas.insercion. La diferencia
+entre las dos depende de los duplicados (--duplicates): los lotes sin ninguno no necesitan la
+consulta que los separa.
+
+Uso:
+    python -m sims_plataformas bench --rows 10000 100000 --save-baseline
+    python -m sims_plataformas bench --rows 10000 100000     # compara con la base
+"""
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .log import logger
+from .metrics import peak_rss_mb
+
+bench_data_dir = 'bench_data'
+baseline_path = 'bench_baseline.json'
+default_bench_rows = [10000, 100000, 1000000]
+default_tolerance = 0.2
+# Filas por bloque en los microbenchmarks de proyección
+projection_chunk_rows = 100000
+
+def _case_plataformas_mapeo(paths, db_path):
+    from .plataformas import default_mappings_plataformas, process_excel_file_plataformas
+
+    with open(paths['plataformas'], 'rb') as excel_file:
+        start = time.perf_counter()
+        _, _, total_records = process_excel_file_plataformas(excel_file, default_mappings_plataformas)
+    return time.perf_counter() - start, total_records
+
+def _case_plataformas_insercion(paths, db_path):
+    from .plataformas import (
+        default_mappings_plataformas, default_batch_size_plataformas, create_database_plataformas,
+        process_excel_file_plataformas, bulk_insert_data_plataformas
+    )
+    from .storage import connect
+
+    with open(paths['plataformas'], 'rb') as excel_file:
+        data, _, _ = process_excel_file_plataformas(excel_file, default_mappings_plataformas)
+    create_database_plataformas(db_path)
+    conn = connect(db_path)
+    try:
+        start = time.perf_counter()
+        for offset in range(0, len(data), default_batch_size_plataformas):
+            bulk_insert_data_plataformas(conn, data[offset:offset + default_batch_size_plataformas])
+        return time.perf_counter() - start, len(data)
+    finally:
+        conn.close()
+
+def _insert_row_wise(conn, data):
+    # Inserción anterior a bulk_insert_data_plataformas (un execute por fila, con los duplicados
+    # separados por IntegrityError), como referencia del caso plataformas.insercion; recibe las
+    # mismas columnas de epoch y usa la misma transacción por lote
+    import sqlite3
+    from .plataformas import columns_plataformas, epoch_columns_plataformas, timestamp_epochs_plataformas
+    from .storage import write_transaction
+
+    columns = columns_plataformas + epoch_columns_plataformas
+    sql = f"INSERT INTO datos ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    epochs = timestamp_epochs_plataformas(data, {})
+    inserted = []
+    not_inserted = []
+    cursor = conn.cursor()
+    with write_transaction(conn):
+        for record, record_epochs in zip(data, epochs):
+            try:
+                cursor.execute(sql, tuple(record) + record_epochs)
+                inserted.append(record)
+            except sqlite3.IntegrityError:
+                not_inserted.append(record)
+    return inserted, not_inserted
+
+def _case_plataformas_insercion_filas(paths, db_path):
+    from .plataformas import (
+        default_mappings_plataformas, default_batch_size_plataformas, create_database_plataformas,
+        process_excel_file_plataformas
+    )
+    from .storage import connect
+
+    with open(paths['plataformas'], 'rb') as excel_file:
+        data, _, _ = process_excel_file_plataformas(excel_file, default_mappings_plataformas)
+    create_database_plataformas(db_path)
+    conn = connect(db_path)
+    try:
+        start = time.perf_counter()
+        for offset in range(0, len(data), default_batch_size_plataformas):
+            _insert_row_wise(conn, data[offset:offset + default_batch_size_plataformas])
+        return time.perf_counter() - start, len(data)
+    finally:
+        conn.close()
+
+def _case_plataformas_completa(paths, db_path):
+    from .plataformas import default_mappings_plataformas, create_database_plataformas, load_excel_file_plataformas
+    from .storage import bulk_load
+
+    start = time.perf_counter()
+    create_database_plataformas(db_path)
+    with open(paths['plataformas'], 'rb') as excel_file, bulk_load(db_path, 'datos') as conn:
+        load = load_excel_file_plataformas(excel_file, default_mappings_plataformas, conn)
+    return time.perf_counter() - start, load['total_records']
+
+def _projection_chunks(paths):
+    """Genera (hoja, encabezados, filas) por bloques de projection_chunk_rows con las filas
+       sintéticas de plataformas, repartidas entre las hojas como en el Excel sintético."""
+    from .synthetic import platform_shares, plataformas_sheet_rows
+
+    params = dict(paths['params'])
+    rng = random.Random(params.pop('seed', 0))
+    for sheet, share in platform_shares.items():
+        sheet_rows = plataformas_sheet_rows(rng, sheet, int(paths['rows'] * share), **params)
+        headers = next(sheet_rows)
+        while True:
+            chunk = [tuple(row) for row in itertools.islice(sheet_rows, projection_chunk_rows)]
+            if not chunk:
+                break
+            yield sheet, headers, chunk
+
+def _case_plataformas_proyeccion(paths, db_path):
+    from .plataformas import default_mappings_plataformas, compile_mapping_plataformas
+
+    seconds = 0.0
+    rows = 0
+    projectors = {}
+    for sheet, headers, chunk in _projection_chunks(paths):
+        start = time.perf_counter()
+        if sheet not in projectors:
+            projectors[sheet] = compile_mapping_plataformas(headers, default_mappings_plataformas[sheet], '2024-05-03')
+        project = projectors[sheet]
+        records = [project(row) for row in chunk]
+        seconds += time.perf_counter() - start
+        rows += len(records)
+    return seconds, rows
+
+def _project_with_dicts(row, headers, mapping, fecha_archivo):
+    # Mapeo anterior a compile_mapping_plataformas (un dict por fila y otro por registro),
+    # como referencia del caso plataformas.proyeccion
+    from .plataformas import columns_plataformas, clean_telefono
+
+    row_dict = {headers[i]: (row[i] if i < len(row) else None) for i in range(len(headers))}
+    column_name = mapping.get('Cliente_Cuenta')
+    if not (row_dict.get(column_name) if column_name else None):
+        return None
+    record = {}
+    for field in columns_plataformas:
+        if field == 'Origen':
+            record[field] = mapping['Origen']
+        elif field == 'Fecha_Archivo':
+            record[field] = fecha_archivo
+        elif mapping.get(field):
+            value = row_dict.get(mapping[field])
+            record[field] = clean_telefono(value) if field == 'Telefono' else value
+        else:
+            record[field] = None
+    return tuple(record.values())
+
+def _case_plataformas_proyeccion_dict(paths, db_path):
+    from .plataformas import default_mappings_plataformas
+
+    seconds = 0.0
+    rows = 0
+    for sheet, headers, chunk in _projection_chunks(paths):
+        mapping = default_mappings_plataformas[sheet]
+        start = time.perf_counter()
+        records = [_project_with_dicts(row, headers, mapping, '2024-05-03') for row in chunk]
+        seconds += time.perf_counter() - start
+        rows += len(records)
+    return seconds, rows
+
+def _sims_csv_mapping(csv_path):
+    import pandas as pd
+    from .sims import resolve_mapping_sims
+
+    headers = pd.read_csv(csv_path, dtype=str, nrows=0).columns.tolist()
+    return resolve_mapping_sims(os.path.splitext(os.path.basename(csv_path))[0], headers)
+
+def _case_sims_excel(paths, db_path):
+    from .sims import read_workbook_sims, resolve_mapping_sims, process_excel_sims
+
+    rows = 0
+    with open(paths['sims_xlsx'], 'rb') as excel_file:
+        start = time.perf_counter()
+        workbook_data = read_workbook_sims(excel_file)
+        for sheet_name, sheet_data in workbook_data.items():
+            mapping = resolve_mapping_sims(sheet_name, sheet_data['headers'])
+            rows += len(process_excel_sims(excel_file, mapping, sheet_name, workbook_data=workbook_data))
+    return time.perf_counter() - start, rows
+
+def _case_sims_csv(paths, db_path):
+    from .sims import process_csv_sims
+
+    mapping = _sims_csv_mapping(paths['sims_csv'])
+    with open(paths['sims_csv'], 'rb') as csv_file:
+        start = time.perf_counter()
+        data = process_csv_sims(csv_file, mapping)
+    return time.perf_counter() - start, len(data)
+
+def _case_sims_limpieza(paths, db_path):
+    from .sims import process_csv_sims, clean_iccid_telefono_consumo
+
+    with open(paths['sims_csv'], 'rb') as csv_file:
+        data = process_csv_sims(csv_file, _sims_csv_mapping(paths['sims_csv']))
+    start = time.perf_counter()
+    clean_iccid_telefono_consumo(data)
+    return time.perf_counter() - start, len(data)
+
+def _clean_sims_row_wise(data):
+    # Limpieza fila por fila anterior a clean_sims_columns, como referencia del caso
+    # sims.limpieza (y de la prueba de paridad de la limpieza columnar)
+    cleaned_data = []
+    for row in data:
+        cleaned_row = list(row)
+        for position in (0, 1):
+            value = cleaned_row[position]
+            if isinstance(value, float) and value.is_integer():
+                text = str(int(value))
+            else:
+                text = str(value)
+            cleaned_row[position] = ''.join(filter(str.isdigit, text)) if text else ""
+        consumo = cleaned_row[4]
+        cleaned_row[4] = ''.join(filter(str.isdigit, str(consumo))) if consumo else ""
+        cleaned_row[2] = cleaned_row[2].strip().lower() if cleaned_row[2] else ""
+        cleaned_row[3] = cleaned_row[3].strip().lower() if cleaned_row[3] else ""
+        cleaned_data.append(tuple(cleaned_row))
+    return cleaned_data
+
+def _case_sims_limpieza_filas(paths, db_path):
+    from .sims import process_csv_sims
+
+    with open(paths['sims_csv'], 'rb') as csv_file:
+        data = process_csv_sims(csv_file, _sims_csv_mapping(paths['sims_csv']))
+    start = time.perf_counter()
+    _clean_sims_row_wise(data)
+    return time.perf_counter() - start, len(data)
+
+def _case_sims_insercion(paths, db_path):
+    from .sims import (
+        default_chunksize_sims, create_database_sims, process_csv_sims, clean_iccid_telefono_consumo,
+        bulk_insert_data_sims
+    )
+    from .storage import connect
+
+    with open(paths['sims_csv'], 'rb') as csv_file:
+        data = clean_iccid_telefono_consumo(process_csv_sims(csv_file, _sims_csv_mapping(paths['sims_csv'])))
+    create_database_sims(db_path)
+    conn = connect(db_path)
+    try:
+        start = time.perf_counter()
+        for offset in range(0, len(data), default_chunksize_sims):
+            bulk_insert_data_sims(conn, data[offset:offset + default_chunksize_sims])
+        return time.perf_counter() - start, len(data)
+    finally:
+        conn.close()
+
+def _case_sims_completa(paths, db_path):
+    from .sims import create_database_sims, read_workbook_sims, resolve_mapping_sims, load_file_sims
+    from .storage import bulk_load
+
+    rows = 0
+    start = time.perf_counter()
+    create_database_sims(db_path)
+    with open(paths['sims_xlsx'], 'rb') as excel_file, open(paths['sims_csv'], 'rb') as csv_file, \
+            bulk_load(db_path, 'sims') as conn:
+        workbook_data = read_workbook_sims(excel_file)
+        mapping = {
+            sheet_name: resolve_mapping_sims(sheet_name, sheet_data['headers'])
+            for sheet_name, sheet_data in workbook_data.items()
+        }
+        stats, _ = load_file_sims(excel_file, mapping, conn, workbook_data=workbook_data)
+        rows += sum(sheet_stats['processed'] for sheet_stats in stats['sheets'].values())
+        stats, _ = load_file_sims(csv_file, _sims_csv_mapping(paths['sims_csv']), conn)
+        rows += stats['processed']
+    return time.perf_counter() - start, rows
+
+bench_cases = {
+    'plataformas.proyeccion': _case_plataformas_proyeccion,
+    'plataformas.proyeccion_dict': _case_plataformas_proyeccion_dict,
+    'plataformas.mapeo': _case_plataformas_mapeo,
+    'plataformas.insercion': _case_plataformas_insercion,
+    'plataformas.insercion_filas': _case_plataformas_insercion_filas,
+    'plataformas.completa': _case_plataformas_completa,
+    'sims.excel': _case_sims_excel,
+    'sims.csv': _case_sims_csv,
+    'sims.limpieza': _case_sims_limpieza,
+    'sims.limpieza_filas': _case_sims_limpieza_filas,
+    'sims.insercion': _case_sims_insercion,
+    'sims.completa': _case_sims_completa
+}
+# Casos que generan sus filas en memoria (no hace falta escribir los archivos sintéticos)
+in_memory_cases = {'plataformas.proyeccion', 'plataformas.proyeccion_dict'}
+
+def _run_case(case, paths, db_path):
+    """Corre `case` en el proceso actual (uno nuevo por caso) y devuelve tiempo, filas y memoria."""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    try:
+        seconds, rows = bench_cases[case](paths, db_path)
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    return {
+        'seconds': round(seconds, 3),
+        'rows': rows,
+        'rows_per_s': round(rows / seconds) if seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def run_benchmarks(rows_list=default_bench_rows, cases=None, data_dir=bench_data_dir, repeat=1, **dataset_params):
+    """Genera (o reutiliza) los archivos sintéticos de cada tamaño de `rows_list` y corre los
+       casos de `cases` (todos por defecto). Con `repeat` > 1 se queda con la corrida más rápida.
+       Devuelve {'caso@filas': {'seconds', 'rows', 'rows_per_s', 'peak_rss_mb'}}."""
+    from .synthetic import generate_dataset
+
+    cases = cases or list(bench_cases)
+    mp_context = multiprocessing.get_context('spawn')
+    results = {}
+    for rows in rows_list:
+        paths = {'rows': rows, 'params': dataset_params}
+        if any(case not in in_memory_cases for case in cases):
+            paths.update(generate_dataset(data_dir, rows, **dataset_params))
+        db_path = os.path.join(data_dir, 'bench.db')
+        for case in cases:
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=mp_context) as pool:
+                    runs.append(pool.submit(_run_case, case, paths, db_path).result())
+            key = f"{case}@{rows}"
+            results[key] = min(runs, key=lambda run: run['seconds'])
+            logger.info(f"Benchmark {key}: {results[key]}")
+    return results
+
+def load_baseline(path=baseline_path):
+    """Línea base guardada ({} si todavía no existe)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as baseline_file:
+        return json.load(baseline_file)
+
+def save_baseline(results, path=baseline_path):
+    """Guarda `results` en la línea base; los casos que no se corrieron conservan su valor anterior."""
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump(baseline, baseline_file, ensure_ascii=False, indent=2, sort_keys=True)
+
+def compare_with_baseline(results, baseline, tolerance=default_tolerance):
+    """Compara cada caso con la base: cocientes de tiempo y memoria (actual / base) y si es
+       regresión. Los casos sin base quedan fuera."""
+    comparison = {}
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        seconds_ratio = result['seconds'] / base['seconds'] if base['seconds'] else None
+        memory_ratio = (
+            result['peak_rss_mb'] / base['peak_rss_mb']
+            if result['peak_rss_mb'] is not None and base.get('peak_rss_mb') else None
+        )
+        comparison[key] = {
+            'seconds_ratio': round(seconds_ratio, 3) if seconds_ratio is not None else None,
+            'memory_ratio': round(memory_ratio, 3) if memory_ratio is not None else None,
+            'regression': any(ratio is not None and ratio > 1 + tolerance for ratio in (seconds_ratio, memory_ratio))
+        }
+    return comparison
@@ -0,0 +1,124 @@
+"""Consultas paginadas sobre las bases de una carga, para explorar los datos sin cargarlos completos.
+
+Los filtros son {columna: valor, lista de valores o {'desde': a, 'hasta': b}} y se resuelven en
+SQL (con los índices de storage.query_indexes; los rangos, sobre las fechas en epoch de 'datos'); las páginas se leen por rowid (keyset), así que la página N cuesta lo
+mismo que la primera. Las listas de opciones (SELECT DISTINCT) y los conteos se guardan en una
+caché LRU cuya clave incluye la fecha de modificación del archivo y de su WAL: una nueva carga
+(también la de otra sesión que todavía no volcó el WAL) la invalida. Las lecturas usan
+conexiones de solo lectura, que no esperan a las cargas en curso.
+"""
+import calendar
+import io
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+from .common import lru_get, lru_put
+from .plataformas import last_activity_column
+from .storage import connect_readonly
+
+default_page_size = 500
+query_cache_size = 128
+_query_cache = OrderedDict()
+
+def _where(filters):
+    """Arma la cláusula WHERE y sus parámetros a partir de `filters`; las listas vacías no filtran.
+       Un rango {'desde': a, 'hasta': b} es a <= columna < b (cualquiera de los dos puede faltar
+       o ser None) y deja fuera los NULL."""
+    clauses = []
+    params = []
+    for column, value in (filters or {}).items():
+        if isinstance(value, dict):
+            for bound, operator in (('desde', '>='), ('hasta', '<')):
+                if value.get(bound) is not None:
+                    clauses.append(f"{column} {operator} ?")
+                    params.append(value[bound])
+        elif isinstance(value, (list, tuple, set)):
+            if not value:
+                continue
+            clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f"{column} IS ?")
+            params.append(value)
+    return (" AND ".join(clauses) or "1"), params
+
+def stale_filter(days, now=None):
+    """Filtro de 'datos' para los dispositivos sin actividad (último mensaje o reporte) en los
+       últimos `days` días. Las fechas en epoch son la hora local de la plataforma sin zona, así
+       que `now` (por defecto la hora local) se convierte igual; se redondea al minuto para que
+       la consulta se pueda reutilizar desde la caché. Los dispositivos sin fecha no entran."""
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+    return {last_activity_column: {'hasta': calendar.timegm(now.timetuple()) - days * 86400}}
+
+def _file_version(path):
+    # Las escrituras en WAL van al archivo -wal: el .db no cambia hasta el volcado
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def _cached_query(db_path, query, params):
+    key = (db_path, _file_version(db_path), _file_version(db_path + '-wal'), query, tuple(params))
+    rows = lru_get(_query_cache, key)
+    if rows is None:
+        conn = connect_readonly(db_path)
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        lru_put(_query_cache, key, rows, query_cache_size)
+    return rows
+
+def distinct_values(db_path, table, column, filters=None):
+    """Valores distintos (no nulos, ordenados) de `column` entre las filas que cumplen `filters`."""
+    where, params = _where(filters)
+    rows = _cached_query(
+        db_path, f"SELECT DISTINCT {column} FROM {table} WHERE {where} AND {column} IS NOT NULL ORDER BY 1", params
+    )
+    return [value for (value,) in rows]
+
+def count_rows(db_path, table, filters=None):
+    """Número de filas de `table` que cumplen `filters`."""
+    where, params = _where(filters)
+    return _cached_query(db_path, f"SELECT COUNT(*) FROM {table} WHERE {where}", params)[0][0]
+
+def fetch_page(db_path, table, columns, filters=None, after_rowid=0, page_size=default_page_size):
+    """Lee una página de `page_size` filas de `table` con rowid mayor que `after_rowid`.
+       Devuelve (DataFrame, next_after_rowid), con next_after_rowid None en la última página."""
+    where, params = _where(filters)
+    conn = connect_readonly(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE {where} AND rowid > ? "
+            f"ORDER BY rowid LIMIT ?",
+            params + [after_rowid, page_size + 1]
+        ).fetchall()
+    finally:
+        conn.close()
+    next_after_rowid = rows[page_size - 1][0] if len(rows) > page_size else None
+    df_page = pd.DataFrame([row[1:] for row in rows[:page_size]], columns=columns)
+    return df_page, next_after_rowid
+
+def export_csv(db_path, table, columns, filters=None, chunksize=100000):
+    """Devuelve en CSV (bytes UTF-8) todas las filas de `table` que cumplen `filters`,
+       leídas por bloques de `chunksize` filas."""
+    where, params = _where(filters)
+    output = io.StringIO()
+    conn = connect_readonly(db_path)
+    try:
+        chunks = pd.read_sql_query(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE {where} ORDER BY rowid",
+            conn, params=params, chunksize=chunksize
+        )
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(output, index=False, header=header)
+            header = False
+        if header:
+            pd.DataFrame(columns=columns).to_csv(output, index=False)
+    finally:
+        conn.close()
+    return output.getvalue().encode('utf-8')
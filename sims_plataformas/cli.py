@@ -0,0 +1,272 @@
+"""Línea de comandos para cargas desatendidas (cron, workers).
+
+Ejemplos:
+    python -m sims_plataformas ingest --plataformas 2024-05-03_plataformas.xlsx --sims cargas/sims/
+    python -m sims_plataformas export sims sims_hoy.db --out exports/
+    python -m sims_plataformas bench --rows 10000 100000 --save-baseline
+
+Los módulos de carga (openpyxl, pandas) se importan solo al ejecutar el comando,
+así que ``--help`` responde de inmediato. El resumen de la carga se imprime como JSON.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+from contextlib import closing
+from datetime import datetime
+
+from . import log, metrics
+from .storage import bulk_load
+
+
+def expand_sims_paths(paths):
+    """Devuelve los archivos .xlsx/.csv indicados, expandiendo los directorios (ordenados por nombre)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(('.xlsx', '.csv')):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+
+def ingest_plataformas(paths, db_path, history_db, use_ledger=True):
+    """Carga los Excel de plataformas en `db_path` y en el historial `history_db` (una foto
+       por archivo, con la fecha de su nombre) y devuelve el resumen por archivo.
+       Los archivos ya cargados en `db_path` con el mismo mapeo no se vuelven a procesar
+       (ver ledger); su resumen es el de la carga original, con 'cached': True."""
+    from .common import file_content_hash, short_load_key
+    from .history import open_history, apply_snapshot_if_newer
+    from .ledger import ingestion_key, lookup_ingestion, record_ingestion
+    from .plataformas import (
+        default_mappings_plataformas,
+        create_database_plataformas,
+        extract_date_from_filename,
+        load_excel_file_plataformas,
+        save_not_inserted_plataformas
+    )
+
+    create_database_plataformas(db_path)
+    summary = {}
+    with bulk_load(db_path, 'datos') as conn, closing(open_history(history_db)) as history_conn:
+        for path in paths:
+            with open(path, 'rb') as excel_file:
+                content_hash = file_content_hash(excel_file)
+                ingestion = ingestion_key('plataformas', content_hash, default_mappings_plataformas, db_path)
+                previous = lookup_ingestion(ingestion) if use_ledger else None
+                if previous is not None:
+                    summary[path] = dict(previous, cached=True)
+                    log.logger.info(f"Plataformas '{path}': ya cargado, se omite.")
+                    continue
+                load = load_excel_file_plataformas(
+                    excel_file, default_mappings_plataformas, conn, history_conn=history_conn
+                )
+            save_not_inserted_plataformas(
+                conn, short_load_key(content_hash, default_mappings_plataformas), load['not_inserted']
+            )
+            # Misma forma que los resultados de la interfaz, para compartir el ledger
+            summary[path] = {
+                'total_records': load['total_records'],
+                'inserted_count': load['inserted_count'],
+                'invalid_count': load['invalid_count'],
+                'not_inserted_count': len(load['not_inserted']),
+                'db_path': db_path,
+                'platform_ranges': load['platform_ranges'],
+                'platform_rowids': load['platform_rowids'],
+                'history_stats': apply_snapshot_if_newer(
+                    history_conn, 'datos', extract_date_from_filename(os.path.basename(path))
+                )
+            }
+            record_ingestion(ingestion, 'plataformas', path, db_path, summary[path], load['sample_keys'])
+            log.logger.info(f"Plataformas '{path}': {summary[path]}")
+    return summary
+
+
+def _rejected_count(stats):
+    # Cada fila procesada que no se insertó fue rechazada por duplicada
+    return sum(unit['processed'] - unit['inserted'] for unit in stats.get('sheets', {'': stats}).values())
+
+
+def ingest_sims(paths, db_path, workers, history_db, use_ledger=True):
+    """Carga los Excel/CSV de SIMs en `db_path` con el mapeo automático, repartiendo el
+       parseo y la limpieza entre `workers` procesos (ver load_units_sims), y aplica la carga
+       como foto de hoy en el historial `history_db`.
+       Las pestañas o CSV sin mapeo por defecto válido se omiten y se reportan en 'skipped';
+       los archivos ya cargados con el mismo mapeo se reportan con el resultado original y
+       'cached': True."""
+    import hashlib
+
+    from .history import open_history, apply_snapshot_if_newer
+    from .ledger import ingestion_key, lookup_ingestion, record_ingestion
+    from .sims import (
+        create_database_sims, probe_headers_sims, resolve_mapping_sims, build_units_sims, load_units_sims,
+        save_not_inserted_sims
+    )
+
+    create_database_sims(db_path)
+    files = []
+    column_mappings = {}
+    ingestions = {}
+    cached = {}
+    skipped = []
+    for path in expand_sims_paths(paths):
+        with open(path, 'rb') as sims_file:
+            content = sims_file.read()
+        content_hash = hashlib.sha256(content).hexdigest()
+        sims_file = io.BytesIO(content)
+        sims_file.name = path
+        # Para el mapeo basta con los encabezados; las filas se leen en los procesos del pool
+        headers = probe_headers_sims(sims_file, key=content_hash)
+        if path.endswith('.xlsx'):
+            column_mapping = {}
+            for sheet_name, sheet_headers in headers.items():
+                mapping_indices = resolve_mapping_sims(sheet_name, sheet_headers)
+                if mapping_indices is None:
+                    skipped.append(f"{path}:{sheet_name}")
+                else:
+                    column_mapping[sheet_name] = mapping_indices
+        else:
+            column_mapping = resolve_mapping_sims(os.path.splitext(os.path.basename(path))[0], headers)
+            if column_mapping is None:
+                skipped.append(path)
+                continue
+        ingestions[path] = ingestion_key('sims', content_hash, column_mapping, db_path)
+        previous = lookup_ingestion(ingestions[path]) if use_ledger else None
+        if previous is not None:
+            cached[path] = previous
+            continue
+        files.append((path, content))
+        column_mappings[path] = column_mapping
+
+    with bulk_load(db_path, 'sims') as conn, closing(open_history(history_db)) as history_conn:
+        stats_by_file, rejected = load_units_sims(
+            build_units_sims(files, column_mappings), conn, max_workers=workers, history_conn=history_conn
+        )
+        # Los rechazados quedan en la base, como en la interfaz (que comparte el ledger)
+        save_not_inserted_sims(conn, rejected, {path: ingestions[path] for path in stats_by_file})
+        history = apply_snapshot_if_newer(history_conn, 'sims', datetime.now().strftime('%Y-%m-%d'))
+    for path, stats in stats_by_file.items():
+        sample_keys = stats.pop('sample_keys')
+        record_ingestion(ingestions[path], 'sims', path, db_path, {'stats': stats}, sample_keys)
+        stats['rejected'] = _rejected_count(stats)
+        log.logger.info(f"SIMs '{path}': {stats}")
+    for path, previous in cached.items():
+        stats_by_file[path] = dict(previous['stats'], rejected=_rejected_count(previous['stats']), cached=True)
+        log.logger.info(f"SIMs '{path}': ya cargado, se omite.")
+    for unit in skipped:
+        log.logger.warning(f"Sin mapeo por defecto válido, se omite: {unit}")
+    return {'files': stats_by_file, 'skipped': skipped, 'history': history}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='sims_plataformas',
+        description="Carga desatendida de datos de plataformas y SIMs."
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    ingest = subparsers.add_parser('ingest', help="Carga Excel de plataformas y/o archivos de SIMs.")
+    ingest.add_argument('--plataformas', nargs='+', default=[], metavar='XLSX',
+                        help="Excel(s) de plataformas (hojas WIALON/ADAS/COMBUSTIBLE).")
+    ingest.add_argument('--plataformas-db', default=None,
+                        help="Base de datos de plataformas (por defecto AAAA-MM-DD_plataformas.db).")
+    ingest.add_argument('--sims', nargs='+', default=[], metavar='RUTA',
+                        help="Archivos .xlsx/.csv de SIMs o directorios que los contienen.")
+    ingest.add_argument('--sims-db', default='sims_hoy.db', help="Base de datos de SIMs.")
+    ingest.add_argument('--history-db', default='historial.db',
+                        help="Base de datos del historial incremental de plataformas y SIMs.")
+    ingest.add_argument('--force', action='store_true',
+                        help="Procesa también los archivos que ya se cargaron con el mismo mapeo.")
+    ingest.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Procesos para parsear y limpiar los archivos de SIMs.")
+    ingest.add_argument('--log-dir', default=log.log_dir, help="Directorio de los logs de la ejecución.")
+    ingest.add_argument('--metrics-dir', default=metrics.metrics_dir,
+                        help="Directorio del JSON de métricas por etapa (y del perfil).")
+    ingest.add_argument('--profile', action='store_true', help="Guarda un perfil cProfile (.prof) de la carga.")
+    export = subparsers.add_parser('export', help="Exporta 'datos' o 'sims' a Parquet particionado.")
+    export.add_argument('table', choices=['datos', 'sims'], help="Tabla a exportar.")
+    export.add_argument('db', help="Base de datos de origen.")
+    export.add_argument('--out', default='exports', help="Directorio de salida.")
+    export.add_argument('--log-dir', default=log.log_dir, help="Directorio de los logs de la ejecución.")
+    generate = subparsers.add_parser('generate', help="Genera archivos sintéticos de plataformas y SIMs.")
+    bench = subparsers.add_parser('bench', help="Mide las rutas de carga con archivos sintéticos.")
+    for command in (generate, bench):
+        command.add_argument('--rows', nargs='+', type=int, default=[10000], metavar='N',
+                             help="Filas por archivo (uno o varios tamaños).")
+        command.add_argument('--data-dir', default='bench_data', help="Directorio de los archivos sintéticos.")
+        command.add_argument('--seed', type=int, default=0, help="Semilla del generador.")
+        command.add_argument('--duplicates', type=float, default=0.05, help="Fracción de filas duplicadas.")
+        command.add_argument('--mangled', type=float, default=0.3,
+                             help="Fracción de ICCID como número o con espacios y 'F'.")
+        command.add_argument('--dirty', type=float, default=0.3, help="Fracción de teléfonos con formato sucio.")
+        command.add_argument('--log-dir', default=log.log_dir, help="Directorio de los logs de la ejecución.")
+    bench.set_defaults(rows=[10000, 100000, 1000000])
+    bench.add_argument('--cases', nargs='+', default=None, metavar='CASO',
+                       help="Casos a correr (por defecto todos): plataformas.mapeo, sims.limpieza, ...")
+    bench.add_argument('--repeat', type=int, default=1, help="Corridas por caso (se toma la más rápida).")
+    bench.add_argument('--baseline', default='bench_baseline.json', help="Archivo JSON de la línea base.")
+    bench.add_argument('--save-baseline', action='store_true', help="Guarda los resultados como línea base.")
+    bench.add_argument('--tolerance', type=float, default=0.2,
+                       help="Aumento de tiempo o memoria sobre la base que cuenta como regresión.")
+    args = parser.parse_args(argv)
+
+    log.log_dir = args.log_dir
+    if args.command in ('generate', 'bench'):
+        dataset_params = {
+            'seed': args.seed,
+            'duplicate_ratio': args.duplicates,
+            'mangle_ratio': args.mangled,
+            'dirty_ratio': args.dirty
+        }
+        if args.command == 'generate':
+            from .synthetic import generate_dataset
+
+            datasets = {rows: generate_dataset(args.data_dir, rows, **dataset_params) for rows in args.rows}
+            json.dump(datasets, sys.stdout, ensure_ascii=False, indent=2)
+            sys.stdout.write('\n')
+            return 0
+
+        from .bench import bench_cases, run_benchmarks, load_baseline, save_baseline, compare_with_baseline
+
+        unknown = [case for case in args.cases or [] if case not in bench_cases]
+        if unknown:
+            parser.error(f"casos desconocidos: {', '.join(unknown)} (disponibles: {', '.join(bench_cases)})")
+        with log.run_logging('bench') as log_path:
+            results = run_benchmarks(args.rows, args.cases, args.data_dir, args.repeat, **dataset_params)
+        comparison = compare_with_baseline(results, load_baseline(args.baseline), args.tolerance)
+        if args.save_baseline:
+            save_baseline(results, args.baseline)
+        regressions = [key for key, item in comparison.items() if item['regression']]
+        json.dump(
+            {'results': results, 'comparison': comparison, 'regressions': regressions, 'log': log_path},
+            sys.stdout, ensure_ascii=False, indent=2
+        )
+        sys.stdout.write('\n')
+        return 1 if regressions and not args.save_baseline else 0
+    if args.command == 'export':
+        from .export import export_parquet
+
+        with log.run_logging('cli') as log_path:
+            partitions = export_parquet(args.db, args.table, args.out)
+        json.dump({'partitions': partitions, 'log': log_path}, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write('\n')
+        return 0
+
+    if not args.plataformas and not args.sims:
+        parser.error("indica al menos --plataformas o --sims")
+
+    metrics.metrics_dir = args.metrics_dir
+    plataformas_db = args.plataformas_db or f"{datetime.now().strftime('%Y-%m-%d')}_plataformas.db"
+    summary = {}
+    with metrics.run_metrics('cli', args.profile or None) as run_metrics, log.run_logging('cli') as log_path:
+        if args.plataformas:
+            summary['plataformas'] = ingest_plataformas(args.plataformas, plataformas_db, args.history_db, not args.force)
+        if args.sims:
+            summary['sims'] = ingest_sims(args.sims, args.sims_db, args.workers, args.history_db, not args.force)
+    summary['log'] = log_path
+    summary['metrics'] = run_metrics['json_path']
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write('\n')
+    return 0
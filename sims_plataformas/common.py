@@ -0,0 +1,36 @@
+"""Utilidades compartidas: hashes de archivos y mapeos, y cachés LRU."""
+import hashlib
+import json
+
+def file_content_hash(file_obj):
+    """Devuelve el hash SHA-256 del contenido de un archivo subido (o abierto en modo binario)."""
+    if hasattr(file_obj, 'getvalue'):
+        content = file_obj.getvalue()
+    else:
+        file_obj.seek(0)
+        content = file_obj.read()
+        file_obj.seek(0)
+    return hashlib.sha256(content).hexdigest()
+
+def mapping_hash(mappings):
+    """Devuelve un hash estable de un diccionario de mapeos (para usarlo como clave de caché)."""
+    serialized = json.dumps(mappings, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+def short_load_key(content_hash, mappings):
+    """Clave corta de una carga (archivo + mapeo), para etiquetar sus filas en la base."""
+    return f"{content_hash[:16]}-{mapping_hash(mappings)[:8]}"
+
+def lru_get(cache, key):
+    """Devuelve el valor de `key` en un OrderedDict usado como caché LRU (o None)."""
+    if key not in cache:
+        return None
+    cache.move_to_end(key)
+    return cache[key]
+
+def lru_put(cache, key, value, max_entries):
+    """Guarda `value` en la caché LRU y descarta las entradas más antiguas si se pasa de `max_entries`."""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
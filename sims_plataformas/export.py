@@ -0,0 +1,114 @@
+"""Exportación columnar (Parquet) de las tablas 'datos' y 'sims', particionada por plataforma u operador.
+
+Los archivos quedan en formato Hive (``{tabla}/{columna}={valor}/part-0.parquet``), así que
+se leen directamente con ``pandas.read_parquet(ruta)`` o ``pyarrow.dataset.dataset(ruta,
+partitioning='hive')`` sin volver a parsear CSV. pyarrow se importa solo al exportar.
+"""
+import os
+import shutil
+import threading
+import zipfile
+from urllib.parse import quote
+
+from .log import logger
+from .storage import connect_readonly
+
+export_dir = 'exports'
+
+# Columna de partición por tabla
+partition_columns = {
+    'datos': 'Origen',
+    'sims': 'Compania'
+}
+
+# Las exportaciones de una misma tabla comparten carpeta: dos cargas simultáneas se turnan
+_export_lock = threading.Lock()
+
+# Filas que se leen de SQLite y se escriben por grupo de filas de Parquet
+default_export_chunksize = 100000
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("La exportación a Parquet requiere pyarrow (pip install pyarrow).") from e
+    return pa, pq
+
+def export_parquet(db_path, table, out_dir=export_dir, chunksize=default_export_chunksize):
+    """Exporta `table` de `db_path` a Parquet en `out_dir`/`table`, un archivo por valor de la
+       columna de partición. Las columnas son texto (las INTEGER, como las fechas en epoch,
+       enteros de 64 bits) con codificación por diccionario y compresión zstd.
+       La tabla se recorre una sola vez, por bloques de `chunksize` filas, y cada bloque se
+       reparte entre los archivos de sus particiones (la columna de partición no tiene índice:
+       un SELECT por partición sería un recorrido completo de la tabla por cada una).
+       Devuelve {valor de partición: número de filas}."""
+    pa, pq = _import_pyarrow()
+    import pyarrow.compute as pc
+
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No existe la base de datos {db_path}")
+    partition_column = partition_columns[table]
+    table_dir = os.path.join(out_dir, table)
+    # Se reemplaza la exportación anterior completa para no mezclar particiones viejas
+    shutil.rmtree(table_dir, ignore_errors=True)
+
+    conn = connect_readonly(db_path)
+    writers = {}
+    counts = {}
+    try:
+        declared = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({table})") if row[1] != partition_column}
+        columns = list(declared)
+        types = [pa.int64() if declared[column] == 'INTEGER' else pa.string() for column in columns]
+        schema = pa.schema(list(zip(columns, types)))
+        # CAST por si alguna celda de texto quedó guardada como número
+        selected = [f'CAST({partition_column} AS TEXT)'] + [
+            column if declared[column] == 'INTEGER' else f'CAST({column} AS TEXT)' for column in columns
+        ]
+        cursor = conn.execute(f"SELECT {', '.join(selected)} FROM {table}")
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            values = list(zip(*rows))
+            partition = pa.array(values[0], type=pa.string())
+            chunk = pa.Table.from_arrays(
+                [pa.array(column, type=column_type) for column, column_type in zip(values[1:], types)], schema=schema
+            )
+            for value in pc.unique(partition).to_pylist():
+                mask = pc.is_null(partition) if value is None else pc.equal(partition, value)
+                part = chunk.filter(mask)
+                writer = writers.get(value)
+                if writer is None:
+                    segment = '__HIVE_DEFAULT_PARTITION__' if value is None else quote(value, safe='')
+                    partition_dir = os.path.join(table_dir, f"{partition_column}={segment}")
+                    os.makedirs(partition_dir, exist_ok=True)
+                    writer = writers[value] = pq.ParquetWriter(
+                        os.path.join(partition_dir, 'part-0.parquet'), schema,
+                        compression='zstd', use_dictionary=True
+                    )
+                writer.write_table(part)
+                counts[value] = counts.get(value, 0) + part.num_rows
+    finally:
+        for writer in writers.values():
+            writer.close()
+        conn.close()
+    logger.info(f"Exportación Parquet de '{table}' en {table_dir}: {counts}")
+    return counts
+
+def export_parquet_zip(db_path, table, out_dir=export_dir):
+    """Exporta `table` a Parquet (ver export_parquet) y empaqueta la carpeta en un .zip para
+       descargarla. Los Parquet ya van comprimidos, así que el .zip solo los almacena.
+       Devuelve la ruta del .zip, que se reemplaza completo (una sesión que lo esté
+       descargando no ve un archivo a medias)."""
+    table_dir = os.path.join(out_dir, table)
+    zip_path = os.path.join(out_dir, f"{table}_parquet.zip")
+    with _export_lock:
+        export_parquet(db_path, table, out_dir)
+        with zipfile.ZipFile(zip_path + '.parcial', 'w', compression=zipfile.ZIP_STORED) as zip_file:
+            for root, _, files in os.walk(table_dir):
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    zip_file.write(path, os.path.relpath(path, out_dir))
+        os.replace(zip_path + '.parcial', zip_path)
+    return zip_path
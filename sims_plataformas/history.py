@@ -0,0 +1,168 @@
+"""Historial incremental de 'datos' y 'sims': una sola base con las versiones de cada registro.
+
+Cada carga es una foto (snapshot) fechada. Solo se escriben los registros que cambiaron
+respecto de la foto anterior: la versión vigente tiene valid_to NULL y, cuando el registro
+cambia o deja de aparecer, se cierra con valid_to = fecha de la foto. Así "qué cambió desde
+ayer" es una consulta por índice sobre valid_from/valid_to y no una comparación de bases.
+
+Uso (una conexión por carga):
+    conn = open_history()
+    stage_snapshot(conn, 'sims', lote)          # por cada lote limpio
+    stats = apply_snapshot(conn, 'sims', '2024-05-03')
+"""
+import pandas as pd
+
+from .log import logger
+from .plataformas import columns_plataformas
+from .storage import connect, write_transaction
+
+history_db_path = 'historial.db'
+
+# Por tabla: columnas (en el orden de las tuplas de carga), clave del registro y columna de
+# alcance. Un registro solo se da de baja si su alcance (plataforma u operador) viene en la
+# foto: cargar hoy solo TELCEL no da de baja las SIMs de MOVISTAR.
+history_tables = {
+    'datos': {
+        'columns': columns_plataformas,
+        'key': ['Nombre', 'Cliente_Cuenta', 'Telefono'],
+        'scope': 'Origen'
+    },
+    'sims': {
+        'columns': ['ICCID', 'TELEFONO', 'ESTADO_DEL_SIM', 'EN_SESION', 'ConsumoMb', 'Compania'],
+        'key': ['ICCID', 'TELEFONO'],
+        'scope': 'Compania'
+    }
+}
+
+def _match(columns, left, right):
+    # IS en lugar de = para que las claves con NULL (p. ej. sin teléfono) también coincidan
+    return " AND ".join(f"{left}.{column} IS {right}.{column}" for column in columns)
+
+def _differs(columns, left, right):
+    return " OR ".join(f"{left}.{column} IS NOT {right}.{column}" for column in columns)
+
+def _create_snapshot_table(conn, table):
+    # Mismas columnas TEXT que la tabla de historial, para que la comparación use la misma afinidad
+    columns = ", ".join(f"{column} TEXT" for column in history_tables[table]['columns'])
+    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS foto_{table} ({columns})")
+
+def create_history_tables(conn):
+    """Crea (si no existen) las tablas de historial y sus índices: la clave (con la fecha de
+       inicio de cada versión) y las fechas de inicio y fin de las versiones."""
+    for table, spec in history_tables.items():
+        columns = ", ".join(f"{column} TEXT" for column in spec['columns'])
+        key = ", ".join(spec['key'])
+        conn.executescript(f'''
+            CREATE TABLE IF NOT EXISTS {table} ({columns}, valid_from TEXT NOT NULL, valid_to TEXT);
+            CREATE INDEX IF NOT EXISTS idx_{table}_clave ON {table} ({key}, valid_from);
+            CREATE INDEX IF NOT EXISTS idx_{table}_valid_from ON {table} (valid_from);
+            CREATE INDEX IF NOT EXISTS idx_{table}_valid_to ON {table} (valid_to);
+        ''')
+    conn.commit()
+
+def open_history(db_path=history_db_path):
+    """Abre la base de historial con el perfil de carga masiva (y la crea si no existe)."""
+    conn = connect(db_path)
+    create_history_tables(conn)
+    return conn
+
+def stage_snapshot(conn, table, rows):
+    """Agrega un lote de tuplas a la foto en curso de `table` (tabla temporal de la conexión)."""
+    spec = history_tables[table]
+    _create_snapshot_table(conn, table)
+    placeholders = ", ".join("?" * len(spec['columns']))
+    conn.executemany(f"INSERT INTO temp.foto_{table} VALUES ({placeholders})", rows)
+
+def apply_snapshot(conn, table, snapshot_date):
+    """Compara la foto en curso de `table` con las versiones vigentes y escribe solo las diferencias,
+       todo en una transacción. Devuelve {'nuevos', 'modificados', 'eliminados', 'sin_cambios'}.
+       Si una clave se repite dentro de la foto se conserva la primera, como en la carga diaria.
+       Una segunda foto del mismo día reemplaza las versiones abiertas ese día en lugar de
+       dejar versiones de duración cero. Las fotos deben aplicarse en orden de fecha."""
+    spec = history_tables[table]
+    key = ", ".join(spec['key'])
+    _create_snapshot_table(conn, table)
+    columns = ", ".join(spec['columns'])
+    values = [column for column in spec['columns'] if column not in spec['key']]
+    try:
+        # Toda la comparación va dentro de la transacción de escritura (sin executescript, que
+        # confirmaría a mitad de camino): otra carga no escribe entre la lectura y la escritura
+        with write_transaction(conn):
+            latest = conn.execute(f"SELECT MAX(valid_from) FROM {table}").fetchone()[0]
+            if latest is not None and snapshot_date < latest:
+                raise ValueError(f"La foto del {snapshot_date} es anterior a la última aplicada en '{table}' ({latest}).")
+
+            # GROUP BY trata los NULL como iguales, a diferencia de un índice UNIQUE
+            conn.execute(
+                f"DELETE FROM temp.foto_{table} WHERE rowid NOT IN "
+                f"(SELECT MIN(rowid) FROM temp.foto_{table} GROUP BY {key})"
+            )
+            # Una sola pasada por índice clasifica cada fila de la foto contra su versión vigente
+            conn.execute(f'''
+                CREATE TEMP TABLE diff_{table} AS
+                    SELECT f.rowid AS foto_id, h.rowid AS hist_id,
+                           CASE WHEN h.rowid IS NULL THEN 'nuevos'
+                                WHEN {_differs(values, 'h', 'f')} THEN 'modificados'
+                                ELSE 'sin_cambios' END AS cambio
+                    FROM temp.foto_{table} f
+                    LEFT JOIN {table} h ON h.valid_to IS NULL AND {_match(spec['key'], 'h', 'f')}
+            ''')
+            conn.execute(f"CREATE TEMP TABLE cerrar_{table} AS SELECT hist_id FROM temp.diff_{table} WHERE cambio = 'modificados'")
+            conn.execute(f'''
+                INSERT INTO temp.cerrar_{table}
+                    SELECT h.rowid FROM {table} h
+                    WHERE h.valid_to IS NULL
+                      AND h.{spec['scope']} IN (SELECT {spec['scope']} FROM temp.foto_{table})
+                      AND h.rowid NOT IN (SELECT hist_id FROM temp.diff_{table} WHERE hist_id IS NOT NULL)
+            ''')
+            stats = {'nuevos': 0, 'modificados': 0, 'sin_cambios': 0}
+            stats.update(conn.execute(f"SELECT cambio, COUNT(*) FROM temp.diff_{table} GROUP BY cambio"))
+            stats['eliminados'] = conn.execute(f"SELECT COUNT(*) FROM temp.cerrar_{table}").fetchone()[0] - stats['modificados']
+
+            # Las versiones abiertas en la misma fecha se descartan; las anteriores se cierran
+            conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN (SELECT hist_id FROM temp.cerrar_{table}) AND valid_from = ?",
+                (snapshot_date,)
+            )
+            conn.execute(
+                f"UPDATE {table} SET valid_to = ? WHERE rowid IN (SELECT hist_id FROM temp.cerrar_{table})",
+                (snapshot_date,)
+            )
+            conn.execute(
+                f"INSERT INTO {table} ({columns}, valid_from) "
+                f"SELECT {columns}, ? FROM temp.foto_{table} "
+                f"WHERE rowid IN (SELECT foto_id FROM temp.diff_{table} WHERE cambio <> 'sin_cambios')",
+                (snapshot_date,)
+            )
+    finally:
+        for temp_table in ('foto', 'diff', 'cerrar'):
+            conn.execute(f"DROP TABLE IF EXISTS temp.{temp_table}_{table}")
+    logger.info(f"Historial '{table}' al {snapshot_date}: {stats}")
+    return stats
+
+def apply_snapshot_if_newer(conn, table, snapshot_date):
+    """Como apply_snapshot, pero si la foto es anterior a la última aplicada se descarta
+       (con aviso en el log) y devuelve None en lugar de fallar."""
+    try:
+        return apply_snapshot(conn, table, snapshot_date)
+    except ValueError as e:
+        logger.warning(f"Historial sin actualizar: {e}")
+        return None
+
+def changes_since(conn, table, since):
+    """Devuelve un DataFrame con los cambios de `table` posteriores a la fecha `since`:
+       las versiones que empezaron después ('nuevo' o 'modificado', con sus valores nuevos) y
+       las que se cerraron sin reemplazo ('eliminado', con sus últimos valores)."""
+    spec = history_tables[table]
+    columns = ", ".join(f"h.{column}" for column in spec['columns'])
+    earlier = f"SELECT 1 FROM {table} p WHERE {_match(spec['key'], 'p', 'h')} AND p.valid_from < h.valid_from"
+    later = f"SELECT 1 FROM {table} n WHERE {_match(spec['key'], 'n', 'h')} AND n.valid_from >= h.valid_to"
+    query = f'''
+        SELECT CASE WHEN EXISTS ({earlier}) THEN 'modificado' ELSE 'nuevo' END AS Cambio,
+               {columns}, h.valid_from, h.valid_to
+        FROM {table} h WHERE h.valid_from > :since
+        UNION ALL
+        SELECT 'eliminado', {columns}, h.valid_from, h.valid_to
+        FROM {table} h WHERE h.valid_to > :since AND NOT EXISTS ({later})
+    '''
+    return pd.read_sql_query(query, conn, params={'since': since})
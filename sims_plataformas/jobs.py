@@ -0,0 +1,140 @@
+"""Cargas en segundo plano: un hilo por trabajo, con progreso por unidad y cancelación.
+
+El registro de trabajos vive en este módulo (una vez por proceso), no en la sesión de
+Streamlit: un rerun o un refresco del navegador no interrumpe la carga y la interfaz
+vuelve a encontrarla con latest_job. La función del trabajo recibe como primer argumento
+`progress(unidad, filas, total=None)`, que los cargadores llaman tras cada lote con las
+filas acumuladas de la unidad (hoja, pestaña o CSV); si se pidió cancelar, `progress`
+lanza JobCancelled y la carga se interrumpe en ese lote.
+
+Uso:
+    job_id = start_job('sims', clave, funcion, *args)
+    job = get_job(job_id)     # copia: status, rows, units, elapsed, result, error
+    cancel_job(job_id)
+"""
+import threading
+import time
+import traceback
+import uuid
+
+from .log import logger
+
+# Trabajos terminados que se conservan (con su resultado) por proceso. Al superarse se
+# descartan primero los ya leídos (su sesión guardó el resultado) y después los más antiguos
+jobs_max_finished = 10
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+class JobCancelled(Exception):
+    """Se lanza dentro del trabajo (desde `progress`) cuando se pidió cancelarlo."""
+
+def _report(job, unit, rows, total=None):
+    with _jobs_lock:
+        state = job['units'].setdefault(unit, {'rows': 0, 'total': None})
+        job['rows'] += rows - state['rows']
+        state['rows'] = rows
+        if total is not None:
+            state['total'] = total
+    if job['cancel'].is_set():
+        raise JobCancelled(f"Trabajo {job['id']} cancelado.")
+
+def _run(job, target, args):
+    try:
+        result = target(lambda unit, rows, total=None: _report(job, unit, rows, total), *args)
+        status, error = 'done', None
+    except JobCancelled:
+        result, status, error = None, 'cancelled', None
+        logger.warning(f"Trabajo {job['id']} ({job['kind']}) cancelado.")
+    except Exception as e:
+        result, status, error = None, 'failed', f"{e}\n{traceback.format_exc()}"
+        logger.error(f"Trabajo {job['id']} ({job['kind']}) con error: {e}")
+    with _jobs_lock:
+        job.update(result=result, status=status, error=error, finished=time.monotonic())
+
+def _discard_finished():
+    finished = [job for job in _jobs.values() if job['status'] != 'running']
+    finished.sort(key=lambda job: (not job['read'], job['finished']))
+    for job in finished[:max(0, len(finished) - jobs_max_finished)]:
+        del _jobs[job['id']]
+
+def start_job(kind, key, target, *args):
+    """Ejecuta `target(progress, *args)` en un hilo y devuelve el id del trabajo.
+       `kind` ('plataformas', 'sims') y `key` (p. ej. hash del archivo y el mapeo) sirven
+       para volver a encontrarlo con latest_job."""
+    job = {
+        'id': uuid.uuid4().hex[:12],
+        'kind': kind,
+        'key': key,
+        'status': 'running',
+        'rows': 0,
+        'units': {},
+        'started': time.monotonic(),
+        'finished': None,
+        'result': None,
+        'error': None,
+        'read': False,
+        'cancel': threading.Event()
+    }
+    with _jobs_lock:
+        _discard_finished()
+        _jobs[job['id']] = job
+    threading.Thread(target=_run, args=(job, target, args), name=f"carga-{kind}-{job['id']}", daemon=True).start()
+    return job['id']
+
+def _snapshot(job):
+    # Una copia de un trabajo terminado entrega su resultado a quien la pidió
+    if job['status'] != 'running':
+        job['read'] = True
+    end = job['finished'] if job['finished'] is not None else time.monotonic()
+    snapshot = {key: value for key, value in job.items() if key != 'cancel'}
+    snapshot['units'] = {unit: dict(state) for unit, state in job['units'].items()}
+    snapshot['elapsed'] = end - job['started']
+    snapshot['cancel_requested'] = job['cancel'].is_set()
+    return snapshot
+
+def get_job(job_id):
+    """Copia del estado del trabajo `job_id` (o None si no existe o ya se descartó)."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return _snapshot(job) if job is not None else None
+
+def latest_job(kind, key=None):
+    """Copia del trabajo más reciente de `kind` (y de `key`, si se pasa), o None."""
+    with _jobs_lock:
+        jobs = [job for job in _jobs.values() if job['kind'] == kind and (key is None or job['key'] == key)]
+        return _snapshot(max(jobs, key=lambda job: job['started'])) if jobs else None
+
+def running_jobs(kind):
+    """Copias de los trabajos de `kind` en curso (de todas las sesiones), del más antiguo al más nuevo."""
+    with _jobs_lock:
+        jobs = [job for job in _jobs.values() if job['kind'] == kind and job['status'] == 'running']
+        return [_snapshot(job) for job in sorted(jobs, key=lambda job: job['started'])]
+
+def cancel_job(job_id):
+    """Pide cancelar el trabajo; se detiene en el siguiente lote que reporte progreso."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        job['cancel'].set()
+
+def clear_jobs(kind):
+    """Descarta los trabajos terminados de `kind` (p. ej. al borrar su base de datos)."""
+    with _jobs_lock:
+        for job_id in [job_id for job_id, job in _jobs.items() if job['kind'] == kind and job['status'] != 'running']:
+            del _jobs[job_id]
+
+def job_fraction(job):
+    """Fracción completada (0 a 1): promedio por unidad de filas / total. Las unidades sin
+       total conocido (p. ej. un CSV en curso) cuentan como 0 hasta terminar."""
+    if not job['units']:
+        return 0.0
+    done = 0.0
+    for state in job['units'].values():
+        if state['total'] is not None:
+            done += min(state['rows'] / state['total'], 1.0) if state['total'] else 1.0
+    return done / len(job['units'])
+
+def job_rate(job):
+    """Filas por segundo desde el inicio del trabajo."""
+    return job['rows'] / job['elapsed'] if job['elapsed'] > 0 else 0.0
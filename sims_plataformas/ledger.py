@@ -0,0 +1,173 @@
+"""Registro persistente de archivos ya cargados (ledger), para no volver a procesarlos.
+
+La clave combina el hash del contenido del archivo, el mapeo usado (pestañas y columnas) y la
+base de destino: el mismo archivo con el mismo mapeo sobre la misma base solo se procesa una
+vez y las siguientes veces se devuelve el resultado guardado (estadísticas y conteos; los
+duplicados quedan en la base de destino, en 'no_insertados' o 'no_insertados_sims').
+
+Una entrada solo vale para la misma base, no para otra con la misma ruta: cada base de destino
+guarda un identificador propio (UUID, tabla 'identidad') y la entrada el de la base en que se
+cargó, así que si la base se borra o se reemplaza (otra base creada en la misma ruta, una copia
+anterior) sus entradas dejan de valer. Además cada entrada guarda una muestra de claves UNIQUE
+de las filas del archivo, una por lote: al terminar la carga todas están en la tabla (insertadas
+o ya presentes como duplicadas), y si falta alguna el resultado guardado ya no describe la base.
+"""
+import json
+import math
+import os
+import sqlite3
+import uuid
+import zlib
+from datetime import datetime
+
+from .common import mapping_hash
+from .log import logger
+from .storage import busy_timeout_s, connect, connect_readonly, write_transaction
+
+ledger_db_path = 'ingestas.db'
+# Entradas que se conservan; al superarse se descartan las usadas hace más tiempo
+ledger_max_entries = 500
+# Claves de la muestra que se guardan por entrada (repartidas entre los lotes de la carga)
+ledger_sample_size = 16
+# Tabla de destino y columnas de su clave UNIQUE por tipo de carga
+ledger_tables = {
+    'plataformas': ('datos', ['Nombre', 'Cliente_Cuenta', 'Telefono']),
+    'sims': ('sims', ['ICCID', 'TELEFONO'])
+}
+
+def _connect(ledger_path):
+    # Varias cargas (de distintas sesiones) pueden registrar su resultado a la vez
+    conn = sqlite3.connect(ledger_path, timeout=busy_timeout_s)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ingestas (
+            clave TEXT PRIMARY KEY,
+            tipo TEXT,
+            archivo TEXT,
+            db_path TEXT,
+            resultado BLOB,
+            creado TEXT,
+            usado TEXT
+        )
+    ''')
+    # Ledgers anteriores a la identidad de las bases: sus entradas quedan sin db_id y no valen
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(ingestas)")}
+    for column in ('db_id', 'muestra'):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE ingestas ADD COLUMN {column} TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ingestas_usado ON ingestas (usado)")
+    return conn
+
+def database_id(db_path, create=False):
+    """Identificador (UUID) de la base `db_path`, guardado en su tabla 'identidad'. Devuelve None
+       si la base no existe o no lo tiene; con `create` lo crea si falta."""
+    if not create:
+        try:
+            conn = connect_readonly(db_path)
+        except sqlite3.OperationalError:
+            return None
+        try:
+            row = conn.execute("SELECT uuid FROM identidad").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            conn.close()
+        return row[0] if row else None
+    conn = connect(db_path)
+    try:
+        with write_transaction(conn):
+            conn.execute("CREATE TABLE IF NOT EXISTS identidad (uuid TEXT NOT NULL)")
+            row = conn.execute("SELECT uuid FROM identidad").fetchone()
+            if row is None:
+                row = (uuid.uuid4().hex,)
+                conn.execute("INSERT INTO identidad VALUES (?)", row)
+    finally:
+        conn.close()
+    return row[0]
+
+def _rows_present(db_path, kind, keys):
+    # Cada clave de la muestra se busca por el índice UNIQUE de la tabla de destino
+    table, columns = ledger_tables[kind]
+    condition = " AND ".join(f"{column} IS ?" for column in columns)
+    conn = connect_readonly(db_path)
+    try:
+        return all(
+            conn.execute(f"SELECT 1 FROM {table} WHERE {condition} LIMIT 1", key).fetchone() is not None
+            for key in keys
+        )
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+def ingestion_key(kind, content_hash, mapping, db_path):
+    """Clave de una carga: tipo ('plataformas' o 'sims'), hash del contenido, mapeo y base de destino."""
+    return mapping_hash([kind, content_hash, mapping, os.path.abspath(db_path)])
+
+def lookup_ingestion(key, ledger_path=ledger_db_path):
+    """Devuelve el resultado guardado para `key` o None si el archivo no se cargó antes en la
+       misma base (ver database_id) o si las filas de la muestra ya no están en ella. Las
+       entradas que dejaron de valer se descartan."""
+    conn = _connect(ledger_path)
+    try:
+        row = conn.execute(
+            "SELECT tipo, db_path, db_id, muestra, resultado FROM ingestas WHERE clave = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        kind, db_path, db_id, sample, result = row
+        current_id = database_id(db_path)
+        if db_id is None or db_id != current_id:
+            # La base se borró o se reemplazó: no vale ninguna entrada de la anterior
+            discarded = conn.execute(
+                "DELETE FROM ingestas WHERE db_path = ? AND (db_id IS NULL OR db_id IS NOT ?)", (db_path, current_id)
+            ).rowcount
+            conn.commit()
+            logger.info(f"Ledger de cargas: {discarded} entradas de una base anterior en {db_path} descartadas.")
+            return None
+        if not _rows_present(db_path, kind, json.loads(sample or '[]')):
+            conn.execute("DELETE FROM ingestas WHERE clave = ?", (key,))
+            conn.commit()
+            logger.info(f"Ledger de cargas: las filas de la carga guardada ya no están en {db_path}; se vuelve a procesar.")
+            return None
+        conn.execute("UPDATE ingestas SET usado = ? WHERE clave = ?", (datetime.now().isoformat(), key))
+        conn.commit()
+    finally:
+        conn.close()
+    return json.loads(zlib.decompress(result))
+
+def record_ingestion(key, kind, file_name, db_path, result, sample_keys=(), ledger_path=ledger_db_path):
+    """Guarda el resultado (serializable en JSON) de la carga `key` y descarta las entradas
+       sobrantes según ledger_max_entries. `sample_keys` son claves UNIQUE (ver ledger_tables)
+       de filas del archivo, p. ej. una por lote; se guardan a lo sumo ledger_sample_size,
+       repartidas entre todas."""
+    sample_keys = list(sample_keys)
+    sample_keys = sample_keys[::math.ceil(len(sample_keys) / ledger_sample_size) or 1]
+    db_id = database_id(db_path, create=True)
+    now = datetime.now().isoformat()
+    conn = _connect(ledger_path)
+    try:
+        conn.execute(
+            '''INSERT OR REPLACE INTO ingestas (clave, tipo, archivo, db_path, resultado, creado, usado, db_id, muestra)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (key, kind, file_name, os.path.abspath(db_path),
+             zlib.compress(json.dumps(result, ensure_ascii=False, default=str).encode('utf-8')), now, now,
+             db_id, json.dumps(sample_keys, ensure_ascii=False, default=str))
+        )
+        evicted = conn.execute(
+            "DELETE FROM ingestas WHERE clave NOT IN (SELECT clave FROM ingestas ORDER BY usado DESC LIMIT ?)",
+            (ledger_max_entries,)
+        ).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    if evicted:
+        logger.info(f"Ledger de cargas: {evicted} entradas antiguas descartadas.")
+
+def forget_ingestions(db_path, ledger_path=ledger_db_path):
+    """Olvida las cargas hechas sobre `db_path` (por ejemplo, al borrar esa base)."""
+    conn = _connect(ledger_path)
+    try:
+        conn.execute("DELETE FROM ingestas WHERE db_path = ?", (os.path.abspath(db_path),))
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,95 @@
+"""Logging de las ejecuciones de carga (un archivo por ejecución, escrito en segundo plano)."""
+import contextvars
+import logging
+import os
+import queue
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Los mensajes de la aplicación van al logger 'sims_plataformas'. Fuera de una ejecución
+# (ver run_logging) se descartan; durante una ejecución se escriben en segundo plano en
+# un archivo propio de esa ejecución, así las sesiones concurrentes no se pisan.
+logger = logging.getLogger('sims_plataformas')
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    logger.addHandler(logging.NullHandler())
+
+log_dir = 'logs'
+log_max_bytes = 10 * 1024 * 1024
+log_backup_count = 5
+# Fracción de registros que se trazan uno a uno (0 = solo resúmenes por hoja)
+trace_sample_rate = float(os.environ.get('SIMS_LOG_TRACE_SAMPLE', '0'))
+
+current_run_id = contextvars.ContextVar('current_run_id', default=None)
+
+class RunFilter(logging.Filter):
+    """Deja pasar solo los mensajes emitidos dentro de la ejecución `run_id`."""
+    def __init__(self, run_id):
+        super().__init__()
+        self.run_id = run_id
+
+    def filter(self, record):
+        return current_run_id.get() == self.run_id
+
+@contextmanager
+def run_logging(name):
+    """Abre el log de una ejecución en `log_dir` ({name}_{fecha}_{id}.log, con rotación).
+       Los mensajes se encolan y los escribe un hilo en segundo plano (QueueListener),
+       de modo que el procesamiento no espera a la escritura en disco."""
+    run_id = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{run_id}.log")
+    file_handler = RotatingFileHandler(
+        log_path, maxBytes=log_max_bytes, backupCount=log_backup_count, encoding='utf-8'
+    )
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RunFilter(run_id))
+    listener = QueueListener(log_queue, file_handler)
+
+    logger.addHandler(queue_handler)
+    listener.start()
+    token = current_run_id.set(run_id)
+    try:
+        yield log_path
+    finally:
+        current_run_id.reset(token)
+        logger.removeHandler(queue_handler)
+        listener.stop()
+        file_handler.close()
+
+class _ContextHandler(logging.Handler):
+    """Reenvía los registros al logger de la aplicación dentro del contexto capturado al
+       crearlo, para que el RunFilter de la ejecución los reconozca aunque los entregue
+       otro hilo."""
+    def __init__(self):
+        super().__init__()
+        self.context = contextvars.copy_context()
+
+    def emit(self, record):
+        self.context.run(logger.handle, record)
+
+def init_worker_logging(log_queue):
+    """En un proceso hijo (spawn), envía los mensajes del logger a `log_queue`."""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(log_queue))
+
+@contextmanager
+def forward_worker_logs(log_queue):
+    """Escribe en el log de la ejecución actual los mensajes que los procesos hijos envían
+       a `log_queue` (ver init_worker_logging). Al salir se vacía lo pendiente."""
+    listener = QueueListener(log_queue, _ContextHandler())
+    listener.start()
+    try:
+        yield
+    finally:
+        listener.stop()
+
+def should_trace():
+    """Indica si el registro actual se traza uno a uno (muestreo según trace_sample_rate)."""
+    return trace_sample_rate > 0 and random.random() < trace_sample_rate
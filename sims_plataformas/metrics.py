@@ -0,0 +1,185 @@
+"""Métricas por etapa de una carga: tiempo, filas/s, memoria residente y sentencias SQLite.
+
+Como en log.run_logging, las métricas se acumulan solo dentro de una ejecución
+(run_metrics); fuera de ella stage() no registra nada. Cada etapa se mide por unidad
+(hoja, pestaña o CSV) y al cerrar la ejecución se escribe un JSON en `metrics_dir`
+y, si se pidió, el perfil de cProfile (.prof, legible con pstats o snakeviz). El conteo de
+sentencias SQLite llama a Python por cada sentencia (cada fila de un executemany), lo que
+suma un 15-20 % a la inserción, así que solo se hace en las ejecuciones con perfil.
+
+La memoria se mide con la memoria residente (RSS) actual del proceso antes y después de cada
+etapa, no con el pico de toda la vida del proceso (ru_maxrss), que en la interfaz arrastra las
+cargas anteriores. Cada etapa suma lo que creció la RSS en sus llamadas y la ejecución guarda
+la RSS al empezar y la máxima vista al cerrar cada etapa. Es una medida del proceso: si otra
+sesión carga al mismo tiempo, su memoria también cuenta, y los picos que se liberan dentro de
+una etapa no se ven.
+
+Uso:
+    with run_metrics('sims', profile=True) as metrics:
+        with stage('limpieza', unit='TELCEL.csv') as timing:
+            data = clean(...)
+            timing['rows'] = len(data)
+    metrics_summary(metrics)   # lo mismo que queda en metrics['json_path']
+"""
+import contextvars
+import cProfile
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+metrics_dir = 'metrics'
+# Perfil con cProfile por defecto (la interfaz y la CLI pueden activarlo por ejecución)
+profile_enabled = os.environ.get('SIMS_PROFILE', '0') == '1'
+
+current_metrics = contextvars.ContextVar('current_metrics', default=None)
+
+def peak_rss_mb():
+    """Memoria residente pico de toda la vida del proceso en MB (None si el sistema no la
+       informa). Solo sirve para procesos de una sola medición, como los casos de bench."""
+    # ru_maxrss viene en KiB en Linux
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB (None fuera de Linux)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+def _add(metrics, name, unit, seconds, rows, rss_before=None, rss_after=None):
+    entry = metrics['stages'].setdefault(
+        (unit or '', name), {'seconds': 0.0, 'rows': 0, 'calls': 0, 'rss_mb': None}
+    )
+    entry['seconds'] += seconds
+    entry['rows'] += rows
+    entry['calls'] += 1
+    if rss_before is not None and rss_after is not None:
+        entry['rss_mb'] = (entry['rss_mb'] or 0.0) + rss_after - rss_before
+        metrics['rss_max_mb'] = max(metrics['rss_max_mb'] or 0.0, rss_after)
+
+@contextmanager
+def stage(name, unit=None):
+    """Mide la etapa `name` de `unit`. Se puede anotar el número de filas (y la unidad, si
+       se conoce recién dentro del bloque) en el diccionario que se entrega."""
+    timing = {'unit': unit, 'rows': 0}
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield timing
+        return
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        seconds = time.perf_counter() - start
+        _add(metrics, name, timing['unit'], seconds, timing['rows'], rss_before, rss_mb())
+
+def record_stage(name, unit, seconds, rows=0):
+    """Suma a la ejecución en curso una etapa medida en otro proceso (p. ej. en el pool de SIMs),
+       sin memoria: la de ese proceso no es la de la ejecución."""
+    metrics = current_metrics.get()
+    if metrics is not None:
+        _add(metrics, name, unit, seconds, rows)
+
+def trace_statements(conn):
+    """Cuenta las sentencias que ejecuta `conn` dentro de la ejecución en curso (cada fila de
+       un executemany cuenta como una). Fuera de una ejecución con perfil no hace nada."""
+    metrics = current_metrics.get()
+    if metrics is not None and metrics['statements'] is not None:
+        def count(_):
+            metrics['statements'] += 1
+        conn.set_trace_callback(count)
+
+@contextmanager
+def run_metrics(name, profile=None):
+    """Abre una ejecución de métricas. Al cerrar escribe {name}_{fecha}_{id}.json (y .prof si
+       `profile`) en metrics_dir y deja sus rutas en 'json_path' y 'profile_path'.
+       El perfil cubre solo el hilo que abre la ejecución."""
+    run_id = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    profile = profile_enabled if profile is None else profile
+    rss_start = rss_mb()
+    metrics = {
+        'run': run_id, 'stages': {}, 'statements': 0 if profile else None, 'json_path': None, 'profile_path': None,
+        'rss_start_mb': rss_start, 'rss_max_mb': rss_start
+    }
+    profiler = cProfile.Profile() if profile else None
+    token = current_metrics.set(metrics)
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        current_metrics.reset(token)
+        metrics['seconds'] = time.perf_counter() - start
+        os.makedirs(metrics_dir, exist_ok=True)
+        if profiler is not None:
+            metrics['profile_path'] = os.path.join(metrics_dir, f"{run_id}.prof")
+            profiler.dump_stats(metrics['profile_path'])
+        metrics['json_path'] = os.path.join(metrics_dir, f"{run_id}.json")
+        write_metrics(metrics)
+
+def metrics_rows(metrics):
+    """Filas por (unidad, etapa) con segundos, filas, filas/s, llamadas y lo que creció la
+       memoria residente en MB, en orden de registro."""
+    return [
+        {
+            'unidad': unit,
+            'etapa': name,
+            'segundos': round(entry['seconds'], 3),
+            'filas': entry['rows'],
+            'filas_por_s': round(entry['rows'] / entry['seconds']) if entry['rows'] and entry['seconds'] > 0 else None,
+            'llamadas': entry['calls'],
+            'memoria_mb': round(entry['rss_mb'], 1) if entry['rss_mb'] is not None else None
+        }
+        for (unit, name), entry in metrics['stages'].items()
+    ]
+
+def metrics_summary(metrics):
+    """Resumen serializable en JSON de una ejecución cerrada (el mismo que se escribe en disco)."""
+    return {
+        'run': metrics['run'],
+        'seconds': round(metrics['seconds'], 3),
+        'rss_start_mb': round(metrics['rss_start_mb'], 1) if metrics['rss_start_mb'] is not None else None,
+        'rss_max_mb': round(metrics['rss_max_mb'], 1) if metrics['rss_max_mb'] is not None else None,
+        'sqlite_statements': metrics['statements'],
+        'json_path': metrics['json_path'],
+        'profile_path': metrics['profile_path'],
+        'stages': metrics_rows(metrics)
+    }
+
+def write_metrics(metrics):
+    with open(metrics['json_path'], 'w', encoding='utf-8') as metrics_file:
+        json.dump(metrics_summary(metrics), metrics_file, ensure_ascii=False, indent=2)
+
+def record_render(summary, seconds):
+    """Agrega al JSON de una ejecución (`summary`, de metrics_summary) el tiempo de la primera vez
+       que se mostraron sus resultados. Se escribe una sola vez por ejecución: `summary` queda
+       marcado y no se reescribe un JSON que ya lo tiene (p. ej. al reabrir una carga del ledger)."""
+    if 'render_seconds' in summary:
+        return
+    summary['render_seconds'] = round(seconds, 3)
+    json_path = summary['json_path']
+    if not json_path or not os.path.exists(json_path):
+        return
+    with open(json_path, encoding='utf-8') as metrics_file:
+        recorded = json.load(metrics_file)
+    if 'render_seconds' in recorded:
+        return
+    recorded['render_seconds'] = summary['render_seconds']
+    with open(json_path, 'w', encoding='utf-8') as metrics_file:
+        json.dump(recorded, metrics_file, ensure_ascii=False, indent=2)
@@ -0,0 +1,629 @@
+"""Carga y homologación de los Excel de plataformas (WIALON, ADAS, COMBUSTIBLE) en la tabla 'datos'."""
+import re
+import sqlite3
+import time
+from datetime import date, datetime
+from operator import itemgetter
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from .log import logger, should_trace
+from .metrics import stage, record_stage
+from .records import RecordStore
+from .storage import connect, write_transaction
+
+default_mappings_plataformas = {
+    "WIALON": {
+        'Nombre': 'Nombre',
+        'Cliente_Cuenta': 'Cuenta',
+        'Tipo_de_Dispositivo': 'Tipo de dispositivo',
+        'IMEI': 'IMEI',
+        'ICCID': 'Iccid',
+        'Fecha_de_Activacion': 'Creada',
+        'Fecha_de_Desactivacion': 'Desactivación',
+        'Hora_de_Ultimo_Mensaje': 'Hora de último mensaje',
+        'Ultimo_Reporte': 'Ultimo Reporte',
+        'Vehiculo': None,
+        'Servicios': None,
+        'Grupo': 'Grupos',
+        'Telefono': 'Teléfono',
+        'Origen': 'WIALON',    # Se asigna manualmente
+        'Fecha_Archivo': None  # Se llenará con la fecha detectada en el nombre del archivo
+    },
+    "ADAS": {
+        'Nombre': 'equipo',
+        'Cliente_Cuenta': 'Subordinar',
+        'Tipo_de_Dispositivo': 'Modelo',
+        'IMEI': 'IMEI',
+        'ICCID': 'Iccid',
+        'Fecha_de_Activacion': 'Activation Date',
+        'Fecha_de_Desactivacion': None,
+        'Hora_de_Ultimo_Mensaje': None,
+        'Ultimo_Reporte': None,
+        'Vehiculo': None,
+        'Servicios': None,
+        'Grupo': None,
+        'Telefono': 'Número de tarjeta SIM',
+        'Origen': 'ADAS',
+        'Fecha_Archivo': None
+    },
+    "COMBUSTIBLE": {
+        'Nombre': 'Vehículo',
+        'Cliente_Cuenta': 'Cuenta',
+        'Tipo_de_Dispositivo': 'Tanques',
+        'IMEI': None,
+        'ICCID': None,
+        'Fecha_de_Activacion': None,
+        'Fecha_de_Desactivacion': None,
+        'Hora_de_Ultimo_Mensaje': None,
+        'Ultimo_Reporte': 'Último reporte',
+        'Vehiculo': 'Vehículo',
+        'Servicios': 'Servicios',
+        'Grupo': 'Grupos',
+        'Telefono': 'Línea',
+        'Origen': 'COMBUSTIBLE',
+        'Fecha_Archivo': None
+    }
+}
+
+# Columnas de la tabla 'datos', en el orden de las tuplas homologadas
+columns_plataformas = [
+    'Nombre', 'Cliente_Cuenta', 'Tipo_de_Dispositivo', 'IMEI', 'ICCID',
+    'Fecha_de_Activacion', 'Fecha_de_Desactivacion', 'Hora_de_Ultimo_Mensaje',
+    'Ultimo_Reporte', 'Vehiculo', 'Servicios', 'Grupo', 'Telefono', 'Origen', 'Fecha_Archivo'
+]
+
+# Tipo de cada columna en el almacén en memoria de una carga (ver records.RecordStore): las de
+# pocos valores distintos se codifican por diccionario, el IMEI (entero en Excel) va en un array
+# y el Telefono ya limpio (solo dígitos) también, como número. Las fechas de activación y
+# desactivación quedan como objetos: casi cada dispositivo trae la suya
+column_kinds_plataformas = {
+    'Cliente_Cuenta': 'category',
+    'Tipo_de_Dispositivo': 'category',
+    'IMEI': 'int',
+    'Servicios': 'category',
+    'Grupo': 'category',
+    'Telefono': 'digits',
+    'Origen': 'category',
+    'Fecha_Archivo': 'category'
+}
+
+# Columnas de fecha y hora de 'datos' que además se guardan normalizadas en segundos desde
+# 1970-01-01 (INTEGER, la hora local de la plataforma tal como viene, sin zona horaria), para
+# que las consultas por rango de fechas usen un índice en lugar de parsear el texto
+timestamp_columns_plataformas = {
+    'Fecha_de_Activacion': 'Fecha_de_Activacion_Epoch',
+    'Fecha_de_Desactivacion': 'Fecha_de_Desactivacion_Epoch',
+    'Hora_de_Ultimo_Mensaje': 'Hora_de_Ultimo_Mensaje_Epoch',
+    'Ultimo_Reporte': 'Ultimo_Reporte_Epoch'
+}
+# Última actividad del dispositivo en cualquier plataforma: la mayor entre Hora_de_Ultimo_Mensaje
+# y Ultimo_Reporte (NULL si la plataforma no informa ninguna, como ADAS)
+last_activity_column = 'Ultima_Actividad_Epoch'
+epoch_columns_plataformas = list(timestamp_columns_plataformas.values()) + [last_activity_column]
+
+# Formatos que se prueban en los textos de fecha; ante un empate gana el primero, salvo entre
+# día/mes y mes/día, que no se decide por el orden de la lista (ver _parse_texts). 'ISO8601'
+# cubre AAAA-MM-DD con o sin hora y str(datetime), con o sin microsegundos.
+timestamp_formats = [
+    'ISO8601',
+    '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d.%m.%Y',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y %I:%M:%S %p', '%d/%m/%Y',
+    '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y',
+    '%d-%m-%Y %H:%M:%S', '%d-%m-%Y'
+]
+# Textos distintos de la columna con los que se elige el formato
+timestamp_sample_size = 200
+
+# Número máximo de filas por lote en la lectura por streaming de plataformas
+default_batch_size_plataformas = 5000
+
+def create_database_plataformas(db_path):
+    """Crea (o verifica) la tabla para plataformas en la base de datos SQLite. A una base creada
+       antes de las columnas de epoch_columns_plataformas se le agregan y se calculan."""
+    conn = connect(db_path)
+    with write_transaction(conn):
+        conn.execute(''' 
+            CREATE TABLE IF NOT EXISTS datos ( 
+                Nombre TEXT,
+                Cliente_Cuenta TEXT,
+                Tipo_de_Dispositivo TEXT,
+                IMEI TEXT,
+                ICCID TEXT,
+                Fecha_de_Activacion TEXT,
+                Fecha_de_Desactivacion TEXT,
+                Hora_de_Ultimo_Mensaje TEXT,
+                Ultimo_Reporte TEXT,
+                Vehiculo TEXT,
+                Servicios TEXT,
+                Grupo TEXT,
+                Telefono TEXT,
+                Origen TEXT,
+                Fecha_Archivo TEXT,
+                Fecha_de_Activacion_Epoch INTEGER,
+                Fecha_de_Desactivacion_Epoch INTEGER,
+                Hora_de_Ultimo_Mensaje_Epoch INTEGER,
+                Ultimo_Reporte_Epoch INTEGER,
+                Ultima_Actividad_Epoch INTEGER,
+                UNIQUE(Nombre, Cliente_Cuenta, Telefono)
+            ) 
+        ''')
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(datos)")}
+        missing = [column for column in epoch_columns_plataformas if column not in existing]
+        for column in missing:
+            conn.execute(f"ALTER TABLE datos ADD COLUMN {column} INTEGER")
+    if missing:
+        backfill_epochs_plataformas(conn)
+    conn.close()
+
+def backfill_epochs_plataformas(conn, batch_size=default_batch_size_plataformas):
+    """Calcula las columnas de epoch_columns_plataformas de todas las filas de 'datos' a partir
+       de sus textos, por lotes de `batch_size` filas en orden de rowid (una transacción por lote).
+       Los formatos de fecha se detectan una vez para toda la tabla, como en una carga."""
+    detected_formats = {}
+    assignments = ", ".join(f"{column} = ?" for column in epoch_columns_plataformas)
+    after_rowid = 0
+    updated = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT rowid, {', '.join(columns_plataformas)} FROM datos WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (after_rowid, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        epochs = timestamp_epochs_plataformas([row[1:] for row in rows], detected_formats)
+        with write_transaction(conn):
+            conn.executemany(
+                f"UPDATE datos SET {assignments} WHERE rowid = ?",
+                (epoch + (row[0],) for epoch, row in zip(epochs, rows))
+            )
+        after_rowid = rows[-1][0]
+        updated += len(rows)
+    logger.info(f"Fechas normalizadas de {updated} registros existentes de plataformas.")
+
+# Columnas de UNIQUE(Nombre, Cliente_Cuenta, Telefono) en las tuplas homologadas
+_unique_key_plataformas = itemgetter(
+    columns_plataformas.index('Nombre'), columns_plataformas.index('Cliente_Cuenta'), columns_plataformas.index('Telefono')
+)
+
+def bulk_insert_data_plataformas(conn, data, detected_formats=None, rowids=None):
+    """Inserta un lote de tuplas en 'datos' y devuelve (inserted, not_inserted).
+       Todo el lote va en un único executemany con INSERT OR IGNORE, dentro de una transacción
+       de escritura desde el principio (ver storage.write_transaction): las filas que SQLite
+       ignora son duplicados según UNIQUE(Nombre, Cliente_Cuenta, Telefono), ya sea contra la
+       tabla o dentro del mismo lote. Los duplicados se detectan en bloque, como en
+       bulk_insert_data_sims: cada fila se inserta con rowid = base + posición en el lote; si
+       total_changes creció en el largo del lote no hubo ninguno, y si no, una consulta por
+       rango de rowid devuelve las posiciones insertadas. Las claves no se comparan en Python
+       (con afinidad TEXT un número del Excel se guarda como texto). executemany es más rápido
+       que un execute por fila en los lotes sin duplicados; en los que tienen, la consulta por
+       rango de rowid se come esa ventaja (ver los casos plataformas.insercion e
+       insercion_filas de bench, con y sin --duplicates).
+       Las columnas de epoch_columns_plataformas se calculan para todo el lote antes de abrir
+       la transacción (ver timestamp_epochs_plataformas); una carga pasa en `detected_formats`
+       el mismo diccionario en todos sus lotes. Si se pasa la lista `rowids`, se le agregan
+       los rowids de las filas insertadas, en orden."""
+    if not data:
+        return [], []
+    epochs = timestamp_epochs_plataformas(data, detected_formats)
+    cursor = conn.cursor()
+    with write_transaction(conn):
+        base = cursor.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM datos").fetchone()[0]
+        changes = conn.total_changes
+        cursor.executemany(
+            '''INSERT OR IGNORE INTO datos (
+                rowid, Nombre, Cliente_Cuenta, Tipo_de_Dispositivo, IMEI, ICCID,
+                Fecha_de_Activacion, Fecha_de_Desactivacion, Hora_de_Ultimo_Mensaje,
+                Ultimo_Reporte, Vehiculo, Servicios, Grupo, Telefono, Origen, Fecha_Archivo,
+                Fecha_de_Activacion_Epoch, Fecha_de_Desactivacion_Epoch, Hora_de_Ultimo_Mensaje_Epoch,
+                Ultimo_Reporte_Epoch, Ultima_Actividad_Epoch
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            ((base + seq,) + tuple(record) + record_epochs
+             for seq, (record, record_epochs) in enumerate(zip(data, epochs)))
+        )
+        if conn.total_changes - changes == len(data):
+            inserted_seqs = range(len(data))
+            inserted, not_inserted = list(data), []
+        else:
+            inserted_seqs = [seq for (seq,) in cursor.execute(
+                "SELECT rowid - ? FROM datos WHERE rowid >= ? ORDER BY rowid", (base, base)
+            )]
+            inserted_set = set(inserted_seqs)
+            inserted = [data[seq] for seq in inserted_seqs]
+            not_inserted = [record for seq, record in enumerate(data) if seq not in inserted_set]
+    if rowids is not None:
+        rowids.extend(base + seq for seq in inserted_seqs)
+    logger.info(
+        f"Insertados {len(inserted)} registros en la base de datos de plataformas "
+        f"({len(not_inserted)} duplicados)."
+    )
+    return inserted, not_inserted
+
+def insert_data_plataformas(db_path, data):
+    """Inserta una lista de tuplas en la tabla 'datos' de plataformas."""
+    conn = sqlite3.connect(db_path)
+    try:
+        inserted, _ = bulk_insert_data_plataformas(conn, data)
+    except sqlite3.IntegrityError as e:
+        logger.error(f"Error al insertar datos: {e}")
+        inserted = []
+    conn.close()
+    return len(inserted)
+
+def save_not_inserted_plataformas(conn, load_key, records):
+    """Guarda en la tabla 'no_insertados' las tuplas rechazadas por duplicadas en la carga
+       `load_key` (columna Carga), reemplazando las de una carga anterior con la misma clave,
+       para poder consultarlas por páginas sin conservarlas en memoria."""
+    cursor = conn.cursor()
+    cursor.executescript(f'''
+        CREATE TABLE IF NOT EXISTS no_insertados (
+            {', '.join(f'{column} TEXT' for column in columns_plataformas)},
+            Carga TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_no_insertados_Carga ON no_insertados (Carga, Cliente_Cuenta);
+    ''')
+    with write_transaction(conn):
+        cursor.execute("DELETE FROM no_insertados WHERE Carga = ?", (load_key,))
+        cursor.executemany(
+            f"INSERT INTO no_insertados VALUES ({', '.join('?' * (len(columns_plataformas) + 1))})",
+            (tuple(record) + (load_key,) for record in records)
+        )
+
+_non_digits = re.compile(r'\D')
+
+def clean_telefono(telefono):
+    """Elimina caracteres no numéricos de un teléfono y lo devuelve como string."""
+    if telefono:
+        telefono = str(telefono)
+        # La mayoría ya vienen limpios (isdecimal acepta lo mismo que \d): solo se limpian los demás
+        if not telefono.isdecimal():
+            telefono = _non_digits.sub('', telefono)
+        if telefono:
+            return telefono
+    return None
+
+def _seconds(parsed):
+    # Segundos desde 1970-01-01 de una serie datetime64 (cualquier resolución), NaN en NaT
+    values = parsed.to_numpy(dtype='datetime64[s]')
+    seconds = values.astype(np.int64).astype(float)
+    seconds[np.isnat(values)] = np.nan
+    return seconds
+
+def _day_first(timestamp_format):
+    # Orden del formato: True (día/mes), False (mes/día) o None (ISO, sin ambigüedad)
+    if timestamp_format.startswith('%d'):
+        return True
+    if timestamp_format.startswith('%m'):
+        return False
+    return None
+
+def _apply_format(texts, timestamp_format, result):
+    # Parsea con un formato, guarda en `result` lo reconocido y devuelve los textos que faltan
+    parsed = pd.to_datetime(texts, format=timestamp_format, errors='coerce')
+    recognized = parsed.notna().to_numpy()
+    result[texts.index[recognized]] = _seconds(parsed[recognized])
+    return texts[~recognized]
+
+def _parse_texts(texts, result, accepted):
+    """Parsea `texts` (serie de textos no vacíos) en `result` y devuelve (sin reconocer, ambiguos).
+       `accepted` son los formatos ya elegidos para la columna en esta carga y se amplía aquí:
+       primero se prueban esos y, con lo que quede, se elige otro por el que más textos reconoce
+       en una muestra, nunca con el orden día/mes contrario al ya elegido. Si un formato día/mes
+       y uno mes/día reconocen lo mismo se decide con todos los textos; si aun así empatan, no
+       se elige ninguno y solo valen los textos que dan la misma fecha en ambos órdenes."""
+    ambiguous = texts.iloc[:0]
+    for timestamp_format in accepted:
+        texts = _apply_format(texts, timestamp_format, result)
+    while len(texts):
+        orders = {_day_first(timestamp_format) for timestamp_format in accepted} - {None}
+        candidates = [
+            timestamp_format for timestamp_format in timestamp_formats
+            if timestamp_format not in accepted and (not orders or _day_first(timestamp_format) in orders | {None})
+        ]
+        sample = texts.drop_duplicates().head(timestamp_sample_size)
+        counts = {
+            timestamp_format: int(pd.to_datetime(sample, format=timestamp_format, errors='coerce').notna().sum())
+            for timestamp_format in candidates
+        }
+        best_count = max(counts.values(), default=0)
+        if not best_count:
+            break
+        tied = [timestamp_format for timestamp_format in candidates if counts[timestamp_format] == best_count]
+        day_first = next((timestamp_format for timestamp_format in tied if _day_first(timestamp_format) is True), None)
+        month_first = next((timestamp_format for timestamp_format in tied if _day_first(timestamp_format) is False), None)
+        if day_first and month_first:
+            by_day = pd.to_datetime(texts, format=day_first, errors='coerce')
+            by_month = pd.to_datetime(texts, format=month_first, errors='coerce')
+            day_count, month_count = int(by_day.notna().sum()), int(by_month.notna().sum())
+            if day_count == month_count:
+                same = (by_day == by_month).to_numpy()
+                result[texts.index[same]] = _seconds(by_day[same])
+                recognized = (by_day.notna() | by_month.notna()).to_numpy()
+                ambiguous = pd.concat([ambiguous, texts[recognized & ~same]])
+                texts = texts[~recognized]
+                continue
+            tied = [day_first if day_count > month_count else month_first]
+        accepted.append(tied[0])
+        texts = _apply_format(texts, tied[0], result)
+    return texts, ambiguous
+
+def timestamp_seconds(values, formats=None, origen=None, field=None):
+    """Convierte una columna de fechas (datetime de Excel o texto) en un array de segundos desde
+       1970-01-01 (float, NaN si no hay fecha, no se reconoce o es ambigua entre día/mes y
+       mes/día). `formats` es la lista de formatos elegidos para esta columna en la carga en
+       curso (ver _parse_texts): se detectan en el primer lote que los decide y los siguientes
+       se parsean directamente con ellos, cada formato en una sola llamada a pandas.
+       `origen` y `field` solo se usan en los avisos del log."""
+    formats = [] if formats is None else formats
+    series = pd.Series(values, dtype=object)
+    result = np.full(len(series), np.nan)
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred == 'empty':
+        return result
+    if inferred == 'string':
+        # Caso habitual: la columna entera es texto y no hace falta mirar el tipo de cada valor
+        texts = series[series.notna().to_numpy()]
+    else:
+        types = series.map(type)
+        dates = types.isin([datetime, date, pd.Timestamp]).to_numpy()
+        if dates.any():
+            result[dates] = _seconds(pd.to_datetime(series[dates], errors='coerce'))
+        texts = series[(types == str).to_numpy()]
+    texts, ambiguous = _parse_texts(texts[texts != ''], result, formats)
+    if len(texts):
+        # Espacios alrededor (p. ej. ' 2024-01-15 ') solo se quitan en lo que no se reconoció
+        texts = texts.str.strip()
+        texts, stripped_ambiguous = _parse_texts(texts[texts != ''], result, formats)
+        ambiguous = pd.concat([ambiguous, stripped_ambiguous])
+    if len(ambiguous):
+        logger.warning(
+            f"{len(ambiguous)} valores de {field} ({origen}) se pueden leer como día/mes o como mes/día, "
+            f"p. ej. {ambiguous.iloc[0]!r}: quedan sin fecha normalizada."
+        )
+    if len(texts):
+        logger.warning(
+            f"{len(texts)} valores de {field} ({origen}) sin un formato de fecha reconocido, "
+            f"p. ej. {texts.iloc[0]!r}: quedan sin fecha normalizada."
+        )
+    return result
+
+def timestamp_epochs_plataformas(data, detected_formats=None):
+    """Columnas de epoch_columns_plataformas de un lote de tuplas homologadas: una tupla de
+       enteros (o None) por fila. Cada columna de fecha se convierte por plataforma (Origen)
+       con timestamp_seconds, y la última actividad es la mayor entre Hora_de_Ultimo_Mensaje
+       y Ultimo_Reporte. `detected_formats` ({(origen, columna): formatos}) se comparte entre
+       los lotes de una misma carga para que toda la columna use los mismos formatos."""
+    if not data:
+        return []
+    detected_formats = {} if detected_formats is None else detected_formats
+    origin_index = columns_plataformas.index('Origen')
+    codes, origins = pd.factorize(pd.Series([record[origin_index] for record in data], dtype=object), use_na_sentinel=False)
+    groups = [(origen, np.flatnonzero(codes == code)) for code, origen in enumerate(origins)]
+    seconds = np.full((len(data), len(epoch_columns_plataformas)), np.nan)
+    for position, field in enumerate(timestamp_columns_plataformas):
+        field_index = columns_plataformas.index(field)
+        values = [record[field_index] for record in data]
+        for origen, rows in groups:
+            group_values = values if len(groups) == 1 else [values[row] for row in rows]
+            formats = detected_formats.setdefault((origen, field), [])
+            seconds[rows, position] = timestamp_seconds(group_values, formats, origen, field)
+    message, report = (list(timestamp_columns_plataformas).index(field) for field in ('Hora_de_Ultimo_Mensaje', 'Ultimo_Reporte'))
+    seconds[:, -1] = np.fmax(seconds[:, message], seconds[:, report])
+    epochs = np.floor(np.nan_to_num(seconds)).astype(np.int64).astype(object)
+    epochs[np.isnan(seconds)] = None
+    return list(map(tuple, epochs.tolist()))
+
+def compile_mapping_plataformas(headers, mapping, fecha_archivo):
+    """Resuelve el mapeo de una hoja a posiciones fijas de sus columnas y devuelve
+       `project(fila)`: la tupla homologada (en el orden de columns_plataformas), o None si la
+       fila no tiene Cliente_Cuenta. Origen y Fecha_Archivo son constantes y Telefono pasa por
+       clean_telefono. Las posiciones se resuelven una vez por hoja y cada fila se proyecta
+       con un solo operator.itemgetter, sin diccionarios intermedios. Un campo cuya columna
+       no está en `headers` queda en None; si un encabezado se repite vale la última columna."""
+    positions = {header: index for index, header in enumerate(headers)}
+
+    def column(field):
+        column_name = mapping.get(field)
+        return positions.get(column_name) if column_name else None
+
+    required = column('Cliente_Cuenta')
+    if required is None:
+        # Sin Cliente_Cuenta en la hoja ninguna fila es válida
+        return lambda row: None
+
+    # Cada fila se extiende con (None, Origen, Fecha_Archivo): los campos sin columna y los
+    # constantes se toman de ese final con índices negativos, en el mismo itemgetter
+    constants = (None, mapping.get('Origen'), fecha_archivo)
+    indexes = []
+    for field in columns_plataformas:
+        if field == 'Origen':
+            indexes.append(-2)
+        elif field == 'Fecha_Archivo':
+            indexes.append(-1)
+        elif column(field) is None:
+            indexes.append(-3)
+        else:
+            indexes.append(column(field))
+    pick = itemgetter(*indexes)
+    telefono = columns_plataformas.index('Telefono')
+    width = max(index for index in indexes if index >= 0) + 1
+    # En modo solo lectura las filas pueden venir más cortas que el encabezado
+    padding = (None,) * width
+
+    def project(row):
+        if len(row) < width:
+            row = row + padding[len(row):]
+        if not row[required]:
+            return None
+        values = pick(row + constants)
+        return values[:telefono] + (clean_telefono(values[telefono]),) + values[telefono + 1:]
+    return project
+
+def extract_date_from_filename(filename):
+    """Extrae la fecha (formato YYYY-MM-DD) del nombre de un archivo. 
+       Si no la encuentra, devuelve la fecha actual."""
+    match = re.search(r'\d{4}-\d{2}-\d{2}', filename)
+    if match:
+        return match.group(0)
+    else:
+        return datetime.now().strftime('%Y-%m-%d')
+
+def iter_excel_file_plataformas(excel_file, mappings, batch_size=default_batch_size_plataformas, progress=None):
+    """Recorre el Excel de plataformas en modo de solo lectura y genera lotes.
+       Solo se abren las hojas presentes en `mappings`; cada lote es una tupla
+       (sheet_name, valid_batch, invalid_batch) con a lo sumo `batch_size` filas,
+       de modo que la memoria no crece con el tamaño del archivo.
+       Si se pasa `progress(hoja, filas, total)`, se llama al abrir el libro con el total
+       estimado de cada hoja y, después de que se consume cada lote, con las filas
+       acumuladas de la hoja (ver sims_plataformas.jobs).
+       Mide las etapas 'carga_libro', 'encabezados' y 'mapeo_filas' (sin contar el tiempo
+       del consumidor de los lotes; ver sims_plataformas.metrics)."""
+    # Se usa el nombre del archivo subido para extraer la fecha
+    filename = excel_file.name
+    fecha_archivo = extract_date_from_filename(filename)
+    if hasattr(excel_file, 'seek'):
+        excel_file.seek(0)
+    with stage('carga_libro', filename):
+        workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+
+    try:
+        if progress is not None:
+            # max_row sale de la dimensión declarada en la hoja (puede faltar o incluir filas vacías)
+            for sheet_name in workbook.sheetnames:
+                if sheet_name in mappings:
+                    max_row = workbook[sheet_name].max_row
+                    progress(sheet_name, 0, max(max_row - 1, 0) if max_row else None)
+        for sheet_name in workbook.sheetnames:
+            if sheet_name not in mappings:
+                continue
+            mapping = mappings[sheet_name]
+            with stage('encabezados', sheet_name):
+                rows = workbook[sheet_name].iter_rows(values_only=True)
+                headers = list(next(rows, ()))
+                project = compile_mapping_plataformas(headers, mapping, fecha_archivo)
+            valid_batch = []
+            invalid_batch = []
+            sheet_valid = 0
+            sheet_invalid = 0
+            mapping_start = time.perf_counter()
+
+            for row in rows:
+                # Verificación mínima: que exista el campo "Cliente_Cuenta" (ver compile_mapping_plataformas)
+                record = project(row)
+                if record is not None:
+                    valid_batch.append(record)
+                    sheet_valid += 1
+                    if should_trace():
+                        logger.info("Procesado registro válido en '%s': %s", sheet_name, dict(zip(columns_plataformas, record)))
+                else:
+                    row_dict = {headers[i]: (row[i] if i < len(row) else None) for i in range(len(headers))}
+                    invalid_batch.append(row_dict)
+                    sheet_invalid += 1
+                    if should_trace():
+                        logger.warning("Registro inválido en '%s': %s", sheet_name, row_dict)
+
+                if len(valid_batch) + len(invalid_batch) >= batch_size:
+                    record_stage(
+                        'mapeo_filas', sheet_name, time.perf_counter() - mapping_start,
+                        len(valid_batch) + len(invalid_batch)
+                    )
+                    yield sheet_name, valid_batch, invalid_batch
+                    valid_batch = []
+                    invalid_batch = []
+                    if progress is not None:
+                        progress(sheet_name, sheet_valid + sheet_invalid)
+                    mapping_start = time.perf_counter()
+
+            record_stage(
+                'mapeo_filas', sheet_name, time.perf_counter() - mapping_start, len(valid_batch) + len(invalid_batch)
+            )
+            if valid_batch or invalid_batch:
+                yield sheet_name, valid_batch, invalid_batch
+            if progress is not None:
+                progress(sheet_name, sheet_valid + sheet_invalid, sheet_valid + sheet_invalid)
+            logger.info(f"Hoja '{sheet_name}': {sheet_valid} registros válidos, {sheet_invalid} inválidos.")
+    finally:
+        # En modo solo lectura el libro mantiene el archivo abierto hasta cerrarlo
+        workbook.close()
+
+def process_excel_file_plataformas(excel_file, mappings):
+    """Procesa el archivo Excel para plataformas y devuelve:
+       - all_data: lista de tuplas listas para insertar,
+       - invalid_data: filas que no cumplen los requisitos,
+       - total_records: número total de filas leídas."""
+    all_data = []
+    invalid_data = []
+    total_records = 0
+
+    for _, valid_batch, invalid_batch in iter_excel_file_plataformas(excel_file, mappings):
+        total_records += len(valid_batch) + len(invalid_batch)
+        all_data.extend(valid_batch)
+        invalid_data.extend(invalid_batch)
+
+    return all_data, invalid_data, total_records
+
+def load_excel_file_plataformas(excel_file, mappings, conn, batch_size=default_batch_size_plataformas, progress=None,
+                                history_conn=None):
+    """Lee el Excel de plataformas por lotes, inserta cada lote en 'datos' (ver
+       bulk_insert_data_plataformas) y, si se pasa `history_conn`, lo agrega a la foto en curso
+       del historial (ver stage_snapshot). Las filas válidas no se acumulan: la memoria queda
+       acotada por el tamaño del lote. Devuelve un diccionario con el resultado:
+       - not_inserted: tuplas rechazadas por duplicadas, en un RecordStore (columnar, se recorre
+         como la lista de tuplas; ver sims_plataformas.records),
+       - total_records, inserted_count, invalid_count,
+       - platform_ranges: {hoja: (inicio, fin)} con el rango de filas válidas de cada plataforma
+         en el orden de lectura. Las hojas se leen completas una tras otra, así que cada
+         plataforma ocupa un bloque contiguo.
+       - platform_rowids: {hoja: (primero, último)} con los rowids de las filas que la carga
+         insertó en 'datos' (solo las hojas con alguna); para consultar las filas de esta
+         carga y no todas las de la base. Otra sesión que cargue a la vez en la misma base
+         puede intercalar sus lotes dentro del rango.
+       - sample_keys: la clave UNIQUE (Nombre, Cliente_Cuenta, Telefono) de la primera fila de
+         cada lote, para comprobar después que la carga sigue en la base (ver ledger).
+       `progress` se pasa a iter_excel_file_plataformas; si lanza una excepción (p. ej. al
+       cancelar) la carga se interrumpe y los lotes ya insertados quedan en la base."""
+    # history importa este módulo (columnas de 'datos')
+    from .history import stage_snapshot
+
+    not_inserted = RecordStore(columns_plataformas, column_kinds_plataformas)
+    valid_count = 0
+    inserted_count = 0
+    invalid_count = 0
+    platform_ranges = {}
+    platform_rowids = {}
+    sample_keys = []
+    # Formatos de fecha de esta carga, por (Origen, columna)
+    detected_formats = {}
+    for sheet_name, batch, invalid_batch in iter_excel_file_plataformas(excel_file, mappings, batch_size, progress):
+        start, _ = platform_ranges.get(sheet_name, (valid_count, valid_count))
+        invalid_count += len(invalid_batch)
+        valid_count += len(batch)
+        platform_ranges[sheet_name] = (start, valid_count)
+        batch_rowids = []
+        with stage('insercion', sheet_name) as timing:
+            batch_inserted, batch_not_inserted = bulk_insert_data_plataformas(
+                conn, batch, detected_formats, batch_rowids
+            )
+            timing['rows'] = len(batch)
+        if batch_rowids:
+            first, _ = platform_rowids.get(sheet_name, (batch_rowids[0], None))
+            platform_rowids[sheet_name] = (first, batch_rowids[-1])
+        inserted_count += len(batch_inserted)
+        not_inserted.extend(batch_not_inserted)
+        if batch:
+            sample_keys.append(_unique_key_plataformas(batch[0]))
+        if history_conn is not None:
+            with stage('historial', sheet_name) as timing:
+                timing['rows'] = len(batch)
+                stage_snapshot(history_conn, 'datos', batch)
+    return {
+        'not_inserted': not_inserted,
+        'total_records': valid_count + invalid_count,
+        'inserted_count': inserted_count,
+        'invalid_count': invalid_count,
+        'platform_ranges': platform_ranges,
+        'platform_rowids': platform_rowids,
+        'sample_keys': sample_keys
+    }
@@ -0,0 +1,122 @@
+"""Conciliación entre la tabla 'datos' (plataformas) y la tabla 'sims' (operadores)."""
+import pandas as pd
+
+from .log import logger
+from .storage import connect_readonly, readonly_uri
+
+# Dígitos con los que se comparan los teléfonos (los últimos: así '52' + 10 dígitos
+# coincide con los 10 dígitos) y los ICCID (los primeros: unos operadores incluyen
+# el dígito verificador y otros no)
+phone_key_digits = 10
+iccid_key_digits = 19
+
+# Fragmentos de ESTADO_DEL_SIM (ya en minúsculas) que indican una SIM que no da servicio
+inactive_status_keywords = [
+    'suspend', 'inactiv', 'desactiv', 'deactiv', 'cancel', 'baja', 'bloque', 'block', 'retir', 'termin'
+]
+
+# Categorías del reporte: clave -> título para la interfaz
+reconciliation_categories = {
+    'sims_sin_plataforma': "SIMs de operador sin dispositivo en plataformas",
+    'dispositivos_sin_sim': "Dispositivos de plataformas sin SIM de operador",
+    'dispositivos_sim_inactiva': "Dispositivos con SIM suspendida o inactiva",
+    'iccid_discrepante': "Mismo teléfono con ICCID distinto"
+}
+
+_datos_columns = "d.Nombre, d.Cliente_Cuenta, d.Origen, d.Tipo_de_Dispositivo, d.IMEI, d.ICCID, d.Telefono"
+_sims_columns = "s.ICCID AS ICCID_SIM, s.TELEFONO, s.ESTADO_DEL_SIM, s.EN_SESION, s.ConsumoMb, s.Compania"
+
+_reconciliation_queries = {
+    'sims_sin_plataforma': '''
+        SELECT s.ICCID, s.TELEFONO, s.ESTADO_DEL_SIM, s.EN_SESION, s.ConsumoMb, s.Compania
+        FROM sims_db.sims s
+        WHERE NOT EXISTS (SELECT 1 FROM temp.coincidencias c WHERE c.sim_id = s.rowid)''',
+    'dispositivos_sin_sim': f'''
+        SELECT {_datos_columns}
+        FROM main.datos d
+        WHERE NOT EXISTS (SELECT 1 FROM temp.coincidencias c WHERE c.plat_id = d.rowid)''',
+    'dispositivos_sim_inactiva': f'''
+        SELECT {_datos_columns}, {_sims_columns}, c.via AS Coincide_Por
+        FROM temp.coincidencias c
+        JOIN main.datos d ON d.rowid = c.plat_id
+        JOIN sims_db.sims s ON s.rowid = c.sim_id
+        WHERE s.ESTADO_DEL_SIM IN (SELECT estado FROM temp.estados_inactivos)''',
+    'iccid_discrepante': f'''
+        SELECT {_datos_columns}, {_sims_columns}
+        FROM temp.coincidencias c
+        JOIN main.datos d ON d.rowid = c.plat_id
+        JOIN sims_db.sims s ON s.rowid = c.sim_id
+        WHERE c.via = 'TELEFONO' AND c.plat_iccid <> c.sim_iccid'''
+}
+
+# Claves normalizadas de ambos lados, indexadas, y los pares (dispositivo, SIM) que coinciden:
+# primero por teléfono y, para los dispositivos que no coinciden por teléfono, por ICCID.
+# En 'sims' el ICCID ya quedó solo con dígitos al cargarlo; en 'datos' viene tal cual del
+# Excel y se le quitan espacios, guiones y la 'F' final de algunos operadores (una sola, al
+# final: una 'F' en otra posición no es de relleno y el ICCID no debe coincidir).
+_prepare_script = f'''
+    CREATE TEMP TABLE claves_plataformas AS
+        SELECT id, tel,
+               NULLIF(substr(
+                   CASE WHEN iccid LIKE '%F' THEN substr(iccid, 1, length(iccid) - 1) ELSE iccid END,
+                   1, {iccid_key_digits}
+               ), '') AS iccid
+        FROM (
+            SELECT rowid AS id,
+                   NULLIF(substr(Telefono, -{phone_key_digits}), '') AS tel,
+                   replace(replace(upper(ICCID), ' ', ''), '-', '') AS iccid
+            FROM main.datos
+        );
+    CREATE TEMP TABLE claves_sims AS
+        SELECT rowid AS id,
+               NULLIF(substr(TELEFONO, -{phone_key_digits}), '') AS tel,
+               NULLIF(substr(ICCID, 1, {iccid_key_digits}), '') AS iccid
+        FROM sims_db.sims;
+    CREATE INDEX temp.idx_claves_sims_tel ON claves_sims (tel);
+    CREATE INDEX temp.idx_claves_sims_iccid ON claves_sims (iccid);
+
+    CREATE TEMP TABLE coincidencias AS
+        SELECT p.id AS plat_id, k.id AS sim_id, 'TELEFONO' AS via, p.iccid AS plat_iccid, k.iccid AS sim_iccid
+        FROM claves_plataformas p JOIN claves_sims k ON k.tel = p.tel
+        WHERE p.tel IS NOT NULL;
+    CREATE INDEX temp.idx_coincidencias_plat ON coincidencias (plat_id);
+    INSERT INTO coincidencias
+        SELECT p.id, k.id, 'ICCID', p.iccid, k.iccid
+        FROM claves_plataformas p JOIN claves_sims k ON k.iccid = p.iccid
+        WHERE p.iccid IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM coincidencias c WHERE c.plat_id = p.id);
+    CREATE INDEX temp.idx_coincidencias_sim ON coincidencias (sim_id);
+    CREATE TEMP TABLE estados_inactivos (estado TEXT PRIMARY KEY);
+'''
+
+def _is_inactive_status(status):
+    return any(keyword in status for keyword in inactive_status_keywords)
+
+def reconcile_databases(plataformas_db, sims_db):
+    """Concilia la tabla 'datos' de `plataformas_db` con la tabla 'sims' de `sims_db`.
+       Adjunta ambas bases en una sola conexión y cruza por teléfono normalizado (últimos
+       `phone_key_digits` dígitos) y por ICCID (primeros `iccid_key_digits` dígitos) sobre
+       tablas temporales indexadas, con ambas bases abiertas en solo lectura (no esperan a las
+       cargas en curso).
+       Devuelve {categoría: DataFrame} con las categorías de reconciliation_categories."""
+    conn = connect_readonly(plataformas_db)
+    try:
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("ATTACH DATABASE ? AS sims_db", (readonly_uri(sims_db),))
+        conn.executescript(_prepare_script)
+        # Los estados distintos son pocos: se clasifican aquí y no fila por fila en SQL
+        conn.executemany("INSERT INTO temp.estados_inactivos VALUES (?)", [
+            (status,) for (status,) in conn.execute("SELECT DISTINCT ESTADO_DEL_SIM FROM sims_db.sims")
+            if status and _is_inactive_status(status)
+        ])
+        reports = {
+            category: pd.read_sql_query(query, conn)
+            for category, query in _reconciliation_queries.items()
+        }
+    finally:
+        conn.close()
+    logger.info(
+        "Conciliación de '%s' con '%s': %s", plataformas_db, sims_db,
+        {category: len(df) for category, df in reports.items()}
+    )
+    return reports
@@ -0,0 +1,191 @@
+"""Almacén columnar compacto para las filas homologadas que una carga conserva en memoria.
+
+Una lista de tuplas repite en cada fila las referencias (y a menudo los propios textos) de
+las columnas de pocos valores distintos: Origen, Fecha_Archivo, Cliente_Cuenta, Compania...
+RecordStore guarda cada columna por separado:
+- 'category': valores de un solo tipo (textos, fechas...) codificados por diccionario, con
+  los códigos en un array int32 y cada valor distinto una sola vez (None y NaN son el código -1);
+  si llega un valor de otro tipo la columna pasa a 'object' (1, 1.0 y True serían la misma
+  clave del diccionario),
+- 'int': enteros en un array int64 con máscara de nulos; si llega un valor que no es entero
+  (o no cabe en 64 bits) la columna pasa a 'object',
+- 'digits': textos de solo dígitos (teléfonos, ICCID limpios) guardados como 'int'; cada
+  valor debe volver idéntico con str(int(valor)), si no (ceros a la izquierda, espacios,
+  más de 18-19 dígitos) la columna pasa a 'object',
+- 'object': lista de valores, para las columnas de valores casi únicos (Nombre, ICCID...).
+
+Se comporta como la lista de tuplas que reemplaza: len(), iteración por filas (que se
+decodifican por bloques) y extend/append de tuplas, así que se puede pasar tal cual a un
+executemany. to_frame() arma el DataFrame con una copia de los buffers de las columnas 'int'
+y de los códigos de las 'category' (una sola copia, sin pasar por objetos de Python; pandas
+puede reducir los códigos a int8/int16): un array de numpy sobre el buffer de un array.array
+impide que este crezca (BufferError), y el almacén puede seguir recibiendo filas después. Los
+textos no se copian; las 'digits' se vuelven a convertir en texto.
+
+Uso:
+    store = RecordStore(columns_plataformas, column_kinds_plataformas)
+    store.extend(lote)
+    conn.executemany(sql, store)
+    df = store.to_frame()
+"""
+import sys
+from array import array
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+# Filas que se decodifican a la vez al iterar
+decode_chunk_rows = 65536
+
+class RecordStore:
+    """Filas de `columns` guardadas por columna; `kinds` es {columna: 'category' | 'int' |
+       'digits'} (las demás son 'object')."""
+
+    def __init__(self, columns, kinds=None, rows=()):
+        self.columns = list(columns)
+        self.kinds = [(kinds or {}).get(column, 'object') for column in self.columns]
+        self._data = []
+        for kind in self.kinds:
+            if kind == 'category':
+                self._data.append({'codes': array('i'), 'values': [], 'index': {None: -1}, 'type': None})
+            elif kind in ('int', 'digits'):
+                self._data.append({'values': array('q'), 'nulls': bytearray()})
+            else:
+                self._data.append([])
+        self._length = 0
+        self.extend(rows)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return self.iter_rows()
+
+    def __repr__(self):
+        return f"RecordStore({self._length} filas, {len(self.columns)} columnas)"
+
+    def append(self, row):
+        self.extend([row])
+
+    def extend(self, rows):
+        """Agrega filas (tuplas o listas del largo de `columns`), columna por columna."""
+        rows = rows if isinstance(rows, list) else list(rows)
+        if not rows:
+            return
+        for position, values in enumerate(zip(*rows)):
+            kind = self.kinds[position]
+            if kind == 'category':
+                self._extend_category(position, values)
+            elif kind in ('int', 'digits'):
+                self._extend_int(position, values, kind == 'digits')
+            else:
+                self._data[position].extend(values)
+        self._length += len(rows)
+
+    def _extend_category(self, position, values):
+        column = self._data[position]
+        # NaN, NaT o pd.NA (celdas vacías leídas por pandas) son nulos como None: NaN es distinto
+        # de sí mismo, así que no puede ser una categoría
+        distinct = {value for value in set(values) if not pd.isna(value)}
+        # Los tipos se miran en los valores distintos, que son pocos
+        types = set(map(type, distinct))
+        if column['type'] is None and len(types) == 1:
+            column['type'] = next(iter(types))
+        if not types <= {column['type']}:
+            self._to_object(position, values)
+            return
+        index = column['index']
+        for value in distinct.difference(index):
+            index[value] = len(column['values'])
+            column['values'].append(value)
+        # Los nulos no están en el índice (salvo None) y toman el código -1
+        column['codes'].fromlist(list(map(index.get, values, repeat(-1, len(values)))))
+
+    def _extend_int(self, position, values, digits):
+        column = self._data[position]
+        types = set(map(type, values))
+        present = values
+        if types - {type(None)} <= ({str} if digits else {int}):
+            if type(None) in types:
+                present = [value for value in values if value is not None]
+            try:
+                numbers = list(map(int, present)) if digits else present
+                # '0123', ' 12' o '١٢' no vuelven iguales con str(int(valor))
+                if not digits or list(map(str, numbers)) == list(present):
+                    if present is values:
+                        column['values'].fromlist(list(numbers))
+                        column['nulls'].extend(bytes(len(values)))
+                    else:
+                        numbers = iter(numbers)
+                        column['values'].fromlist([0 if value is None else next(numbers) for value in values])
+                        column['nulls'].extend([value is None for value in values])
+                    return
+            except (ValueError, OverflowError):
+                # fromlist no agrega nada si un valor no cabe en 64 bits
+                pass
+        self._to_object(position, values)
+
+    def _to_object(self, position, values):
+        # La columna se guarda como objetos desde ahora, con las filas ya cargadas decodificadas
+        self._data[position] = self._decode(position, 0, self._length) + list(values)
+        self.kinds[position] = 'object'
+
+    def _decode(self, position, start, end):
+        kind = self.kinds[position]
+        column = self._data[position]
+        if kind == 'category':
+            # El código -1 (None) toma el último elemento
+            lookup = column['values'] + [None]
+            return list(map(lookup.__getitem__, column['codes'][start:end]))
+        if kind in ('int', 'digits'):
+            convert = str if kind == 'digits' else int
+            return [
+                None if null else convert(value)
+                for value, null in zip(column['values'][start:end], column['nulls'][start:end])
+            ]
+        return column[start:end]
+
+    def iter_rows(self, start=0, end=None):
+        """Recorre las filas [start, end) como tuplas, decodificadas por bloques de decode_chunk_rows."""
+        end = self._length if end is None else min(end, self._length)
+        for chunk_start in range(start, end, decode_chunk_rows):
+            chunk_end = min(chunk_start + decode_chunk_rows, end)
+            yield from zip(*(self._decode(position, chunk_start, chunk_end) for position in range(len(self.columns))))
+
+    def to_frame(self):
+        """DataFrame con una columna por campo: Categorical para 'category', Int64 (con nulos)
+           para 'int' y object para el resto. Los buffers de las dos primeras se copian, así que
+           el DataFrame no cambia ni impide extender el almacén después."""
+        data = {}
+        for position, (column, kind, values) in enumerate(zip(self.columns, self.kinds, self._data)):
+            if kind == 'category':
+                data[column] = pd.Categorical.from_codes(
+                    np.frombuffer(values['codes'], dtype=np.int32).copy() if self._length else [],
+                    categories=pd.Index(values['values'], dtype=object)
+                )
+            elif kind == 'int':
+                data[column] = pd.arrays.IntegerArray(
+                    np.frombuffer(values['values'], dtype=np.int64).copy(),
+                    np.frombuffer(values['nulls'], dtype=np.bool_).copy()
+                ) if self._length else pd.array([], dtype='Int64')
+            elif kind == 'digits':
+                data[column] = pd.Series(self._decode(position, 0, self._length), dtype=object)
+            else:
+                data[column] = pd.Series(values, dtype=object)
+        return pd.DataFrame(data, columns=self.columns, copy=False)
+
+    def nbytes(self):
+        """Memoria aproximada en bytes: buffers, listas y valores distintos de las categorías
+           (los textos de las columnas 'object' cuentan aparte, como en una lista de tuplas)."""
+        total = 0
+        for kind, values in zip(self.kinds, self._data):
+            if kind == 'category':
+                total += values['codes'].itemsize * len(values['codes'])
+                total += sys.getsizeof(values['values']) + sys.getsizeof(values['index'])
+                total += sum(sys.getsizeof(value) for value in values['values'])
+            elif kind in ('int', 'digits'):
+                total += values['values'].itemsize * len(values['values']) + len(values['nulls'])
+            else:
+                total += sys.getsizeof(values)
+        return total
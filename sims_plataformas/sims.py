@@ -0,0 +1,753 @@
+"""Carga, limpieza y homologación de los Excel/CSV de SIMs de los operadores en la tabla 'sims'."""
+import io
+import multiprocessing
+import os
+import queue
+import sqlite3
+import time
+import zipfile
+from collections import OrderedDict
+from xml.etree import ElementTree
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, WINDOWS_EPOCH, from_excel, from_ISO8601
+
+from .common import file_content_hash, lru_get, lru_put
+from .history import stage_snapshot
+from .log import forward_worker_logs, init_worker_logging, logger
+from .metrics import stage, record_stage
+from .records import RecordStore
+from .storage import connect, write_transaction
+
+default_mappings_sims = {
+    "SIMPATIC": {
+        'ICCID': 'iccid',
+        'TELEFONO': 'msisdn',
+        'ESTADO DEL SIM': 'status',
+        'EN SESION': 'status',
+        'ConsumoMb': 'consumo en Mb'
+    },
+    "TELCEL ALEJANDRO": {
+        'ICCID': 'ICCID',
+        'TELEFONO': 'MSISDN',
+        'ESTADO DEL SIM': 'ESTADO SIM',
+        'EN SESION': 'SESIÓN',
+        'ConsumoMb': 'LÍMITE DE USO DE DATOS'
+    },
+    "-1": {
+        'ICCID': 'ICCID',
+        'TELEFONO': 'MSISDN',
+        'ESTADO DEL SIM': 'Estado de SIM',
+        'EN SESION': 'En sesión',
+        'ConsumoMb': 'Uso de ciclo hasta la fecha (MB)'
+    },
+    "-2": {
+        'ICCID': 'ICCID',
+        'TELEFONO': 'MSISDN',
+        'ESTADO DEL SIM': 'Estado de SIM',
+        'EN SESION': 'En sesión',
+        'ConsumoMb': 'Uso de ciclo hasta la fecha (MB)'
+    },
+    "TELCEL": {
+        'ICCID': 'Cuenta Padre',
+        'TELEFONO': 'Línea',
+        'ESTADO DEL SIM': 'Estatus línea',
+        'EN SESION': 'Estatus línea',
+        'ConsumoMb': 'Estatus línea'
+    },
+    "MOVISTAR": {
+        'ICCID': 'ICC',
+        'TELEFONO': 'MSISDN',
+        'ESTADO DEL SIM': 'Estado',
+        'EN SESION': 'Estado GPRS',
+        'ConsumoMb': 'Consumo Datos Mensual'
+    },
+    "NANTI": {
+        'ICCID': 'ICCID',
+        'TELEFONO': 'MSISDN',
+        'ESTADO DEL SIM': 'Estado',
+        'EN SESION': 'Estado',
+        'ConsumoMb': 'Estado'
+    },
+    "LEGACY": {
+        'ICCID': 'ICCID',
+        'TELEFONO': 'TELEFONO',
+        'ESTADO DEL SIM': 'Estatus',
+        'EN SESION': 'Estatus',
+        'ConsumoMb': 'BSP Nacional'
+    }
+}
+
+# Número de filas por bloque al leer los CSV de SIMs
+default_chunksize_sims = 100000
+
+# Procesos para parsear y limpiar archivos de SIMs en paralelo, y lotes limpios
+# que pueden esperar en la cola hacia el escritor de SQLite
+default_workers_sims = os.cpu_count() or 1
+default_queue_size_sims = 8
+
+# Registros rechazados por duplicados: al volver a cargar el archivo de un operador casi todas
+# sus filas lo son, así que se guardan en un RecordStore con archivo y pestaña codificados
+rejected_columns_sims = ['Archivo', 'Pestaña', 'ICCID', 'TELEFONO']
+rejected_kinds_sims = {'Archivo': 'category', 'Pestaña': 'category'}
+
+# Encabezados ya leídos por probe_headers_sims (clave = hash del contenido). Ocupan poco,
+# así que la caché es del proceso y la comparten todas las sesiones.
+header_cache_size = 256
+_header_cache = OrderedDict()
+
+_xlsx_ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_xlsx_rel_ns = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+def create_database_sims(db_path):
+    """Crea (o verifica) la tabla para SIMs en la base de datos SQLite."""
+    conn = connect(db_path)
+    with write_transaction(conn):
+        conn.execute(''' 
+            CREATE TABLE IF NOT EXISTS sims ( 
+                ICCID TEXT, 
+                TELEFONO TEXT, 
+                ESTADO_DEL_SIM TEXT, 
+                EN_SESION TEXT, 
+                ConsumoMb TEXT,
+                Compania TEXT,
+                UNIQUE(ICCID, TELEFONO)
+            ) 
+        ''')
+    conn.close()
+
+def bulk_insert_data_sims(conn, data):
+    """Inserta un lote de tuplas en la tabla 'sims' por `conn` y devuelve
+       (procesados, insertados, rechazados), donde rechazados es la lista de pares
+       (ICCID, TELEFONO) ignorados por duplicados. La contabilidad no recorre la tabla:
+       cada fila se inserta con rowid = base + posición en el lote y las insertadas se
+       recuperan con una consulta por rango de rowid, dentro de una transacción de escritura
+       desde el principio (ver storage.write_transaction)."""
+    cursor = conn.cursor()
+    with write_transaction(conn):
+        base = cursor.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM sims").fetchone()[0]
+        cursor.executemany(
+            """INSERT OR IGNORE INTO sims (
+                rowid, ICCID, TELEFONO, ESTADO_DEL_SIM, EN_SESION, ConsumoMb, Compania
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            ((base + seq,) + tuple(record) for seq, record in enumerate(data))
+        )
+        inserted_seqs = {seq for (seq,) in cursor.execute(
+            "SELECT rowid - ? FROM sims WHERE rowid >= ?", (base, base)
+        )}
+
+    records_inserted = len(inserted_seqs)
+    rejected = [(record[0], record[1]) for seq, record in enumerate(data) if seq not in inserted_seqs]
+    logger.info(
+        f"Insertados {records_inserted} registros nuevos en la base de datos de SIMs "
+        f"({len(rejected)} duplicados)."
+    )
+    return len(data), records_inserted, rejected
+
+def insert_data_sims(db_path, data):
+    """Inserta una lista de tuplas en la tabla 'sims' de `db_path` (ver bulk_insert_data_sims)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return bulk_insert_data_sims(conn, data)
+    finally:
+        conn.close()
+
+def save_not_inserted_sims(conn, rejected, ingestions):
+    """Guarda en la tabla 'no_insertados_sims' los rechazados por duplicados `rejected` (filas de
+       rejected_columns_sims) con la carga de su archivo: la columna Carga es el comienzo de la
+       clave del ledger del archivo en `ingestions` {archivo: clave}. Reemplaza los de una carga
+       anterior con las mismas claves. Así el ledger solo guarda los conteos y los rechazados
+       de una carga ya hecha se leen de la base (ver read_not_inserted_sims)."""
+    load_keys = {file_name: key[:16] for file_name, key in ingestions.items()}
+    cursor = conn.cursor()
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS no_insertados_sims (
+            Archivo TEXT,
+            "Pestaña" TEXT,
+            ICCID TEXT,
+            TELEFONO TEXT,
+            Carga TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_no_insertados_sims_Carga ON no_insertados_sims (Carga);
+    ''')
+    with write_transaction(conn):
+        cursor.executemany(
+            "DELETE FROM no_insertados_sims WHERE Carga = ?", [(key,) for key in load_keys.values()]
+        )
+        cursor.executemany(
+            "INSERT INTO no_insertados_sims VALUES (?, ?, ?, ?, ?)",
+            (tuple(record) + (load_keys[record[0]],) for record in rejected)
+        )
+
+def read_not_inserted_sims(conn, ingestion):
+    """Devuelve los rechazados guardados por save_not_inserted_sims para la carga con clave
+       de ledger `ingestion`, como lista de tuplas de rejected_columns_sims."""
+    try:
+        return conn.execute(
+            'SELECT Archivo, "Pestaña", ICCID, TELEFONO FROM no_insertados_sims WHERE Carga = ? ORDER BY rowid',
+            (ingestion[:16],)
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # Base sin cargas con rechazados guardados
+        return []
+
+def _sims_text_column(values, repair_floats=False, falsy_empty=False):
+    """Convierte una columna de SIMs a texto (serie de pandas de tipo object).
+       - repair_floats: los floats enteros (ICCID/teléfonos leídos como número) se
+         convierten a entero antes de pasarlos a texto, sin '.0' ni notación científica.
+       - falsy_empty: los valores vacíos (None, '', 0) se convierten en ''.
+       Si la columna ya es de texto no se toca valor por valor."""
+    series = pd.Series(values, dtype=object)
+    if pd.api.types.infer_dtype(series, skipna=False) == 'string':
+        return series
+
+    def to_text(value):
+        if falsy_empty and not value:
+            return ""
+        if repair_floats and isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+    return series.map(to_text)
+
+# Tabla para str.translate que elimina los caracteres ASCII no numéricos (salvo el separador '\x00')
+_non_digit_table = {code: None for code in range(1, 128) if not chr(code).isdigit()}
+
+def _digits_only(series):
+    """Deja solo los dígitos de cada texto de la serie en una sola pasada: la columna se une
+       en un único texto separado por '\x00', se eliminan los caracteres no numéricos con
+       str.translate y se vuelve a partir. Las filas con caracteres no ASCII (posibles dígitos
+       Unicode) o que contienen el separador se resuelven con str.isdigit como antes."""
+    values = series.tolist()
+    joined = '\x00'.join(values)
+    cleaned = joined.translate(_non_digit_table).split('\x00')
+    if len(cleaned) != len(values):
+        cleaned = [''.join(filter(str.isdigit, value)) for value in values]
+    elif not joined.isascii():
+        for idx, value in enumerate(values):
+            if not value.isascii():
+                cleaned[idx] = ''.join(filter(str.isdigit, value))
+    return pd.Series(cleaned, index=series.index, dtype=object)
+
+def _normalize_status(series):
+    """Aplica strip().lower() a una columna de estados. Como son pocos valores distintos,
+       se factoriza la columna y solo se normalizan los valores únicos."""
+    codes, uniques = pd.factorize(series)
+    normalized = np.array([value.strip().lower() for value in uniques] + [""], dtype=object)
+    return pd.Series(normalized[codes], index=series.index, dtype=object)
+
+def clean_sims_columns(iccid, telefono, estado, sesion, consumo):
+    """Limpieza columnar de SIMs: recibe las columnas (listas o series) y devuelve las
+       series limpias (ICCID, TELEFONO, ESTADO_DEL_SIM, EN_SESION, ConsumoMb).
+       ICCID, TELEFONO y ConsumoMb quedan solo con dígitos; los estados en minúsculas y sin espacios."""
+    iccid = _digits_only(_sims_text_column(iccid, repair_floats=True))
+    telefono = _digits_only(_sims_text_column(telefono, repair_floats=True))
+    consumo = _digits_only(_sims_text_column(consumo, falsy_empty=True))
+    estado = _normalize_status(_sims_text_column(estado, falsy_empty=True))
+    sesion = _normalize_status(_sims_text_column(sesion, falsy_empty=True))
+    return iccid, telefono, estado, sesion, consumo
+
+def clean_iccid_telefono_consumo(data):
+    """Limpia los campos ICCID, TELEFONO y ConsumoMb para que contengan solo dígitos donde aplique.
+       Trabaja por columnas (ver clean_sims_columns) y devuelve una lista de tuplas."""
+    if not data:
+        return []
+    columns = list(zip(*data))
+    iccid, telefono, estado, sesion, consumo = clean_sims_columns(*columns[:5])
+    cleaned_data = list(zip(
+        iccid.tolist(), telefono.tolist(), estado.tolist(), sesion.tolist(), consumo.tolist(), *columns[5:]
+    ))
+    logger.info(
+        f"Limpieza de {len(cleaned_data)} registros SIM: "
+        f"{int((iccid == '').sum())} sin ICCID, {int((telefono == '').sum())} sin TELEFONO."
+    )
+    return cleaned_data
+
+def read_workbook_sims(excel_file, sheet_names=None):
+    """Decodifica una sola vez un Excel de SIMs y devuelve un diccionario
+       {sheet_name: {'headers': [...], 'rows': [tuplas]}} con los valores de cada pestaña
+       (o solo de las pestañas en `sheet_names`; en modo solo lectura el resto no se decodifica)."""
+    if hasattr(excel_file, 'seek'):
+        excel_file.seek(0)
+    workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    workbook_data = {}
+    try:
+        for sheet_name in workbook.sheetnames:
+            if sheet_names is not None and sheet_name not in sheet_names:
+                continue
+            rows = workbook[sheet_name].iter_rows(values_only=True)
+            header_row = next(rows, ())
+            workbook_data[sheet_name] = {
+                'headers': [col if col else "" for col in header_row],
+                'rows': list(rows)
+            }
+    finally:
+        workbook.close()
+    return workbook_data
+
+def _column_index(cell_ref):
+    # 'AB1' -> 27 (base 0)
+    index = 0
+    for char in cell_ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+def _cast_number(value):
+    # Como openpyxl: entero si el texto no tiene punto ni exponente, float si no
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+def _xlsx_styles(archive):
+    """Índices de los estilos de celda con formato de fecha y de duración (como los calcula
+       openpyxl al leer xl/styles.xml)."""
+    try:
+        stylesheet = Stylesheet.from_tree(ElementTree.fromstring(archive.read('xl/styles.xml')))
+    except KeyError:
+        return set(), set()
+    return stylesheet.date_formats, stylesheet.timedelta_formats
+
+def _xlsx_part_path(target):
+    # Los destinos de xl/_rels/workbook.xml.rels son relativos a xl/ salvo que empiecen con '/'
+    return target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+
+def _xlsx_first_rows(excel_file):
+    """Devuelve {pestaña: encabezados} leyendo el XML del .xlsx solo hasta el final de la
+       primera fila de cada hoja, y la tabla de textos compartidos solo hasta el último índice
+       que usan esas filas. openpyxl en modo solo lectura recorre cada hoja completa cuando
+       no declara su dimensión (p. ej. los archivos escritos en modo write_only).
+       Los valores se convierten como en openpyxl (números, fechas según el estilo de la
+       celda, booleanos); si la primera fila escrita no es la 1, los encabezados quedan vacíos,
+       igual que al procesarla (read_workbook_sims toma la fila 1 como encabezado). Sin
+       dimensión declarada no se agregan las columnas vacías del final que sí agrega openpyxl."""
+    with zipfile.ZipFile(excel_file) as archive:
+        workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in rels}
+        # La tabla de textos compartidos no siempre se llama sharedStrings.xml (ni existe si el
+        # libro solo tiene textos en línea): se busca por el tipo de la relación
+        strings_target = next(
+            (rel.get('Target') for rel in rels if rel.get('Type', '').endswith('/sharedStrings')), None
+        )
+        properties = workbook.find(f'{_xlsx_ns}workbookPr')
+        date1904 = properties is not None and properties.get('date1904') in ('1', 'true')
+        first_rows = {}
+        for sheet in workbook.iter(f'{_xlsx_ns}sheet'):
+            sheet_path = _xlsx_part_path(targets[sheet.get(f'{_xlsx_rel_ns}id')])
+            cells = {}
+            width = 0
+            has_rows = False
+            with archive.open(sheet_path) as sheet_xml:
+                for _, element in ElementTree.iterparse(sheet_xml):
+                    if element.tag == f'{_xlsx_ns}dimension':
+                        # openpyxl completa cada fila hasta la última columna declarada
+                        width = _column_index(element.get('ref', 'A1').split(':')[-1]) + 1
+                    elif element.tag == f'{_xlsx_ns}c':
+                        column = _column_index(element.get('r')) if element.get('r') else len(cells)
+                        cell_type = element.get('t', 'n')
+                        if cell_type == 'inlineStr':
+                            value = "".join(text.text or "" for text in element.iter(f'{_xlsx_ns}t'))
+                        else:
+                            value = element.findtext(f'{_xlsx_ns}v') or None
+                        cells[column] = (cell_type, value, int(element.get('s', 0)))
+                    elif element.tag == f'{_xlsx_ns}row':
+                        has_rows = True
+                        if element.get('r') not in (None, '1'):
+                            # La fila 1 está vacía: openpyxl devuelve una fila vacía como encabezado
+                            cells = {}
+                        break
+            # Una hoja sin filas no tiene encabezados, aunque declare una dimensión
+            first_rows[sheet.get('name')] = (cells, width if has_rows else 0)
+        if not first_rows:
+            raise ValueError("Libro sin hojas reconocibles")
+
+        needed = {
+            int(value) for cells, _ in first_rows.values() for cell_type, value, _ in cells.values()
+            if cell_type == 's' and value
+        }
+        shared = []
+        if needed:
+            if strings_target is None:
+                raise KeyError("Libro sin tabla de textos compartidos")
+            with archive.open(_xlsx_part_path(strings_target)) as strings_xml:
+                for _, element in ElementTree.iterparse(strings_xml):
+                    if element.tag == f'{_xlsx_ns}si':
+                        # Los t de rPh son la guía fonética, no parte del texto
+                        phonetic = {id(text) for run in element.iter(f'{_xlsx_ns}rPh') for text in run.iter(f'{_xlsx_ns}t')}
+                        shared.append("".join(
+                            text.text or "" for text in element.iter(f'{_xlsx_ns}t') if id(text) not in phonetic
+                        ))
+                        element.clear()
+                        if len(shared) > max(needed):
+                            break
+        numeric_styles = {
+            style for cells, _ in first_rows.values() for cell_type, value, style in cells.values()
+            if cell_type == 'n' and value
+        }
+        date_styles, timedelta_styles = _xlsx_styles(archive) if numeric_styles else (set(), set())
+
+    epoch = CALENDAR_MAC_1904 if date1904 else WINDOWS_EPOCH
+    headers = {}
+    for sheet_name, (cells, width) in first_rows.items():
+        row = [None] * max(max(cells) + 1 if cells else 0, width)
+        for column, (cell_type, value, style) in cells.items():
+            if value is None:
+                continue
+            if cell_type == 's':
+                row[column] = shared[int(value)]
+            elif cell_type == 'n':
+                number = _cast_number(value)
+                if style in date_styles:
+                    try:
+                        number = from_excel(number, epoch, timedelta=style in timedelta_styles)
+                    except (OverflowError, ValueError):
+                        number = "#VALUE!"
+                row[column] = number
+            elif cell_type == 'b':
+                row[column] = bool(int(value))
+            elif cell_type == 'd':
+                row[column] = from_ISO8601(value)
+            else:
+                row[column] = value
+        headers[sheet_name] = [col if col else "" for col in row]
+    return headers
+
+def probe_headers_sims(sims_file, key=None):
+    """Lee solo los encabezados de un archivo de SIMs, sin decodificar sus filas:
+       - Excel: {pestaña: [encabezados]}, con la primera fila de cada pestaña en modo solo lectura,
+       - CSV: [encabezados] (read_csv con nrows=0).
+       El resultado se memoriza por hash del contenido (`key`, o se calcula), así que los
+       reruns de la interfaz no vuelven a abrir el archivo."""
+    if key is None:
+        key = file_content_hash(sims_file)
+    headers = lru_get(_header_cache, key)
+    if headers is not None:
+        return headers
+    if hasattr(sims_file, 'seek'):
+        sims_file.seek(0)
+    if sims_file.name.endswith('.xlsx'):
+        try:
+            headers = _xlsx_first_rows(sims_file)
+        except (KeyError, ValueError, IndexError, zipfile.BadZipFile, ElementTree.ParseError):
+            # Estructura no esperada (p. ej. OOXML estricto): se lee con openpyxl
+            sims_file.seek(0)
+            workbook = openpyxl.load_workbook(sims_file, read_only=True, data_only=True)
+            try:
+                headers = {}
+                for sheet_name in workbook.sheetnames:
+                    header_row = next(workbook[sheet_name].iter_rows(max_row=1, values_only=True), ())
+                    headers[sheet_name] = [col if col else "" for col in header_row]
+            finally:
+                workbook.close()
+    else:
+        headers = pd.read_csv(sims_file, dtype=str, nrows=0).columns.tolist()
+    lru_put(_header_cache, key, headers, header_cache_size)
+    return headers
+
+def process_excel_sims(excel_file, column_mapping, sheet_name, workbook_data=None):
+    """Procesa una hoja de Excel para SIMs usando un mapeo de columnas.
+       Si se recibe `workbook_data` (ver read_workbook_sims) no se vuelve a leer el archivo."""
+    if workbook_data is None:
+        workbook_data = read_workbook_sims(excel_file)
+    all_data = []
+
+    for row in workbook_data[sheet_name]['rows']:
+        row_data = []
+        for key in ['ICCID', 'TELEFONO', 'ESTADO DEL SIM', 'EN SESION', 'ConsumoMb']:
+            col_index = column_mapping[key]
+            if col_index is None or col_index == -1:
+                cell_value = ""
+            elif col_index >= len(row):
+                cell_value = ""
+            else:
+                cell = row[col_index]
+                if isinstance(cell, float) and cell.is_integer():
+                    cell_value = str(int(cell))
+                elif isinstance(cell, (int, str)):
+                    cell_value = str(cell)
+                else:
+                    cell_value = str(cell) if cell is not None else ""
+            row_data.append(cell_value)
+        row_data.append(sheet_name)  # Se agrega el nombre de la pestaña como 'Compania'
+        all_data.append(row_data)
+    return all_data
+
+def iter_csv_sims(csv_file, column_mapping, chunksize=default_chunksize_sims):
+    """Lee un CSV de SIMs por bloques y genera listas de tuplas ya mapeadas.
+       Solo se leen las columnas usadas en `column_mapping` (usecols) y las tuplas
+       se arman por columnas, sin recorrer el DataFrame fila por fila.
+       Un error de lectura a mitad del archivo se registra y se vuelve a lanzar: los
+       bloques ya entregados no bastan para dar la carga por completa."""
+    company_name = os.path.splitext(os.path.basename(csv_file.name))[0]
+    keys = ['ICCID', 'TELEFONO', 'ESTADO DEL SIM', 'EN SESION', 'ConsumoMb']
+    used_indices = sorted({
+        column_mapping[key] for key in keys
+        if column_mapping[key] is not None and column_mapping[key] != -1
+    })
+    # Posición de cada índice original dentro de las columnas leídas
+    positions = {col_index: pos for pos, col_index in enumerate(used_indices)}
+    if hasattr(csv_file, 'seek'):
+        csv_file.seek(0)
+
+    rows_read = 0
+    try:
+        for chunk in pd.read_csv(csv_file, dtype=str, usecols=used_indices, chunksize=chunksize):
+            size = len(chunk)
+            columns = []
+            for key in keys:
+                col_index = column_mapping[key]
+                if col_index is None or col_index == -1:
+                    columns.append([""] * size)
+                else:
+                    column = chunk.iloc[:, positions[col_index]]
+                    columns.append(column.str.strip().fillna("").tolist())
+            columns.append([company_name] * size)
+            rows_read += size
+            yield list(zip(*columns))
+    except Exception as e:
+        logger.error(f"Error leyendo CSV {csv_file.name} tras {rows_read} filas: {e}")
+        raise
+
+def process_csv_sims(csv_file, column_mapping, chunksize=default_chunksize_sims):
+    """Procesa un archivo CSV para SIMs usando un mapeo de columnas."""
+    all_data = []
+    for chunk_data in iter_csv_sims(csv_file, column_mapping, chunksize):
+        all_data.extend(chunk_data)
+    return all_data
+
+def resolve_mapping_sims(mapping_name, headers):
+    """Busca en `headers` las columnas del mapeo por defecto `mapping_name` (nombre de la
+       pestaña o del CSV sin extensión). Devuelve {campo: índice} o None si el mapeo no
+       existe o si falta alguna de sus columnas."""
+    mapping = default_mappings_sims.get(mapping_name)
+    if mapping is None:
+        return None
+    mapping_indices = {}
+    for key_field, column_name in mapping.items():
+        if column_name not in headers:
+            return None
+        mapping_indices[key_field] = headers.index(column_name)
+    return mapping_indices
+
+def unit_label_sims(file_name, sheet_name=None):
+    """Nombre de una unidad de carga (pestaña de Excel o CSV) para reportar su progreso."""
+    return f"{file_name} / {sheet_name}" if sheet_name else file_name
+
+def _clean_timed(data, unit):
+    with stage('limpieza', unit) as timing:
+        timing['rows'] = len(data)
+        return clean_iccid_telefono_consumo(data)
+
+def _insert_timed(conn, history_conn, data, unit):
+    """Inserta un lote limpio (y lo agrega a la foto del historial), midiendo ambas etapas."""
+    with stage('insercion', unit) as timing:
+        timing['rows'] = len(data)
+        result = bulk_insert_data_sims(conn, data)
+    if history_conn is not None:
+        with stage('historial', unit) as timing:
+            timing['rows'] = len(data)
+            stage_snapshot(history_conn, 'sims', data)
+    return result
+
+def load_file_sims(sims_file, column_mapping, conn, workbook_data=None, history_conn=None, progress=None):
+    """Procesa, limpia e inserta un archivo de SIMs (Excel o CSV) por la conexión `conn` y, si se
+       pasa `history_conn`, agrega los lotes limpios a la foto en curso del historial.
+       - Excel: `column_mapping` es {pestaña: {campo: índice}}; devuelve stats {'sheets': {...}}.
+       - CSV: `column_mapping` es {campo: índice}; devuelve stats {'processed', 'inserted'}.
+       Devuelve (stats, rejected), con rejected como RecordStore de (archivo, pestaña, ICCID,
+       TELEFONO) (ver rejected_columns_sims). stats incluye además 'sample_keys': el par
+       (ICCID, TELEFONO) de la primera fila de cada lote, para el ledger (ver ledger).
+       Si se pasa `progress(unidad, filas, total)`, se llama tras cada lote insertado con las
+       filas acumuladas de la pestaña o CSV (total = filas al terminarla); si lanza una
+       excepción la carga se interrumpe y los lotes ya insertados quedan en la base.
+       Mide por pestaña o CSV las etapas de lectura, limpieza, inserción e historial."""
+    file_name = os.path.basename(sims_file.name)
+    rejected_all = RecordStore(rejected_columns_sims, rejected_kinds_sims)
+    sample_keys = []
+    if file_name.endswith('.xlsx'):
+        if workbook_data is None:
+            with stage('carga_libro', file_name):
+                workbook_data = read_workbook_sims(sims_file)
+        stats = {'sheets': {}}
+        if progress is not None:
+            for sheet_name in column_mapping:
+                progress(unit_label_sims(file_name, sheet_name), 0)
+        for sheet_name, sheet_mapping in column_mapping.items():
+            unit = unit_label_sims(file_name, sheet_name)
+            with stage('mapeo_filas', unit) as timing:
+                data = process_excel_sims(sims_file, sheet_mapping, sheet_name, workbook_data=workbook_data)
+                timing['rows'] = len(data)
+            data_cleaned = _clean_timed(data, unit)
+            processed, inserted, rejected = _insert_timed(conn, history_conn, data_cleaned, unit)
+            if data_cleaned:
+                sample_keys.append(data_cleaned[0][:2])
+            stats['sheets'][sheet_name] = {
+                'processed': processed,
+                'inserted': inserted
+            }
+            rejected_all.extend((file_name, sheet_name, iccid, telefono) for iccid, telefono in rejected)
+            if progress is not None:
+                progress(unit, processed, processed)
+    else:
+        # El CSV se procesa por bloques para mantener acotada la memoria
+        processed = 0
+        inserted = 0
+        unit = unit_label_sims(file_name)
+        chunks = iter_csv_sims(sims_file, column_mapping)
+        while True:
+            with stage('lectura_csv', unit) as timing:
+                chunk_data = next(chunks, None)
+                timing['rows'] = len(chunk_data or [])
+            if chunk_data is None:
+                break
+            data_cleaned = _clean_timed(chunk_data, unit)
+            chunk_processed, chunk_inserted, rejected = _insert_timed(conn, history_conn, data_cleaned, unit)
+            if data_cleaned:
+                sample_keys.append(data_cleaned[0][:2])
+            processed += chunk_processed
+            inserted += chunk_inserted
+            rejected_all.extend((file_name, "", iccid, telefono) for iccid, telefono in rejected)
+            if progress is not None:
+                progress(unit, processed)
+        if progress is not None:
+            progress(unit, processed, processed)
+        stats = {
+            'processed': processed,
+            'inserted': inserted
+        }
+    stats['sample_keys'] = sample_keys
+    return stats, rejected_all
+
+def build_units_sims(files, column_mappings):
+    """Arma las unidades de trabajo para load_units_sims: una por (archivo, pestaña) en los
+       Excel y una por archivo en los CSV. `files` es una lista de (nombre, contenido en bytes)
+       y `column_mappings` el mapeo por nombre de archivo (como en load_file_sims)."""
+    units = []
+    for file_name, content in files:
+        column_mapping = column_mappings[file_name]
+        if file_name.endswith('.xlsx'):
+            for sheet_name, sheet_mapping in column_mapping.items():
+                units.append((file_name, content, sheet_name, sheet_mapping))
+        else:
+            units.append((file_name, content, None, column_mapping))
+    return units
+
+_result_queue = None
+
+def _init_worker_sims(result_queue, log_queue):
+    """Inicializa un proceso del pool con la cola hacia el escritor y la cola de logging."""
+    global _result_queue
+    _result_queue = result_queue
+    init_worker_logging(log_queue)
+
+def _process_unit_sims(unit_id, file_name, content, sheet_name, column_mapping):
+    """Parsea y limpia una unidad (pestaña de Excel o CSV completo) en un proceso del pool y
+       envía los lotes limpios a la cola como (unit_id, lote, None); al terminar (aun con error)
+       envía (unit_id, None, tiempos), con los tiempos por etapa medidos en este proceso."""
+    timings = []
+    def timed(name, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        timings.append((name, time.perf_counter() - start, len(result) if isinstance(result, list) else 0))
+        return result
+    try:
+        sims_file = io.BytesIO(content)
+        sims_file.name = file_name
+        if sheet_name is not None:
+            workbook_data = timed('carga_libro', read_workbook_sims, sims_file, sheet_names=[sheet_name])
+            data = timed('mapeo_filas', process_excel_sims, sims_file, column_mapping, sheet_name, workbook_data=workbook_data)
+            _result_queue.put((unit_id, timed('limpieza', clean_iccid_telefono_consumo, data), None))
+        else:
+            chunks = iter_csv_sims(sims_file, column_mapping)
+            while True:
+                chunk_data = timed('lectura_csv', next, chunks, None)
+                if chunk_data is None:
+                    break
+                _result_queue.put((unit_id, timed('limpieza', clean_iccid_telefono_consumo, chunk_data), None))
+    finally:
+        _result_queue.put((unit_id, None, timings))
+
+def load_units_sims(units, conn, max_workers=default_workers_sims, queue_size=default_queue_size_sims,
+                    history_conn=None, progress=None):
+    """Procesa las unidades de build_units_sims en un pool de procesos. El parseo y la limpieza
+       corren en paralelo; los lotes limpios pasan por una cola acotada (`queue_size`) a un único
+       escritor (este proceso), que los inserta por `conn` (y en la foto de `history_conn`, si se pasa). Devuelve (stats_by_file, rejected)
+       con la misma forma que load_file_sims, archivo por archivo (con 'sample_keys').
+       Con varios archivos, cuál de dos duplicados queda insertado depende del orden de llegada.
+       `progress` se llama como en load_file_sims, una unidad por pestaña o CSV; si lanza una
+       excepción no se lanzan más unidades y se espera a que terminen las que ya corren."""
+    stats_by_file = {}
+    for file_name, _, sheet_name, _ in units:
+        if sheet_name is None:
+            stats_by_file[file_name] = {'processed': 0, 'inserted': 0, 'sample_keys': []}
+        else:
+            file_stats = stats_by_file.setdefault(file_name, {'sheets': {}, 'sample_keys': []})
+            file_stats['sheets'][sheet_name] = {'processed': 0, 'inserted': 0}
+    rejected_all = RecordStore(rejected_columns_sims, rejected_kinds_sims)
+    if not units:
+        return stats_by_file, rejected_all
+    unit_rows = [0] * len(units)
+    if progress is not None:
+        for file_name, _, sheet_name, _ in units:
+            progress(unit_label_sims(file_name, sheet_name), 0)
+
+    # 'spawn' evita hacer fork de un servidor con varios hilos (Streamlit)
+    mp_context = multiprocessing.get_context('spawn')
+    result_queue = mp_context.Queue(maxsize=queue_size)
+    # Los procesos hijos no heredan los handlers: sus mensajes llegan por log_queue
+    log_queue = mp_context.Queue()
+    with forward_worker_logs(log_queue), ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=mp_context,
+        initializer=_init_worker_sims, initargs=(result_queue, log_queue)
+    ) as pool:
+        futures = [pool.submit(_process_unit_sims, unit_id, *unit) for unit_id, unit in enumerate(units)]
+        pending = len(units)
+        try:
+            while pending:
+                try:
+                    unit_id, data, timings = result_queue.get(timeout=1)
+                except queue.Empty:
+                    # Si un proceso murió sin avisar, se deja de esperar y se propaga el error abajo
+                    if all(future.done() for future in futures) and result_queue.empty():
+                        break
+                    continue
+                file_name, _, sheet_name, _ = units[unit_id]
+                unit = unit_label_sims(file_name, sheet_name)
+                if data is None:
+                    pending -= 1
+                    for name, seconds, rows in timings:
+                        record_stage(name, unit, seconds, rows)
+                    if progress is not None:
+                        progress(unit, unit_rows[unit_id], unit_rows[unit_id])
+                    continue
+                processed, inserted, rejected = _insert_timed(conn, history_conn, data, unit)
+                unit_stats = stats_by_file[file_name]
+                if data:
+                    unit_stats['sample_keys'].append(data[0][:2])
+                if sheet_name is not None:
+                    unit_stats = unit_stats['sheets'][sheet_name]
+                unit_stats['processed'] += processed
+                unit_stats['inserted'] += inserted
+                rejected_all.extend((file_name, sheet_name or "", iccid, telefono) for iccid, telefono in rejected)
+                unit_rows[unit_id] += processed
+                if progress is not None:
+                    progress(unit, unit_rows[unit_id])
+        except BaseException:
+            # Carga interrumpida: se descartan las unidades sin empezar y se vacía la cola para
+            # que los procesos en curso no queden bloqueados y el pool pueda cerrarse
+            for future in futures:
+                future.cancel()
+            while not all(future.done() for future in futures):
+                try:
+                    result_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            raise
+        for future in futures:
+            future.result()
+    return stats_by_file, rejected_all
@@ -0,0 +1,193 @@
+"""Conexiones a SQLite con el perfil de carga masiva e índices de consulta de 'datos' y 'sims'.
+
+Las bases (la de plataformas del día, sims_hoy.db, el historial) las comparten todas las
+sesiones de la interfaz y la CLI. Modelo de concurrencia:
+- Un escritor a la vez por base: cada transacción de escritura (write_transaction) toma un
+  bloqueo del proceso para esa base y empieza con BEGIN IMMEDIATE, así que el bloqueo de
+  SQLite se toma antes de leer nada (el MAX(rowid) de las inserciones por lote de SIMs y de
+  plataformas no se cruza con otra carga). Las transacciones son por lote: dos cargas
+  simultáneas alternan sus lotes y cada una parsea el siguiente mientras la otra escribe.
+- Otros procesos (la CLI) esperan el bloqueo de SQLite hasta busy_timeout_s y reintentan.
+- Con WAL los lectores no esperan a los escritores; connect_readonly abre sin poder escribir
+  ni crear la base si ya no existe.
+- Una carga marca su base en uso (hold_database) y delete_database no la borra mientras tanto.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+from .log import logger
+from .metrics import trace_statements
+
+# Perfil aplicado a cada conexión de carga:
+# - WAL: las escrituras van al log y no bloquean a los lectores.
+# - synchronous=NORMAL: con WAL no corrompe la base ante una caída, solo puede perder la última transacción.
+# - cache_size negativo = KiB (64 MB de caché de páginas), mmap de 256 MB y temporales en memoria.
+bulk_load_pragmas = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY"
+]
+
+# Espera máxima (segundos) por el bloqueo de escritura de otra conexión u otro proceso
+busy_timeout_s = 30
+# Reintentos de BEGIN IMMEDIATE cuando la espera se agota, con pausas de 1, 2, 4... segundos
+write_retries = 3
+
+# Índices secundarios para las consultas sobre la base descargada. En 'sims' las búsquedas
+# por ICCID ya usan el índice de UNIQUE(ICCID, TELEFONO), así que solo falta TELEFONO. En
+# 'datos' los de fechas normalizadas (epoch) resuelven "sin reportar desde..." y las ventanas
+# de activación como rangos sobre el índice, en todas las plataformas a la vez.
+query_indexes = {
+    'datos': [
+        'ICCID', 'Telefono', 'IMEI', 'Cliente_Cuenta', 'Origen', 'Tipo_de_Dispositivo',
+        'Ultima_Actividad_Epoch', 'Fecha_de_Activacion_Epoch'
+    ],
+    'sims': ['TELEFONO']
+}
+
+_registry_lock = threading.Lock()
+# Por ruta absoluta: bloqueo de escritura y número de cargas que usan la base
+_write_locks = {}
+_holders = {}
+
+class DatabaseInUse(Exception):
+    """Se lanza al intentar borrar una base con una carga o escritura en curso."""
+
+def _write_lock(db_file):
+    with _registry_lock:
+        return _write_locks.setdefault(os.path.abspath(db_file) if db_file else '', threading.Lock())
+
+def _database_file(conn):
+    # Ruta del archivo de la base principal de la conexión ('' en memoria)
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+def connect(db_path):
+    """Abre una conexión a `db_path` con el perfil de carga masiva (y, dentro de una ejecución
+       de métricas, cuenta sus sentencias)."""
+    conn = sqlite3.connect(db_path, timeout=busy_timeout_s)
+    for pragma in bulk_load_pragmas:
+        conn.execute(pragma)
+    trace_statements(conn)
+    return conn
+
+def readonly_uri(db_path):
+    """URI de solo lectura de `db_path` (también sirve para ATTACH en una conexión con uri=True)."""
+    return f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+
+def connect_readonly(db_path):
+    """Abre `db_path` solo para lectura. En WAL no espera a las escrituras en curso (lee la
+       última transacción confirmada) y, si la base ya no existe, falla en lugar de crearla vacía."""
+    return sqlite3.connect(readonly_uri(db_path), uri=True, timeout=busy_timeout_s)
+
+def _begin_immediate(conn):
+    for attempt in range(write_retries + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if attempt == write_retries or not any(word in str(e) for word in ('locked', 'busy')):
+                raise
+            logger.warning(f"Base ocupada por otra escritura ({e}); reintento {attempt + 1} de {write_retries}.")
+            time.sleep(2 ** attempt)
+
+@contextmanager
+def write_transaction(conn):
+    """Transacción de escritura en `conn`, serializada con las demás escrituras del proceso
+       sobre la misma base y empezada con BEGIN IMMEDIATE (ver el docstring del módulo).
+       Confirma al salir y deshace si hay una excepción. Una transacción implícita ya abierta
+       (p. ej. por inserciones en tablas temporales) se confirma antes de empezar."""
+    with _write_lock(_database_file(conn)):
+        if conn.in_transaction:
+            conn.commit()
+        _begin_immediate(conn)
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+@contextmanager
+def hold_database(db_path):
+    """Marca `db_path` en uso durante el bloque (p. ej. una carga completa, desde crear la
+       tabla hasta exportar) para que delete_database no la borre a mitad de camino. Se anida."""
+    key = os.path.abspath(db_path)
+    with _registry_lock:
+        _holders[key] = _holders.get(key, 0) + 1
+    try:
+        yield
+    finally:
+        with _registry_lock:
+            _holders[key] -= 1
+            if not _holders[key]:
+                del _holders[key]
+
+def delete_database(db_path):
+    """Borra `db_path` junto con su WAL (-wal) y memoria compartida (-shm). Lanza
+       DatabaseInUse si una carga de este proceso la tiene en uso o si otro proceso tiene
+       una escritura abierta en ella."""
+    key = os.path.abspath(db_path)
+    # Con el registro bloqueado ninguna carga nueva puede empezar a usarla durante el borrado
+    with _registry_lock:
+        if _holders.get(key):
+            raise DatabaseInUse(f"La base {db_path} tiene {_holders[key]} carga(s) en curso.")
+        if os.path.exists(db_path):
+            conn = sqlite3.connect(db_path, timeout=1)
+            try:
+                conn.execute("BEGIN EXCLUSIVE")
+                conn.rollback()
+            except sqlite3.OperationalError as e:
+                raise DatabaseInUse(f"La base {db_path} tiene una escritura en curso en otro proceso.") from e
+            finally:
+                conn.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    logger.info(f"Base de datos {db_path} eliminada.")
+
+def checkpoint(conn):
+    """Vuelca el WAL a la base y lo vacía, para que el archivo .db esté completo por sí solo.
+       Espera (hasta busy_timeout_s) a que terminen la escritura y las lecturas en curso."""
+    with _write_lock(_database_file(conn)):
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def create_query_indexes(conn, table):
+    """Crea (si no existen) los índices de consulta de `table`. Las estadísticas se recalculan
+       completas solo si se creó algún índice; si ya existían, PRAGMA optimize las actualiza
+       únicamente cuando SQLite las considera desactualizadas (ANALYZE recorre toda la tabla)."""
+    with write_transaction(conn):
+        existing = {
+            name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,)
+            )
+        }
+        created = False
+        for column in query_indexes[table]:
+            if f"idx_{table}_{column}" not in existing:
+                conn.execute(f"CREATE INDEX idx_{table}_{column} ON {table} ({column})")
+                created = True
+        conn.execute(f"ANALYZE {table}" if created else "PRAGMA optimize")
+
+@contextmanager
+def bulk_load(db_path, table):
+    """Conexión única para toda una carga sobre `table` de `db_path`.
+       Los índices de consulta se construyen al terminar, no fila a fila: en una base nueva
+       (la de cada día) se arman de una vez sobre los datos ya cargados, y en una base que
+       ya los tiene solo se actualizan. Al cerrar se vuelca el WAL a la base para que el
+       archivo .db descargado esté completo por sí solo. La base queda en uso (hold_database)
+       mientras dura el bloque."""
+    with hold_database(db_path):
+        conn = connect(db_path)
+        try:
+            yield conn
+            create_query_indexes(conn, table)
+            checkpoint(conn)
+            logger.info(f"Índices de '{table}' actualizados en {db_path}.")
+        finally:
+            conn.close()
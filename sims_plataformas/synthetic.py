@@ -0,0 +1,183 @@
+"""Archivos sintéticos de plataformas y SIMs para medir el rendimiento sin datos reales.
+
+Los encabezados salen de default_mappings_plataformas y default_mappings_sims, así que los
+archivos pasan por el mapeo automático igual que las exportaciones reales. Los datos se
+ensucian como en esas exportaciones: ICCID guardados como número (Excel los redondea) o
+con espacios y 'F' final, teléfonos con lada, paréntesis y guiones, y una fracción de
+filas duplicadas según la clave única de cada tabla (que la carga debe rechazar).
+"""
+import csv
+import os
+import random
+
+import openpyxl
+
+from .plataformas import default_mappings_plataformas
+from .sims import default_mappings_sims
+
+# Reparto de las filas de plataformas entre las hojas
+platform_shares = {'WIALON': 0.7, 'ADAS': 0.2, 'COMBUSTIBLE': 0.1}
+
+# Pestañas del Excel de SIMs sintético (el resto de los mapeos se usan como CSV, ver write_sims_csv)
+sims_workbook_sheets = ['SIMPATIC', 'TELCEL ALEJANDRO', '-1', 'MOVISTAR', 'NANTI', 'LEGACY']
+
+sims_statuses = ['Activo', 'ACTIVADO', ' Suspendido ', 'Inactiva', 'Cancelada', 'En sesión', 'No']
+
+def _headers(mapping, fields):
+    # Un mismo encabezado puede servir a varios campos (p. ej. 'Estatus línea' en TELCEL)
+    headers = []
+    for field in fields:
+        column = mapping.get(field)
+        if column and column not in headers:
+            headers.append(column)
+    return headers
+
+def _iccid(rng, number, mangle_ratio):
+    iccid = f"8952{number:015d}"
+    if rng.random() >= mangle_ratio:
+        return iccid
+    if rng.random() < 0.5:
+        # Celda numérica: Excel la guarda como float y pierde los últimos dígitos
+        return float(iccid)
+    return f" {iccid}F "
+
+def _phone(rng, number, dirty_ratio):
+    digits = f"55{number % 100000000:08d}"
+    if rng.random() >= dirty_ratio:
+        return digits
+    style = rng.randrange(4)
+    if style == 0:
+        return f"+52 ({digits[:2]}) {digits[2:6]}-{digits[6:]}"
+    if style == 1:
+        return float(digits)
+    if style == 2:
+        return f"{digits[:2]}-{digits[2:6]}-{digits[6:]} "
+    return f"52{digits}"
+
+def _numbers(rng, rows, duplicate_ratio):
+    """Genera el número de registro de cada fila; una fracción `duplicate_ratio` repite uno anterior."""
+    for index in range(rows):
+        if index and rng.random() < duplicate_ratio:
+            yield rng.randrange(index)
+        else:
+            yield index
+
+def _platform_row(rng, sheet, number, headers, mapping, mangle_ratio, dirty_ratio):
+    values = {
+        'Nombre': f"{sheet[:3]}-{number:07d}",
+        'Cliente_Cuenta': f"cliente_{number % 997}",
+        'Tipo_de_Dispositivo': rng.choice(['FMB920', 'FMC130', 'Teltonika', '2']),
+        'IMEI': 350000000000000 + number,
+        'ICCID': _iccid(rng, number, mangle_ratio),
+        'Fecha_de_Activacion': '2024-01-15',
+        'Fecha_de_Desactivacion': None,
+        'Hora_de_Ultimo_Mensaje': '2024-05-02 23:59:00',
+        'Ultimo_Reporte': '02.05.2024 23:59:00',
+        'Servicios': 'rastreo',
+        'Grupo': f"grupo_{number % 31}",
+        'Telefono': _phone(rng, number, dirty_ratio)
+    }
+    # Los encabezados compartidos (COMBUSTIBLE: 'Vehículo' es Nombre y Vehiculo) toman el primer campo
+    row = {}
+    for field, column in mapping.items():
+        if column in headers and column not in row:
+            row[column] = values.get(field)
+    return [row[column] for column in headers]
+
+def plataformas_sheet_rows(rng, sheet, rows, duplicate_ratio=0.05, mangle_ratio=0.3, dirty_ratio=0.3):
+    """Genera las filas (listas) de la hoja `sheet` de plataformas: primero los encabezados y
+       después `rows` filas de datos."""
+    mapping = default_mappings_plataformas[sheet]
+    fields = [field for field in mapping if field not in ('Origen', 'Fecha_Archivo')]
+    headers = _headers(mapping, fields)
+    yield headers
+    for number in _numbers(rng, rows, duplicate_ratio):
+        yield _platform_row(rng, sheet, number, headers, mapping, mangle_ratio, dirty_ratio)
+
+def write_plataformas_workbook(path, rows, seed=0, duplicate_ratio=0.05, mangle_ratio=0.3, dirty_ratio=0.3):
+    """Escribe un Excel de plataformas con `rows` filas repartidas según platform_shares.
+       El nombre del archivo debería llevar la fecha (AAAA-MM-DD) como los reales."""
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet, share in platform_shares.items():
+        worksheet = workbook.create_sheet(sheet)
+        for row in plataformas_sheet_rows(rng, sheet, int(rows * share), duplicate_ratio, mangle_ratio, dirty_ratio):
+            worksheet.append(row)
+    workbook.save(path)
+    return path
+
+def _sims_rows(rng, name, rows, offset, duplicate_ratio, mangle_ratio, dirty_ratio):
+    # `offset` separa los números de cada pestaña o archivo: solo se repiten los duplicados pedidos
+    mapping = default_mappings_sims[name]
+    headers = _headers(mapping, ['ICCID', 'TELEFONO', 'ESTADO DEL SIM', 'EN SESION', 'ConsumoMb'])
+    yield headers
+    for number in _numbers(rng, rows, duplicate_ratio):
+        number += offset
+        generated = [
+            ('ICCID', _iccid(rng, number, mangle_ratio)),
+            ('TELEFONO', _phone(rng, number, dirty_ratio)),
+            ('ESTADO DEL SIM', rng.choice(sims_statuses)),
+            ('EN SESION', rng.choice(sims_statuses)),
+            ('ConsumoMb', rng.choice([f"{number % 500}.5 MB", number % 2048, '']))
+        ]
+        # Como en _headers, el primer campo define el valor de un encabezado compartido
+        values = {}
+        for field, value in generated:
+            values.setdefault(mapping[field], value)
+        yield [values[column] for column in headers]
+
+def write_sims_workbook(path, rows, seed=0, duplicate_ratio=0.05, mangle_ratio=0.3, dirty_ratio=0.3,
+                        sheets=sims_workbook_sheets):
+    """Escribe un Excel de SIMs con `rows` filas repartidas por igual entre `sheets`."""
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet_rows = rows // len(sheets)
+    for index, sheet in enumerate(sheets):
+        worksheet = workbook.create_sheet(sheet)
+        for row in _sims_rows(rng, sheet, sheet_rows, index * sheet_rows, duplicate_ratio, mangle_ratio, dirty_ratio):
+            worksheet.append(row)
+    workbook.save(path)
+    return path
+
+def write_sims_csv(path, rows, seed=0, duplicate_ratio=0.05, mangle_ratio=0.3, dirty_ratio=0.3):
+    """Escribe un CSV de SIMs con el mapeo del nombre del archivo (p. ej. TELCEL.csv). Sus
+       números siguen a los de write_sims_workbook con las mismas `rows`, así que ambos
+       archivos se pueden cargar en la misma base sin duplicados entre ellos."""
+    rng = random.Random(seed)
+    name = os.path.splitext(os.path.basename(path))[0]
+    with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        for row in _sims_rows(rng, name, rows, rows, duplicate_ratio, mangle_ratio, dirty_ratio):
+            writer.writerow(row)
+    return path
+
+def generate_dataset(out_dir, rows, seed=0, duplicate_ratio=0.05, mangle_ratio=0.3, dirty_ratio=0.3):
+    """Genera (o reutiliza, si ya existen) un Excel de plataformas, un Excel de SIMs y un CSV
+       de SIMs de `rows` filas cada uno en una carpeta de `out_dir` propia de los parámetros.
+       Devuelve {'plataformas', 'sims_xlsx', 'sims_csv'} con las rutas."""
+    params = dict(seed=seed, duplicate_ratio=duplicate_ratio, mangle_ratio=mangle_ratio, dirty_ratio=dirty_ratio)
+    dataset_dir = os.path.join(
+        out_dir, f"r{rows}_s{seed}_d{duplicate_ratio}_m{mangle_ratio}_p{dirty_ratio}"
+    )
+    os.makedirs(dataset_dir, exist_ok=True)
+    paths = {
+        'plataformas': os.path.join(dataset_dir, '2024-05-03_plataformas.xlsx'),
+        'sims_xlsx': os.path.join(dataset_dir, 'sims.xlsx'),
+        'sims_csv': os.path.join(dataset_dir, 'TELCEL.csv')
+    }
+    writers = {
+        'plataformas': write_plataformas_workbook,
+        'sims_xlsx': write_sims_workbook,
+        'sims_csv': write_sims_csv
+    }
+    # Se escribe en una subcarpeta y se mueve al terminar, para no reutilizar un archivo a medias
+    # (el mismo nombre de archivo, porque de él salen la fecha y el mapeo de los CSV)
+    partial_dir = os.path.join(dataset_dir, 'parcial')
+    os.makedirs(partial_dir, exist_ok=True)
+    for kind, path in paths.items():
+        if not os.path.exists(path):
+            partial_path = os.path.join(partial_dir, os.path.basename(path))
+            writers[kind](partial_path, rows, **params)
+            os.replace(partial_path, path)
+    os.rmdir(partial_dir)
+    return paths
@@ -1,421 +1,343 @@
-import openpyxl
 import pandas as pd
-import sqlite3
-import re
+import io
 import os
+import time
 import streamlit as st
-import logging
-from datetime import datetime
-
-# ----------------------------------------------------------------------------- 
-# CONFIGURACIÓN INICIAL Y LOGGING 
-# ----------------------------------------------------------------------------- 
-logging.basicConfig(
-    level=logging.INFO, 
-    filename='procesamiento.log', 
-    filemode='w',
-    format='%(asctime)s - %(levelname)s - %(message)s'
+from collections import OrderedDict
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from sims_plataformas.common import file_content_hash, mapping_hash, short_load_key, lru_get, lru_put
+from sims_plataformas.log import logger, run_logging
+from sims_plataformas.storage import bulk_load, hold_database, delete_database, DatabaseInUse
+from sims_plataformas.browser import default_page_size, count_rows, distinct_values, fetch_page, export_csv, stale_filter
+from sims_plataformas.export import export_parquet_zip
+from sims_plataformas.ledger import ingestion_key, lookup_ingestion, record_ingestion, forget_ingestions
+from sims_plataformas.records import RecordStore
+from sims_plataformas.metrics import profile_enabled, run_metrics, stage, metrics_summary, record_render
+from sims_plataformas.jobs import (
+    start_job, get_job, latest_job, running_jobs, cancel_job, clear_jobs, job_fraction, job_rate
+)
+from sims_plataformas.reconcile import reconciliation_categories, reconcile_databases
+from sims_plataformas.history import (
+    history_db_path,
+    open_history,
+    apply_snapshot_if_newer,
+    changes_since
+)
+from sims_plataformas.plataformas import (
+    default_mappings_plataformas,
+    columns_plataformas,
+    create_database_plataformas,
+    extract_date_from_filename,
+    load_excel_file_plataformas,
+    save_not_inserted_plataformas
+)
+from sims_plataformas.sims import (
+    default_mappings_sims,
+    create_database_sims,
+    default_workers_sims,
+    rejected_columns_sims,
+    rejected_kinds_sims,
+    probe_headers_sims,
+    resolve_mapping_sims,
+    load_file_sims,
+    build_units_sims,
+    unit_label_sims,
+    load_units_sims,
+    save_not_inserted_sims,
+    read_not_inserted_sims
 )
 
-# ----------------------------------------------------------------------------- 
-# BLOQUE 1: FUNCIONES Y LÓGICA PARA DATOS DE PLATAFORMAS 
-# ----------------------------------------------------------------------------- 
-
-default_mappings_plataformas = {
-    "WIALON": {
-        'Nombre': 'Nombre',
-        'Cliente_Cuenta': 'Cuenta',
-        'Tipo_de_Dispositivo': 'Tipo de dispositivo',
-        'IMEI': 'IMEI',
-        'ICCID': 'Iccid',
-        'Fecha_de_Activacion': 'Creada',
-        'Fecha_de_Desactivacion': 'Desactivación',
-        'Hora_de_Ultimo_Mensaje': 'Hora de último mensaje',
-        'Ultimo_Reporte': 'Ultimo Reporte',
-        'Vehiculo': None,
-        'Servicios': None,
-        'Grupo': 'Grupos',
-        'Telefono': 'Teléfono',
-        'Origen': 'WIALON',    # Se asigna manualmente
-        'Fecha_Archivo': None  # Se llenará con la fecha detectada en el nombre del archivo
-    },
-    "ADAS": {
-        'Nombre': 'equipo',
-        'Cliente_Cuenta': 'Subordinar',
-        'Tipo_de_Dispositivo': 'Modelo',
-        'IMEI': 'IMEI',
-        'ICCID': 'Iccid',
-        'Fecha_de_Activacion': 'Activation Date',
-        'Fecha_de_Desactivacion': None,
-        'Hora_de_Ultimo_Mensaje': None,
-        'Ultimo_Reporte': None,
-        'Vehiculo': None,
-        'Servicios': None,
-        'Grupo': None,
-        'Telefono': 'Número de tarjeta SIM',
-        'Origen': 'ADAS',
-        'Fecha_Archivo': None
-    },
-    "COMBUSTIBLE": {
-        'Nombre': 'Vehículo',
-        'Cliente_Cuenta': 'Cuenta',
-        'Tipo_de_Dispositivo': 'Tanques',
-        'IMEI': None,
-        'ICCID': None,
-        'Fecha_de_Activacion': None,
-        'Fecha_de_Desactivacion': None,
-        'Hora_de_Ultimo_Mensaje': None,
-        'Ultimo_Reporte': 'Último reporte',
-        'Vehiculo': 'Vehículo',
-        'Servicios': 'Servicios',
-        'Grupo': 'Grupos',
-        'Telefono': 'Línea',
-        'Origen': 'COMBUSTIBLE',
-        'Fecha_Archivo': None
-    }
-}
-
-def create_database_plataformas(db_path):
-    """Crea (o verifica) la tabla para plataformas en la base de datos SQLite."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(''' 
-        CREATE TABLE IF NOT EXISTS datos ( 
-            Nombre TEXT,
-            Cliente_Cuenta TEXT,
-            Tipo_de_Dispositivo TEXT,
-            IMEI TEXT,
-            ICCID TEXT,
-            Fecha_de_Activacion TEXT,
-            Fecha_de_Desactivacion TEXT,
-            Hora_de_Ultimo_Mensaje TEXT,
-            Ultimo_Reporte TEXT,
-            Vehiculo TEXT,
-            Servicios TEXT,
-            Grupo TEXT,
-            Telefono TEXT,
-            Origen TEXT,
-            Fecha_Archivo TEXT,
-            UNIQUE(Nombre, Cliente_Cuenta, Telefono)
-        ) 
-    ''')
-    conn.commit()
-    conn.close()
-
-def insert_data_plataformas(db_path, data):
-    """Inserta una lista de tuplas en la tabla 'datos' de plataformas."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    try:
-        cursor.executemany(
-            '''INSERT OR IGNORE INTO datos (
-                Nombre, Cliente_Cuenta, Tipo_de_Dispositivo, IMEI, ICCID,
-                Fecha_de_Activacion, Fecha_de_Desactivacion, Hora_de_Ultimo_Mensaje,
-                Ultimo_Reporte, Vehiculo, Servicios, Grupo, Telefono, Origen, Fecha_Archivo
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-            data
+# Número de resultados de procesamiento que se conservan por sesión (LRU)
+results_cache_size = 3
+
+def uploaded_file_hash(uploaded_file):
+    """Hash del contenido de un archivo subido, calculado una sola vez por subida (file_id):
+       los reruns no vuelven a recorrer archivos de cientos de MB."""
+    file_id = getattr(uploaded_file, 'file_id', None)
+    if file_id is None:
+        return file_content_hash(uploaded_file)
+    hashes = st.session_state.setdefault('file_hashes', {})
+    if file_id not in hashes:
+        hashes[file_id] = file_content_hash(uploaded_file)
+    return hashes[file_id]
+
+def file_on_click(path):
+    """Contenido de `path` para st.download_button, leído recién cuando se hace clic en la
+       descarga: los reruns no vuelven a leer bases y .zip de cientos de MB."""
+    def read():
+        with open(path, "rb") as file:
+            return file.read()
+    return read
+
+def show_paginated_table(db_path, table, columns, filters, key, file_name):
+    """Muestra una tabla de la base `db_path` página por página (ver sims_plataformas.browser).
+       La posición se guarda en la sesión como la pila de rowids donde empieza cada página y
+       se reinicia al cambiar los filtros. La descarga incluye todas las filas filtradas; el CSV
+       se arma solo cuando se pide y queda en la sesión para esa base y esos filtros."""
+    total = count_rows(db_path, table, filters)
+    state_key = f"paginas_{key}"
+    filters_signature = repr(sorted(filters.items()))
+    pages = st.session_state.get(state_key)
+    if pages is None or pages['filters'] != filters_signature:
+        pages = {'filters': filters_signature, 'starts': [0], 'next': None}
+        st.session_state[state_key] = pages
+
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("Anterior", key=f"anterior_{key}", disabled=len(pages['starts']) == 1):
+            pages['starts'].pop()
+    with col_next:
+        if st.button("Siguiente", key=f"siguiente_{key}", disabled=pages['next'] is None):
+            pages['starts'].append(pages['next'])
+
+    df_page, pages['next'] = fetch_page(db_path, table, columns, filters, after_rowid=pages['starts'][-1])
+    with col_info:
+        first = (len(pages['starts']) - 1) * default_page_size
+        st.caption(f"Filas {first + 1 if total else 0}–{first + len(df_page)} de {total}")
+    st.dataframe(df_page, use_container_width=True)
+    export_state_key = f"csv_{key}"
+    export_signature = (db_path, filters_signature)
+    export = st.session_state.get(export_state_key)
+    if export is None or export['signature'] != export_signature:
+        if not st.button(f"Preparar descarga de {file_name}", key=f"preparar_{key}"):
+            return
+        export = {'signature': export_signature, 'data': export_csv(db_path, table, columns, filters)}
+        st.session_state[export_state_key] = export
+    st.download_button(
+        label=f"Descargar {file_name}",
+        data=export['data'],
+        file_name=file_name,
+        mime='text/csv',
+        key=f"descarga_{key}"
+    )
+
+@st.fragment(run_every=1)
+def show_job_progress(job_id):
+    """Muestra el avance de una carga en segundo plano (ver sims_plataformas.jobs), refrescando
+       solo este fragmento cada segundo. Al terminar la carga se vuelve a ejecutar la página
+       completa para mostrar sus resultados."""
+    job = get_job(job_id)
+    if job is None or job['status'] != 'running':
+        st.rerun()
+    st.progress(
+        job_fraction(job),
+        text=f"{job['rows']:,} filas en {job['elapsed']:.0f} s ({job_rate(job):,.0f} filas/s)"
+    )
+    st.dataframe(
+        pd.DataFrame([
+            {'Unidad': unit, 'Filas': state['rows'], 'Total': state['total']}
+            for unit, state in job['units'].items()
+        ]),
+        use_container_width=True,
+        hide_index=True
+    )
+    if job['cancel_requested']:
+        st.caption("Cancelando: la carga se detiene al terminar el lote en curso.")
+    elif st.button("Cancelar carga", key=f"cancelar_{job_id}"):
+        cancel_job(job_id)
+
+def show_job_outcome(job):
+    """Avisa si la última carga se canceló o falló (las terminadas muestran sus resultados)."""
+    if job['status'] == 'cancelled':
+        st.warning(
+            "Carga cancelada. Los lotes ya insertados quedan en la base; al volver a procesar "
+            "el archivo se completan los registros que faltan."
         )
-        conn.commit()
-        inserted = cursor.rowcount
-        logging.info(f"Insertados {inserted} registros en la base de datos de plataformas.")
-    except sqlite3.IntegrityError as e:
-        logging.error(f"Error al insertar datos: {e}")
-        inserted = 0
-    conn.close()
-    return inserted
-
-def clean_telefono(telefono):
-    """Elimina caracteres no numéricos de un teléfono y lo devuelve como string."""
-    if telefono:
-        telefono = re.sub(r'\D', '', str(telefono))
-        if telefono:
-            return telefono
-    return None
-
-def extract_date_from_filename(filename):
-    """Extrae la fecha (formato YYYY-MM-DD) del nombre de un archivo. 
-       Si no la encuentra, devuelve la fecha actual."""
-    match = re.search(r'\d{4}-\d{2}-\d{2}', filename)
-    if match:
-        return match.group(0)
-    else:
-        return datetime.now().strftime('%Y-%m-%d')
-
-def process_excel_file_plataformas(excel_file, mappings):
-    """Procesa el archivo Excel para plataformas y devuelve:
-       - all_data: lista de tuplas listas para insertar,
-       - invalid_data: filas que no cumplen los requisitos,
-       - total_records: número total de filas leídas."""
-    all_data = []
-    invalid_data = []
-    total_records = 0
-
-    # Se usa el nombre del archivo subido para extraer la fecha
-    filename = excel_file.name
-    fecha_archivo = extract_date_from_filename(filename)
-    workbook = openpyxl.load_workbook(excel_file, data_only=True)
-
-    for sheet_name in workbook.sheetnames:
-        if sheet_name in mappings:
-            mapping = mappings[sheet_name]
-            sheet = workbook[sheet_name]
-            headers = [cell.value for cell in next(sheet.iter_rows(min_row=1, max_row=1))]
-            col_indices = {header: idx for idx, header in enumerate(headers) if header is not None}
-
-            for row in sheet.iter_rows(min_row=2, values_only=True):
-                total_records += 1
-                row_dict = {headers[i]: row[i] for i in range(len(headers))}
-                record = {}
-                is_valid = True
-
-                # Verificación mínima: que exista el campo "Cliente_Cuenta"
-                required_field = 'Cliente_Cuenta'
-                column_name = mapping.get(required_field)
-                value = row_dict.get(column_name) if column_name else None
-                if not value:
-                    is_valid = False
-
-                if is_valid:
-                    for field in [
-                        'Nombre', 'Cliente_Cuenta', 'Tipo_de_Dispositivo', 'IMEI', 'ICCID',
-                        'Fecha_de_Activacion', 'Fecha_de_Desactivacion', 'Hora_de_Ultimo_Mensaje',
-                        'Ultimo_Reporte', 'Vehiculo', 'Servicios', 'Grupo', 'Telefono', 
-                        'Origen', 'Fecha_Archivo'
-                    ]:
-                        if field == 'Origen':
-                            record[field] = mapping['Origen']
-                        elif field == 'Fecha_Archivo':
-                            record[field] = fecha_archivo
-                        else:
-                            col_name = mapping.get(field)
-                            if col_name:
-                                val = row_dict.get(col_name)
-                                if field == 'Telefono':
-                                    val = clean_telefono(val)
-                                record[field] = val
-                            else:
-                                record[field] = None
-                    all_data.append(tuple(record.values()))
-                    logging.info(f"Procesado registro válido en '{sheet_name}': {record}")
-                else:
-                    invalid_data.append(row_dict)
-                    logging.warning(f"Registro inválido en '{sheet_name}': {row_dict}")
-
-    return all_data, invalid_data, total_records
-
-# ----------------------------------------------------------------------------- 
-# BLOQUE 2: FUNCIONES Y LÓGICA PARA DATOS DE SIMs 
-# ----------------------------------------------------------------------------- 
+    elif job['status'] == 'failed':
+        st.error(f"Error en la carga: {job['error'].splitlines()[0]}")
+        with st.expander("Detalle del error"):
+            st.code(job['error'])
+
+def show_metrics(metrics, render_seconds=None):
+    """Muestra las métricas por etapa de una carga (ver sims_plataformas.metrics). El tiempo de
+       render es el del script al armar los resultados, no el del navegador al dibujarlos."""
+    if not metrics:
+        return
+    with st.expander("Métricas de la carga"):
+        col_m1, col_m2, col_m3, col_m4 = st.columns(4)
+        with col_m1:
+            st.metric("Duración (s)", f"{metrics['seconds']:.1f}")
+        with col_m2:
+            # Memoria residente máxima al cerrar las etapas y cuánto creció desde el inicio de la carga
+            # (las cargas guardadas en el ledger por versiones anteriores no la tienen)
+            rss_start, rss_max = metrics.get('rss_start_mb'), metrics.get('rss_max_mb')
+            st.metric(
+                "Memoria máx. (MB)", rss_max if rss_max is not None else "-",
+                delta=f"{rss_max - rss_start:+.1f} MB" if rss_max is not None and rss_start is not None else None,
+                delta_color="off"
+            )
+        with col_m3:
+            statements = metrics['sqlite_statements']
+            st.metric("Sentencias SQLite", f"{statements:,}" if statements is not None else "solo con perfil")
+        with col_m4:
+            st.metric("Render (s)", f"{render_seconds:.2f}" if render_seconds is not None else "-")
+        st.dataframe(pd.DataFrame(metrics['stages']), use_container_width=True, hide_index=True)
+        st.caption(f"Métricas en JSON: {metrics['json_path']}")
+        if metrics['profile_path'] and os.path.exists(metrics['profile_path']):
+            st.download_button(
+                label="Descargar perfil cProfile (.prof)",
+                data=file_on_click(metrics['profile_path']),
+                file_name=os.path.basename(metrics['profile_path']),
+                mime="application/octet-stream",
+                key=f"perfil_{metrics['run']}"
+            )
 
-default_mappings_sims = {
-    "SIMPATIC": {
-        'ICCID': 'iccid',
-        'TELEFONO': 'msisdn',
-        'ESTADO DEL SIM': 'status',
-        'EN SESION': 'status',
-        'ConsumoMb': 'consumo en Mb'
-    },
-    "TELCEL ALEJANDRO": {
-        'ICCID': 'ICCID',
-        'TELEFONO': 'MSISDN',
-        'ESTADO DEL SIM': 'ESTADO SIM',
-        'EN SESION': 'SESIÓN',
-        'ConsumoMb': 'LÍMITE DE USO DE DATOS'
-    },
-    "-1": {
-        'ICCID': 'ICCID',
-        'TELEFONO': 'MSISDN',
-        'ESTADO DEL SIM': 'Estado de SIM',
-        'EN SESION': 'En sesión',
-        'ConsumoMb': 'Uso de ciclo hasta la fecha (MB)'
-    },
-    "-2": {
-        'ICCID': 'ICCID',
-        'TELEFONO': 'MSISDN',
-        'ESTADO DEL SIM': 'Estado de SIM',
-        'EN SESION': 'En sesión',
-        'ConsumoMb': 'Uso de ciclo hasta la fecha (MB)'
-    },
-    "TELCEL": {
-        'ICCID': 'Cuenta Padre',
-        'TELEFONO': 'Línea',
-        'ESTADO DEL SIM': 'Estatus línea',
-        'EN SESION': 'Estatus línea',
-        'ConsumoMb': 'Estatus línea'
-    },
-    "MOVISTAR": {
-        'ICCID': 'ICC',
-        'TELEFONO': 'MSISDN',
-        'ESTADO DEL SIM': 'Estado',
-        'EN SESION': 'Estado GPRS',
-        'ConsumoMb': 'Consumo Datos Mensual'
-    },
-    "NANTI": {
-        'ICCID': 'ICCID',
-        'TELEFONO': 'MSISDN',
-        'ESTADO DEL SIM': 'Estado',
-        'EN SESION': 'Estado',
-        'ConsumoMb': 'Estado'
-    },
-    "LEGACY": {
-        'ICCID': 'ICCID',
-        'TELEFONO': 'TELEFONO',
-        'ESTADO DEL SIM': 'Estatus',
-        'EN SESION': 'Estatus',
-        'ConsumoMb': 'BSP Nacional'
-    }
-}
-
-def create_database_sims(db_path):
-    """Crea (o verifica) la tabla para SIMs en la base de datos SQLite."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(''' 
-        CREATE TABLE IF NOT EXISTS sims ( 
-            ICCID TEXT, 
-            TELEFONO TEXT, 
-            ESTADO_DEL_SIM TEXT, 
-            EN_SESION TEXT, 
-            ConsumoMb TEXT,
-            Compania TEXT,
-            UNIQUE(ICCID, TELEFONO)
-        ) 
-    ''')
-    conn.commit()
-    conn.close()
-
-def insert_data_sims(db_path, data):
-    """Inserta una lista de tuplas en la tabla 'sims'."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    records_before = cursor.execute("SELECT COUNT(*) FROM sims").fetchone()[0]
-    try:
-        cursor.executemany(
-            """INSERT OR IGNORE INTO sims (
-                ICCID, TELEFONO, ESTADO_DEL_SIM, EN_SESION, ConsumoMb, Compania
-            ) VALUES (?, ?, ?, ?, ?, ?)""",
-            data
+def process_plataformas(progress, file_name, content, db_path, ingestion, load_key, profile=False):
+    """Carga un Excel de plataformas en `db_path` (en segundo plano, ver start_job) y devuelve el
+       resultado que se guarda en la sesión y en el ledger. No usa Streamlit: corre en otro hilo.
+       La base queda en uso (no se puede borrar) desde que se crea la tabla hasta la exportación."""
+    excel_file = io.BytesIO(content)
+    excel_file.name = file_name
+
+    # Cada lote leído del Excel se inserta de inmediato (una transacción por lote, que se
+    # alterna con las de otras sesiones que cargan en la misma base)
+    with hold_database(db_path), run_metrics('plataformas', profile) as metrics, \
+            run_logging('plataformas') as log_path, bulk_load(db_path, 'datos') as conn, \
+            closing(open_history()) as history_conn:
+        create_database_plataformas(db_path)
+        # Cada lote también se agrega a la foto en curso del historial, sin acumular las filas
+        load = load_excel_file_plataformas(
+            excel_file, default_mappings_plataformas, conn, progress=progress, history_conn=history_conn
         )
-        conn.commit()
-        records_after = cursor.execute("SELECT COUNT(*) FROM sims").fetchone()[0]
-        records_inserted = records_after - records_before
-        logging.info(f"Insertados {records_inserted} registros nuevos en la base de datos de SIMs.")
-    finally:
-        conn.close()
-
-    return len(data), records_inserted
-
-def clean_iccid_telefono_consumo(data):
-    """Limpia los campos ICCID, TELEFONO y ConsumoMb para que contengan solo dígitos donde aplique."""
-    cleaned_data = []
-    for row in data:
-        cleaned_row = list(row)
-        original_iccid = cleaned_row[0]
-        original_telefono = cleaned_row[1]
-        original_consumo_mb = cleaned_row[4]
-        
-        # Limpieza de ICCID
-        if isinstance(original_iccid, float) and original_iccid.is_integer():
-            cleaned_iccid = str(int(original_iccid))
-        else:
-            cleaned_iccid = str(original_iccid)
-        cleaned_row[0] = ''.join(filter(str.isdigit, cleaned_iccid)) if cleaned_iccid else ""
-        
-        # Limpieza de TELEFONO
-        if isinstance(original_telefono, float) and original_telefono.is_integer():
-            cleaned_telefono = str(int(original_telefono))
+        # Los duplicados quedan en la base de la carga para consultarlos por páginas
+        with stage('no_insertados') as timing:
+            timing['rows'] = len(load['not_inserted'])
+            save_not_inserted_plataformas(conn, load_key, load['not_inserted'])
+        logger.info(
+            f"Archivo '{file_name}': {load['total_records']} registros, "
+            f"{load['inserted_count']} insertados, {len(load['not_inserted'])} duplicados, "
+            f"{load['invalid_count']} inválidos."
+        )
+        # En el historial solo se escriben las diferencias con la foto anterior
+        with stage('historial'):
+            history_stats = apply_snapshot_if_newer(history_conn, 'datos', extract_date_from_filename(file_name))
+        # Copia columnar (Parquet por plataforma) para análisis, mucho más liviana que el .db;
+        # sin filas nuevas no hay nada que exportar
+        parquet_zip = None
+        if load['inserted_count']:
+            with stage('parquet'):
+                parquet_zip = export_parquet_zip(db_path, 'datos')
         else:
-            cleaned_telefono = str(original_telefono)
-        cleaned_row[1] = ''.join(filter(str.isdigit, cleaned_telefono)) if cleaned_telefono else ""
-        
-        # Limpieza de ConsumoMb
-        if original_consumo_mb:
-            cleaned_consumo_mb = ''.join(filter(str.isdigit, str(original_consumo_mb)))
+            logger.info("Sin registros insertados: se omite la exportación Parquet.")
+
+    # En la sesión solo quedan los conteos; las filas se consultan en la base por páginas
+    results = {
+        'total_records': load['total_records'],
+        'inserted_count': load['inserted_count'],
+        'invalid_count': load['invalid_count'],
+        'not_inserted_count': len(load['not_inserted']),
+        'db_path': db_path,
+        'platform_ranges': load['platform_ranges'],
+        'platform_rowids': load['platform_rowids'],
+        'history_stats': history_stats,
+        'parquet_zip': parquet_zip,
+        'log_path': log_path,
+        'metrics': metrics_summary(metrics)
+    }
+    record_ingestion(ingestion, 'plataformas', file_name, db_path, results, load['sample_keys'])
+    return results
+
+def process_sims(progress, files, column_mapping, ingestions, previous, db_path, profile=False):
+    """Carga los archivos de SIMs `files` [(nombre, contenido)] en `db_path` (en segundo plano,
+       ver start_job). Los archivos con resultado en `previous` (ledger) no se vuelven a procesar."""
+    stats_by_file = {}
+    rejected_sims = RecordStore(rejected_columns_sims, rejected_kinds_sims)
+    pending_files = [(name, content) for name, content in files if previous[name] is None]
+
+    with hold_database(db_path), run_metrics('sims', profile) as metrics, run_logging('sims') as log_path, \
+            bulk_load(db_path, 'sims') as conn, closing(open_history()) as history_conn:
+        create_database_sims(db_path)
+        logger.info(f"Base de datos de SIMs creada/verificada: {db_path}")
+        units = build_units_sims(pending_files, column_mapping)
+        if default_workers_sims > 1 and len(units) > 1:
+            # Varias pestañas/archivos: se parsean y limpian en paralelo, un solo escritor
+            stats_by_file, rejected_sims = load_units_sims(
+                units, conn, history_conn=history_conn, progress=progress
+            )
         else:
-            cleaned_consumo_mb = ""
-        cleaned_row[4] = cleaned_consumo_mb
-        
-        # Normalización de ESTADO_DEL_SIM y EN_SESION
-        cleaned_row[2] = cleaned_row[2].strip().lower() if cleaned_row[2] else ""
-        cleaned_row[3] = cleaned_row[3].strip().lower() if cleaned_row[3] else ""
-        
-        cleaned_data.append(tuple(cleaned_row))
-        logging.info(
-            f"Limpieza Registro SIM: ICCID '{original_iccid}' -> '{cleaned_row[0]}', "
-            f"TELEFONO '{original_telefono}' -> '{cleaned_row[1]}', "
-            f"ConsumoMb '{original_consumo_mb}' -> '{cleaned_row[4]}'"
+            for name, content in pending_files:
+                sims_file = io.BytesIO(content)
+                sims_file.name = name
+                stats, rejected = load_file_sims(
+                    sims_file, column_mapping[name], conn,
+                    history_conn=history_conn, progress=progress
+                )
+                stats_by_file[name] = stats
+                rejected_sims.extend(rejected)
+        sample_keys = {name: stats_by_file[name].pop('sample_keys') for name, _ in pending_files}
+        # Los rechazados quedan en la base (no en el ledger), en una sola pasada por todos los archivos
+        with stage('no_insertados') as timing:
+            timing['rows'] = len(rejected_sims)
+            save_not_inserted_sims(conn, rejected_sims, {name: ingestions[name] for name, _ in pending_files})
+        for name, _ in files:
+            if previous[name] is not None:
+                stats_by_file[name] = previous[name]['stats']
+                # Las entradas anteriores a la tabla no_insertados_sims traen los rechazados en el ledger
+                stored = previous[name].get('rejected') or read_not_inserted_sims(conn, ingestions[name])
+                rejected_sims.extend(tuple(record) for record in stored)
+                progress(unit_label_sims(name), 0, 0)
+        total_records = 0
+        total_inserted = 0
+        for stats in stats_by_file.values():
+            for unit_stats in stats.get('sheets', {'': stats}).values():
+                total_records += unit_stats['processed']
+                total_inserted += unit_stats['inserted']
+        logger.info(
+            f"SIMs: {total_records} registros procesados, {total_inserted} insertados "
+            f"en {len(stats_by_file)} archivos."
         )
-    return cleaned_data
-
-def process_excel_sims(excel_file, column_mapping, sheet_name):
-    """Procesa una hoja de Excel para SIMs usando un mapeo de columnas."""
-    workbook = openpyxl.load_workbook(excel_file, data_only=True)
-    sheet = workbook[sheet_name]
-    all_data = []
-    header_row = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True))
-
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        row_data = []
-        for key in ['ICCID', 'TELEFONO', 'ESTADO DEL SIM', 'EN SESION', 'ConsumoMb']:
-            col_index = column_mapping[key]
-            if col_index is None or col_index == -1:
-                cell_value = ""
-            elif col_index >= len(row):
-                cell_value = ""
-            else:
-                cell = row[col_index]
-                if isinstance(cell, float) and cell.is_integer():
-                    cell_value = str(int(cell))
-                elif isinstance(cell, (int, str)):
-                    cell_value = str(cell)
-                else:
-                    cell_value = str(cell) if cell is not None else ""
-            row_data.append(cell_value)
-        row_data.append(sheet_name)  # Se agrega el nombre de la pestaña como 'Compania'
-        all_data.append(row_data)
-    return all_data
-
-def process_csv_sims(csv_file, column_mapping):
-    """Procesa un archivo CSV para SIMs usando un mapeo de columnas."""
-    try:
-        df = pd.read_csv(csv_file, dtype=str)
-    except Exception as e:
-        logging.error(f"Error leyendo CSV: {e}")
-        return []
-    
-    all_data = []
-    company_name = os.path.splitext(os.path.basename(csv_file.name))[0]
-    
-    for index, row in df.iterrows():
-        row_data = []
-        for key in ['ICCID', 'TELEFONO', 'ESTADO DEL SIM', 'EN SESION', 'ConsumoMb']:
-            col_index = column_mapping[key]
-            if col_index is None or col_index == -1:
-                cell_value = ""
-            else:
-                col_name = df.columns[col_index]
-                cell = row.get(col_name, "")
-                if pd.notnull(cell):
-                    cell = cell.strip()
-                else:
-                    cell = ""
-            row_data.append(cell)
-        row_data.append(company_name)
-        all_data.append(row_data)
-    return all_data
+        with stage('historial'):
+            history_stats = apply_snapshot_if_newer(history_conn, 'sims', datetime.now().strftime('%Y-%m-%d'))
+        # Copia columnar (Parquet por operador) para análisis, mucho más liviana que el .db; solo si
+        # esta carga insertó filas (si todos los archivos venían del ledger la base no cambió)
+        parquet_zip = None
+        if any(
+            unit_stats['inserted']
+            for name, _ in pending_files
+            for unit_stats in stats_by_file[name].get('sheets', {'': stats_by_file[name]}).values()
+        ):
+            with stage('parquet'):
+                parquet_zip = export_parquet_zip(db_path, 'sims')
+        else:
+            logger.info("Sin registros insertados: se omite la exportación Parquet.")
+
+    # Solo llegan aquí las cargas completas: si falla una unidad, el historial o la exportación,
+    # la excepción sale antes y ningún archivo queda registrado en el ledger
+    for name, _ in pending_files:
+        record_ingestion(ingestions[name], 'sims', name, db_path, {'stats': stats_by_file[name]}, sample_keys[name])
+    return {
+        'total_records': total_records,
+        'total_inserted': total_inserted,
+        'stats_by_file': stats_by_file,
+        'rejected': rejected_sims,
+        'history_stats': history_stats,
+        'parquet_zip': parquet_zip,
+        'log_path': log_path,
+        'metrics': metrics_summary(metrics)
+    }
 
 # ----------------------------------------------------------------------------- 
 # APLICACIÓN STREAMLIT UNIFICADA 
 # ----------------------------------------------------------------------------- 
 
 st.title("Aplicación Unificada: Carga de Datos de Plataformas y SIMs")
-tabs = st.tabs(["Plataformas", "SIMs"])
+tabs = st.tabs(["Plataformas", "SIMs", "Conciliación", "Historial"])
+profile_runs = st.sidebar.checkbox(
+    "Perfilar cargas con cProfile", value=profile_enabled,
+    help="Guarda un perfil .prof de cada carga junto a sus métricas (la carga es más lenta)."
+)
 
 # ----------------------------------------------------------------------------- 
 # TAB DE PLATAFORMAS 
 # ----------------------------------------------------------------------------- 
 with tabs[0]:
     st.header("Carga y Homologación de Datos desde Excel (Plataformas)")
+    # Las cargas en curso (de esta u otras sesiones) se muestran aunque la página se haya
+    # refrescado y el archivo ya no esté subido
+    for running_job in running_jobs('plataformas'):
+        show_job_progress(running_job['id'])
     uploaded_file = st.file_uploader("Sube el archivo Excel para Plataformas", type=["xlsx"])
     
     if uploaded_file is not None:
@@ -425,89 +347,108 @@ with tabs[0]:
             st.warning(f"Ya existe una base de datos para hoy (Plataformas): {os.path.basename(today_db_path_plataformas)}")
             if st.button("Eliminar base de datos existente (Plataformas)"):
                 try:
-                    os.remove(today_db_path_plataformas)
+                    delete_database(today_db_path_plataformas)
+                    forget_ingestions(today_db_path_plataformas)
+                    clear_jobs('plataformas')
+                    st.session_state.pop('results_cache_plataformas', None)
                     st.success("Base de datos de plataformas eliminada correctamente.")
+                except DatabaseInUse as e:
+                    st.warning(f"No se eliminó la base de datos: {e} Inténtalo cuando termine.")
                 except Exception as e:
                     st.error(f"Error al eliminar la base de datos de plataformas: {str(e)}")
 
-        if st.button("Ejecutar procesamiento de datos (Plataformas)"):
-            all_data, invalid_data, total_records = process_excel_file_plataformas(uploaded_file, default_mappings_plataformas)
-            create_database_plataformas(today_db_path_plataformas)
-
-            conn = sqlite3.connect(today_db_path_plataformas)
-            cursor = conn.cursor()
-            not_inserted = []
-            inserted = []
-            columns_plat = [
-                'Nombre', 'Cliente_Cuenta', 'Tipo_de_Dispositivo', 'IMEI', 'ICCID',
-                'Fecha_de_Activacion', 'Fecha_de_Desactivacion', 'Hora_de_Ultimo_Mensaje',
-                'Ultimo_Reporte', 'Vehiculo', 'Servicios', 'Grupo', 'Telefono', 'Origen', 'Fecha_Archivo'
-            ]
-            for record in all_data:
-                try:
-                    cursor.execute('''
-                        INSERT INTO datos (
-                            Nombre, Cliente_Cuenta, Tipo_de_Dispositivo, IMEI, ICCID,
-                            Fecha_de_Activacion, Fecha_de_Desactivacion, Hora_de_Ultimo_Mensaje,
-                            Ultimo_Reporte, Vehiculo, Servicios, Grupo, Telefono, Origen, Fecha_Archivo
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', record)
-                    inserted.append(record)
-                except sqlite3.IntegrityError:
-                    not_inserted.append(record)
-            conn.commit()
-            conn.close()
-
-            df_inserted = pd.DataFrame(inserted, columns=columns_plat)
-            df_not_inserted = pd.DataFrame(not_inserted, columns=columns_plat)
+        # Los resultados se guardan en la sesión (clave = hash del archivo + mapeo) para que los
+        # filtros y descargas, que provocan un rerun, no vuelvan a procesar el archivo
+        results_key = (uploaded_file_hash(uploaded_file), mapping_hash(default_mappings_plataformas))
+        load_key = short_load_key(results_key[0], default_mappings_plataformas)
+        results_cache = st.session_state.setdefault('results_cache_plataformas', OrderedDict())
+
+        # La carga corre en segundo plano (ver sims_plataformas.jobs): la página sigue
+        # respondiendo y un rerun no la interrumpe. Otras sesiones pueden cargar otros archivos
+        # a la vez; el mismo archivo no se lanza dos veces en paralelo
+        running = any(job['key'] == results_key for job in running_jobs('plataformas'))
+        if st.button("Ejecutar procesamiento de datos (Plataformas)", disabled=running):
+            # Mismo archivo y mapeo sobre la misma base: se reutiliza el resultado guardado
+            ingestion = ingestion_key(
+                'plataformas', results_key[0], default_mappings_plataformas, today_db_path_plataformas
+            )
+            previous = lookup_ingestion(ingestion)
+            if previous is not None:
+                st.info("Este archivo ya se cargó en la base de hoy con el mismo mapeo: se muestran los resultados de esa carga.")
+                lru_put(results_cache, results_key, previous, results_cache_size)
+            else:
+                start_job(
+                    'plataformas', results_key, process_plataformas, uploaded_file.name,
+                    uploaded_file.getvalue(), today_db_path_plataformas, ingestion, load_key, profile_runs
+                )
+                st.rerun()
+
+        job = latest_job('plataformas', results_key)
+        if job is not None and job['status'] == 'done' and lru_get(results_cache, results_key) is None:
+            lru_put(results_cache, results_key, job['result'], results_cache_size)
+        elif job is not None and job['status'] != 'running':
+            show_job_outcome(job)
+
+        results = lru_get(results_cache, results_key)
+        if results is not None:
+            render_start = time.perf_counter()
+            total_records = results['total_records']
+            not_inserted_count = results['not_inserted_count']
+            # Base de la carga (puede ser de otro día si la sesión siguió abierta)
+            run_db_path = results['db_path']
+            platform_ranges = results['platform_ranges']
+            # Las cargas guardadas en el ledger por versiones anteriores no traen los rowids
+            platform_rowids = results.get('platform_rowids')
+            if results.get('log_path'):
+                st.caption(f"Log de la ejecución: {results['log_path']}")
 
             col1, col2, col3, col4 = st.columns(4)
             with col1:
                 st.metric("Total de Registros", total_records)
             with col2:
-                st.metric("Registros Insertados", len(inserted))
+                st.metric("Registros Insertados", results['inserted_count'])
             with col3:
-                st.metric("Registros No Insertados", len(not_inserted))
+                st.metric("Registros No Insertados", not_inserted_count)
             with col4:
-                st.metric("Registros Inválidos", len(invalid_data))
+                st.metric("Registros Inválidos", results['invalid_count'])
+            if results['history_stats'] is None:
+                st.warning("El historial no se actualizó: la fecha del archivo es anterior a la última foto cargada.")
+            else:
+                st.caption("Historial: " + ", ".join(
+                    f"{count} {label.replace('_', ' ')}" for label, count in results['history_stats'].items()
+                ))
 
-            if len(not_inserted) > 0:
+            if not_inserted_count > 0 and os.path.exists(run_db_path):
                 st.write("### Registros No Insertados (Duplicados)")
+                load_filter = {'Carga': load_key}
                 col_a, col_b = st.columns(2)
                 with col_a:
-                    unique_clients = sorted(df_not_inserted['Cliente_Cuenta'].dropna().unique())
                     selected_client_ni = st.multiselect(
                         'Filtrar por Cliente (No Insertados):',
-                        options=unique_clients, 
-                        default=[]
+                        options=distinct_values(run_db_path, 'no_insertados', 'Cliente_Cuenta', load_filter),
+                        default=[],
+                        key='filtro_cliente_ni_plataformas'
                     )
                 with col_b:
-                    unique_origins = sorted(df_not_inserted['Origen'].dropna().unique())
                     selected_origin_ni = st.multiselect(
                         'Filtrar por Origen (No Insertados):',
-                        options=unique_origins, 
-                        default=[]
+                        options=distinct_values(run_db_path, 'no_insertados', 'Origen', load_filter),
+                        default=[],
+                        key='filtro_origen_ni_plataformas'
                     )
-                df_filtered_ni = df_not_inserted.copy()
-                if selected_client_ni:
-                    df_filtered_ni = df_filtered_ni[df_filtered_ni['Cliente_Cuenta'].isin(selected_client_ni)]
-                if selected_origin_ni:
-                    df_filtered_ni = df_filtered_ni[df_filtered_ni['Origen'].isin(selected_origin_ni)]
-                st.dataframe(df_filtered_ni, use_container_width=True)
-                csv_ni = df_filtered_ni.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="Descargar registros no insertados",
-                    data=csv_ni,
-                    file_name="registros_no_insertados_plataformas.csv",
-                    mime='text/csv'
+                show_paginated_table(
+                    run_db_path, 'no_insertados', columns_plataformas,
+                    {**load_filter, 'Cliente_Cuenta': selected_client_ni, 'Origen': selected_origin_ni},
+                    key='no_insertados_plataformas',
+                    file_name="registros_no_insertados_plataformas.csv"
                 )
 
             st.write("## Resumen por Plataforma")
             sheets = list(default_mappings_plataformas.keys())
             summary_data = []
             for sheet in sheets:
-                sheet_data = [record for record in all_data if record[-2] == sheet]
-                total_sheet = len(sheet_data)
+                start, end = platform_ranges.get(sheet, (0, 0))
+                total_sheet = end - start
                 percentage = (total_sheet / total_records * 100) if total_records > 0 else 0
                 summary_data.append({
                     "Plataforma": sheet,
@@ -529,8 +470,8 @@ with tabs[0]:
             for i, sheet in enumerate(sheets):
                 with platform_tabs[i]:
                     st.write(f"## Análisis de {sheet}")
-                    sub_data = [record for record in all_data if record[-2] == sheet]
-                    total_sheet = len(sub_data)
+                    start, end = platform_ranges.get(sheet, (0, 0))
+                    total_sheet = end - start
                     percentage = (total_sheet / total_records * 100) if total_records > 0 else 0
                     st.write("### Resumen de la Plataforma")
                     col_s1, col_s2, col_s3 = st.columns(3)
@@ -541,62 +482,86 @@ with tabs[0]:
                     with col_s3:
                         mapped_fields = sum(1 for v in default_mappings_plataformas[sheet].values() if v is not None)
                         st.metric("Campos Mapeados", mapped_fields)
-                    if total_sheet > 0:
-                        df_sheet = pd.DataFrame(sub_data, columns=columns_plat)
+                    if total_sheet > 0 and os.path.exists(run_db_path):
                         st.write("### Datos Filtrables")
+                        # Las filas de la plataforma que insertó esta carga, por su rango de rowids
+                        # en la base de la carga (tabla 'datos'); sin rango, todas las de la plataforma
+                        sheet_filter = {'Origen': default_mappings_plataformas[sheet]['Origen']}
+                        if platform_rowids is not None:
+                            first_rowid, last_rowid = platform_rowids.get(sheet, (0, -1))
+                            sheet_filter['rowid'] = {'desde': first_rowid, 'hasta': last_rowid + 1}
                         col_sf1, col_sf2 = st.columns(2)
                         with col_sf1:
-                            unique_clients_2 = sorted(df_sheet['Cliente_Cuenta'].dropna().unique())
                             filter_client_2 = st.multiselect(
                                 "Filtrar por Cliente:",
-                                unique_clients_2, 
-                                default=[]
+                                distinct_values(run_db_path, 'datos', 'Cliente_Cuenta', sheet_filter),
+                                default=[],
+                                key=f"filtro_cliente_{sheet}"
                             )
                         with col_sf2:
-                            unique_dev_2 = sorted(df_sheet['Tipo_de_Dispositivo'].dropna().unique())
                             filter_dev_2 = st.multiselect(
                                 "Filtrar por Tipo de Dispositivo:",
-                                unique_dev_2, 
-                                default=[]
+                                distinct_values(run_db_path, 'datos', 'Tipo_de_Dispositivo', sheet_filter),
+                                default=[],
+                                key=f"filtro_dispositivo_{sheet}"
+                            )
+                        # Antigüedad del último mensaje o reporte, por el índice de Ultima_Actividad_Epoch
+                        stale_filters = {}
+                        sheet_mapping = default_mappings_plataformas[sheet]
+                        if sheet_mapping['Hora_de_Ultimo_Mensaje'] or sheet_mapping['Ultimo_Reporte']:
+                            stale_days = st.number_input(
+                                "Sin reportar en los últimos N días (0 = todos):",
+                                min_value=0, value=0, step=1,
+                                key=f"filtro_sin_reportar_{sheet}"
                             )
-                        df_sheet_filtered = df_sheet.copy()
-                        if filter_client_2:
-                            df_sheet_filtered = df_sheet_filtered[df_sheet_filtered['Cliente_Cuenta'].isin(filter_client_2)]
-                        if filter_dev_2:
-                            df_sheet_filtered = df_sheet_filtered[df_sheet_filtered['Tipo_de_Dispositivo'].isin(filter_dev_2)]
-                        st.dataframe(df_sheet_filtered, use_container_width=True)
-                        csv_sheet = df_sheet_filtered.to_csv(index=False).encode('utf-8')
-                        st.download_button(
-                            label=f"Descargar Datos de {sheet}",
-                            data=csv_sheet,
-                            file_name=f"{sheet}_datos_plataformas.csv",
-                            mime='text/csv'
+                            if stale_days:
+                                stale_filters = stale_filter(stale_days)
+                        show_paginated_table(
+                            run_db_path, 'datos', columns_plataformas,
+                            {
+                                **sheet_filter, 'Cliente_Cuenta': filter_client_2, 'Tipo_de_Dispositivo': filter_dev_2,
+                                **stale_filters
+                            },
+                            key=f"datos_{sheet}",
+                            file_name=f"{sheet}_datos_plataformas.csv"
                         )
                     else:
                         st.warning(f"No hay registros para {sheet}.")
 
             # (Opcional) Si quieres también descargar el volcado .sql, descomenta estas líneas:
-            # with sqlite3.connect(today_db_path_plataformas) as conn:
+            # with sqlite3.connect(run_db_path) as conn:
             #     sql_dump = "\n".join(conn.iterdump())
             # st.download_button(
             #     label="Descargar SQL generado (Plataformas)",
             #     data=sql_dump,
-            #     file_name=f"{today_db_path_plataformas}.sql",
+            #     file_name=f"{run_db_path}.sql",
             #     mime="text/sql"
             # )
 
             # --------------------------
-            # Descarga del archivo .db directamente
+            # Descarga del archivo .db directamente (la base de la carga mostrada, que no es la
+            # de hoy si sus resultados son de otro día)
             # --------------------------
-            with open(today_db_path_plataformas, "rb") as db_file:
-                db_bytes = db_file.read()
+            if os.path.exists(run_db_path):
+                st.download_button(
+                    label="Descargar Base de Datos .db (Plataformas)",
+                    data=file_on_click(run_db_path),
+                    file_name=os.path.basename(run_db_path),
+                    mime="application/octet-stream"
+                )
 
-            st.download_button(
-                label="Descargar Base de Datos .db (Plataformas)",
-                data=db_bytes,
-                file_name=os.path.basename(today_db_path_plataformas),
-                mime="application/octet-stream"
-            )
+            if results.get('parquet_zip') and os.path.exists(results['parquet_zip']):
+                st.download_button(
+                    label="Descargar Parquet por plataforma (.zip)",
+                    data=file_on_click(results['parquet_zip']),
+                    file_name=os.path.basename(results['parquet_zip']),
+                    mime="application/zip"
+                )
+
+            render_seconds = time.perf_counter() - render_start
+            if results.get('metrics'):
+                record_render(results['metrics'], render_seconds)
+            show_metrics(results.get('metrics'), render_seconds)
 
 # ----------------------------------------------------------------------------- 
 # TAB DE SIMs 
@@ -605,6 +570,8 @@ with tabs[1]:
     st.header("Carga de Excel/CSV y Homologación de Base de Datos (SIMs)")
     st.write("Sube los archivos Excel o CSV para SIMs")
     
+    for running_job_sims in running_jobs('sims'):
+        show_job_progress(running_job_sims['id'])
     uploaded_files_sims = st.file_uploader("Selecciona los archivos", type=["xlsx", "csv"], accept_multiple_files=True)
     # Se crea la base de datos de SIMs en el directorio actual
     db_path_sims = "sims_hoy.db"
@@ -616,26 +583,16 @@ with tabs[1]:
         for uploaded_file in uploaded_files_sims:
             st.write(f"### Archivo: {uploaded_file.name}")
             if uploaded_file.name.endswith('.xlsx'):
-                # Procesamos Excel
-                uploaded_file.seek(0)
-                workbook = openpyxl.load_workbook(uploaded_file, data_only=True)
+                # Para el mapeo solo se leen los encabezados (una vez por archivo); las filas
+                # se decodifican al procesar
+                sheet_headers = probe_headers_sims(uploaded_file, key=uploaded_file_hash(uploaded_file))
                 column_mapping[uploaded_file.name] = {}
-                for sheet_name in workbook.sheetnames:
+                for sheet_name, header_row in sheet_headers.items():
                     st.subheader(f"Pestaña: {sheet_name}")
-                    header_row = next(workbook[sheet_name].iter_rows(min_row=1, max_row=1, values_only=True))
-                    header_row = [col if col else "" for col in header_row]
 
                     if sheet_name in default_mappings_sims:
-                        mapping = default_mappings_sims[sheet_name]
-                        mapping_indices = {}
-                        mapping_valid = True
-                        for key_field, column_name in mapping.items():
-                            if column_name in header_row:
-                                mapping_indices[key_field] = header_row.index(column_name)
-                            else:
-                                mapping_valid = False
-                                break
-                        if mapping_valid:
+                        mapping_indices = resolve_mapping_sims(sheet_name, header_row)
+                        if mapping_indices is not None:
                             column_mapping[uploaded_file.name][sheet_name] = mapping_indices
                             st.info("Mapeo automático aplicado con éxito.")
                         else:
@@ -655,8 +612,6 @@ with tabs[1]:
                             }
                     else:
                         st.info("Pestaña no definida en mapeo por defecto. Selecciona manualmente:")
-                        header_row = next(workbook[sheet_name].iter_rows(min_row=1, max_row=1, values_only=True))
-                        header_row = [col if col else "" for col in header_row]
                         iccid_col = st.selectbox("Columna para ICCID:", options=header_row, key=f"{uploaded_file.name}_{sheet_name}_iccid_man")
                         telefono_col = st.selectbox("Columna para TELEFONO:", options=header_row, key=f"{uploaded_file.name}_{sheet_name}_tel_man")
                         estado_sim_col = st.selectbox("Columna para ESTADO DEL SIM:", options=header_row, key=f"{uploaded_file.name}_{sheet_name}_estado_man")
@@ -672,23 +627,15 @@ with tabs[1]:
             elif uploaded_file.name.endswith('.csv'):
                 st.subheader("Archivo CSV")
                 try:
-                    df_csv = pd.read_csv(uploaded_file, dtype=str)
+                    # Solo se necesita el encabezado; los datos se leen al procesar (iter_csv_sims)
+                    columns_csv = probe_headers_sims(uploaded_file, key=uploaded_file_hash(uploaded_file))
                 except Exception as e:
                     st.error(f"Error leyendo CSV: {e}")
                     continue
-                columns_csv = df_csv.columns.tolist()
                 file_name_no_ext = os.path.splitext(uploaded_file.name)[0]
                 if file_name_no_ext in default_mappings_sims:
-                    mapping = default_mappings_sims[file_name_no_ext]
-                    mapping_indices = {}
-                    mapping_valid = True
-                    for key_field, column_name in mapping.items():
-                        if column_name in columns_csv:
-                            mapping_indices[key_field] = columns_csv.index(column_name)
-                        else:
-                            mapping_valid = False
-                            break
-                    if mapping_valid:
+                    mapping_indices = resolve_mapping_sims(file_name_no_ext, columns_csv)
+                    if mapping_indices is not None:
                         column_mapping[uploaded_file.name] = mapping_indices
                         st.info("Mapeo automático aplicado con éxito para CSV.")
                     else:
@@ -720,46 +667,61 @@ with tabs[1]:
                         'ConsumoMb': columns_csv.index(consumo_mb_col)
                     }
 
-        if st.button("Procesar Archivos de SIMs"):
-            create_database_sims(db_path_sims)
-            logging.info(f"Base de datos de SIMs creada/verificada: {db_path_sims}")
-
-            total_records_sims = 0
-            total_inserted_sims = 0
-            stats_by_file = {}
-
-            for uploaded_file in uploaded_files_sims:
-                if uploaded_file.name.endswith('.xlsx'):
-                    uploaded_file.seek(0)
-                    workbook = openpyxl.load_workbook(uploaded_file, data_only=True)
-                    stats_by_file[uploaded_file.name] = {'sheets': {}}
-                    for sheet_name in column_mapping[uploaded_file.name].keys():
-                        # Es importante reiniciar el puntero en el archivo para cada lectura
-                        uploaded_file.seek(0)
-                        data = process_excel_sims(uploaded_file, column_mapping[uploaded_file.name][sheet_name], sheet_name)
-                        data_cleaned = clean_iccid_telefono_consumo(data)
-                        processed, inserted = insert_data_sims(db_path_sims, data_cleaned)
-                        stats_by_file[uploaded_file.name]['sheets'][sheet_name] = {
-                            'processed': processed,
-                            'inserted': inserted
-                        }
-                        total_records_sims += processed
-                        total_inserted_sims += inserted
-                elif uploaded_file.name.endswith('.csv'):
-                    uploaded_file.seek(0)
-                    data = process_csv_sims(uploaded_file, column_mapping[uploaded_file.name])
-                    data_cleaned = clean_iccid_telefono_consumo(data)
-                    processed, inserted = insert_data_sims(db_path_sims, data_cleaned)
-                    stats_by_file[uploaded_file.name] = {
-                        'processed': processed,
-                        'inserted': inserted
-                    }
-                    total_records_sims += processed
-                    total_inserted_sims += inserted
-
+        # Los archivos cuyo encabezado no se pudo leer no tienen mapeo y no se procesan
+        mapped_files_sims = [
+            uploaded_file for uploaded_file in uploaded_files_sims if uploaded_file.name in column_mapping
+        ]
+        # Archivos ya cargados con el mismo mapeo: se reutiliza el resultado guardado
+        ingestions_sims = {
+            uploaded_file.name: ingestion_key(
+                'sims', uploaded_file_hash(uploaded_file), column_mapping[uploaded_file.name], db_path_sims
+            )
+            for uploaded_file in mapped_files_sims
+        }
+        # La carga se identifica por los archivos y sus mapeos, para encontrarla en los reruns
+        job_key_sims = mapping_hash(ingestions_sims)
+        running_sims = any(job['key'] == job_key_sims for job in running_jobs('sims'))
+
+        if st.button("Procesar Archivos de SIMs", disabled=running_sims or not mapped_files_sims):
+            previous_sims = {name: lookup_ingestion(key) for name, key in ingestions_sims.items()}
+            reused_files_sims = [name for name, previous in previous_sims.items() if previous is not None]
+            if reused_files_sims:
+                st.info(
+                    "Ya cargados con el mismo mapeo (se muestran los resultados de esa carga): "
+                    + ", ".join(reused_files_sims)
+                )
+            start_job(
+                'sims', job_key_sims, process_sims,
+                [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in mapped_files_sims],
+                column_mapping, ingestions_sims, previous_sims, db_path_sims, profile_runs
+            )
+            st.rerun()
+
+        # Mientras la carga sigue en curso solo se muestra su avance (arriba, show_job_progress):
+        # el resultado recién existe cuando termina, y entonces se copia a la sesión (como en
+        # plataformas) para que no dependa de que el trabajo siga en el registro de jobs
+        results_cache_sims = st.session_state.setdefault('results_cache_sims', OrderedDict())
+        job_sims = latest_job('sims', job_key_sims)
+        if job_sims is not None and job_sims['status'] == 'done' and lru_get(results_cache_sims, job_key_sims) is None:
+            lru_put(results_cache_sims, job_key_sims, job_sims['result'], results_cache_size)
+        elif job_sims is not None and job_sims['status'] != 'running':
+            show_job_outcome(job_sims)
+
+        results_sims = lru_get(results_cache_sims, job_key_sims)
+        if results_sims is not None:
+            render_start = time.perf_counter()
+            stats_by_file = results_sims['stats_by_file']
+            rejected_sims = results_sims['rejected']
             st.success("¡Procesamiento de SIMs completado!")
-            st.write(f"Total de registros procesados: {total_records_sims}")
-            st.write(f"Total de registros insertados (evitando duplicados): {total_inserted_sims}")
+            st.caption(f"Log de la ejecución: {results_sims['log_path']}")
+            st.write(f"Total de registros procesados: {results_sims['total_records']}")
+            st.write(f"Total de registros insertados (evitando duplicados): {results_sims['total_inserted']}")
+            if results_sims['history_stats'] is None:
+                st.warning("El historial no se actualizó: ya hay una foto posterior a la de hoy.")
+            else:
+                st.caption("Historial: " + ", ".join(
+                    f"{count} {label.replace('_', ' ')}" for label, count in results_sims['history_stats'].items()
+                ))
 
             st.write("### Estadísticas de Procesamiento por Archivo/Pestaña")
             for file, info in stats_by_file.items():
@@ -789,6 +751,18 @@ with tabs[1]:
                     with col_b3:
                         st.metric("Tasa de Inserción", f"{insertion_rate:.2f}%")
 
+            if rejected_sims:
+                st.write("### Registros No Insertados (Duplicados ICCID/TELEFONO)")
+                df_rejected_sims = rejected_sims.to_frame()
+                st.dataframe(df_rejected_sims, use_container_width=True)
+                st.download_button(
+                    label="Descargar registros no insertados (SIMs)",
+                    # Se arma al hacer clic, con el DataFrame de este rerun
+                    data=lambda frame=df_rejected_sims: frame.to_csv(index=False).encode('utf-8'),
+                    file_name="registros_no_insertados_sims.csv",
+                    mime='text/csv'
+                )
+
             # (Opcional) Si quieres también el volcado .sql, descomenta:
             # with sqlite3.connect(db_path_sims) as conn:
             #     sql_dump_sims = "\n".join(conn.iterdump())
@@ -802,14 +776,100 @@ with tabs[1]:
             # --------------------------
             # Descarga del archivo .db directamente
             # --------------------------
-            with open(db_path_sims, "rb") as db_file_sims:
-                db_sims_bytes = db_file_sims.read()
+            if os.path.exists(db_path_sims):
+                st.download_button(
+                    label="Descargar Base de Datos .db (SIMs)",
+                    data=file_on_click(db_path_sims),
+                    file_name=os.path.basename(db_path_sims),
+                    mime="application/octet-stream"
+                )
 
-            st.download_button(
-                label="Descargar Base de Datos .db (SIMs)",
-                data=db_sims_bytes,
-                file_name=os.path.basename(db_path_sims),
-                mime="application/octet-stream"
-            )
+            if results_sims.get('parquet_zip') and os.path.exists(results_sims['parquet_zip']):
+                st.download_button(
+                    label="Descargar Parquet por operador (.zip)",
+                    data=file_on_click(results_sims['parquet_zip']),
+                    file_name=os.path.basename(results_sims['parquet_zip']),
+                    mime="application/zip"
+                )
+
+            render_seconds = time.perf_counter() - render_start
+            record_render(results_sims['metrics'], render_seconds)
+            show_metrics(results_sims['metrics'], render_seconds)
     else:
         st.warning("No se han subido archivos para SIMs.")
+
+# ----------------------------------------------------------------------------- 
+# TAB DE CONCILIACIÓN 
+# ----------------------------------------------------------------------------- 
+with tabs[2]:
+    st.header("Conciliación de SIMs contra Plataformas")
+    plataformas_dbs = sorted(
+        (name for name in os.listdir('.') if name.endswith('_plataformas.db')), reverse=True
+    )
+    db_path_sims = "sims_hoy.db"
+
+    if not plataformas_dbs or not os.path.exists(db_path_sims):
+        st.warning("Se necesitan una base de datos de plataformas y la base de datos de SIMs (sims_hoy.db).")
+    else:
+        plataformas_db = st.selectbox("Base de datos de plataformas", plataformas_dbs)
+
+        if st.button("Conciliar bases de datos"):
+            with run_logging('conciliacion') as log_path:
+                reports = reconcile_databases(plataformas_db, db_path_sims)
+            st.session_state['reconciliation'] = {
+                'plataformas_db': plataformas_db,
+                'reports': reports,
+                'log_path': log_path
+            }
+
+        reconciliation = st.session_state.get('reconciliation')
+        if reconciliation and reconciliation['plataformas_db'] == plataformas_db:
+            st.caption(f"Log de la ejecución: {reconciliation['log_path']}")
+            reports = reconciliation['reports']
+            metric_cols = st.columns(len(reconciliation_categories))
+            for col, (category, title) in zip(metric_cols, reconciliation_categories.items()):
+                with col:
+                    st.metric(title, len(reports[category]))
+
+            for category, title in reconciliation_categories.items():
+                df_report = reports[category]
+                with st.expander(f"{title} ({len(df_report)})"):
+                    st.dataframe(df_report, use_container_width=True)
+                    st.download_button(
+                        label=f"Descargar: {title}",
+                        data=df_report.to_csv(index=False).encode('utf-8'),
+                        file_name=f"conciliacion_{category}.csv",
+                        mime='text/csv',
+                        key=f"descarga_conciliacion_{category}"
+                    )
+
+# ----------------------------------------------------------------------------- 
+# TAB DE HISTORIAL 
+# ----------------------------------------------------------------------------- 
+with tabs[3]:
+    st.header("Cambios en el Historial de Plataformas y SIMs")
+    if not os.path.exists(history_db_path):
+        st.warning("Todavía no hay historial: se crea con la primera carga de Plataformas o SIMs.")
+    else:
+        history_tables_labels = {'Plataformas': 'datos', 'SIMs': 'sims'}
+        history_label = st.selectbox("Tabla", list(history_tables_labels))
+        since_date = st.date_input("Cambios posteriores al", datetime.now().date() - timedelta(days=1))
+
+        with closing(open_history()) as history_conn:
+            df_changes = changes_since(history_conn, history_tables_labels[history_label], since_date.strftime('%Y-%m-%d'))
+
+        if df_changes.empty:
+            st.info("No hay cambios en ese periodo.")
+        else:
+            change_counts = df_changes['Cambio'].value_counts()
+            change_cols = st.columns(3)
+            for col, change in zip(change_cols, ['nuevo', 'modificado', 'eliminado']):
+                with col:
+                    st.metric(f"Registros ({change})", int(change_counts.get(change, 0)))
+            st.dataframe(df_changes, use_container_width=True)
+            st.download_button(
+                label=f"Descargar cambios ({history_label})",
+                data=df_changes.to_csv(index=False).encode('utf-8'),
+                file_name=f"cambios_{history_tables_labels[history_label]}_desde_{since_date}.csv",
+                mime='text/csv'
+            )
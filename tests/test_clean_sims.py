@@ -0,0 +1,47 @@
+"""Paridad de la limpieza columnar de SIMs (clean_iccid_telefono_consumo) con la limpieza fila por
+fila que reemplazó (bench._clean_sims_row_wise)."""
+import random
+
+from sims_plataformas.bench import _clean_sims_row_wise
+from sims_plataformas.sims import clean_iccid_telefono_consumo
+
+# ICCID y TELEFONO como llegan de Excel y CSV: números, floats enteros y no enteros, NaN,
+# notación científica, espacios y letras intercalados, dígitos no ASCII
+numbers = [
+    None, '', 0, 0.0, float('nan'), 8.95e18, 8952000000000000000.0, 5512345678.0, 12.5, -5.0, True,
+    8952000000000000123, '8.95e18', ' 8952 0001 2345F ', '8952-0001-AB12', '+52 (55) 1234-5678',
+    'nan', 'None', '٣٤٥', '55\x0012', '\t5512345678\n', 'ICCID'
+]
+statuses = [None, '', ' Activo ', 'ACTIVADO', 'En sesión', '  ', 'Suspendido\t']
+consumos = [None, '', 0, 0.0, '12.5 MB', 2048, 1.5, float('nan'), 'sin consumo', False]
+
+def assert_same(data):
+    assert clean_iccid_telefono_consumo(data) == _clean_sims_row_wise(data)
+
+def test_edge_cases_one_per_row():
+    data = [
+        (iccid, telefono, status, status, consumo, 'TELCEL')
+        for iccid, telefono, status, consumo in zip(
+            numbers, reversed(numbers), statuses * 4, consumos * 3
+        )
+    ]
+    assert_same(data)
+
+def test_text_only_columns():
+    # Columnas ya de texto (como las de un CSV): camino sin conversión por valor
+    data = [(str(index), f" 55-{index:08d} ", ' Activo ', '', f"{index} MB", 'TELCEL') for index in range(500)]
+    assert_same(data)
+
+def test_random_mix():
+    rng = random.Random(0)
+    data = [
+        (
+            rng.choice(numbers), rng.choice(numbers), rng.choice(statuses), rng.choice(statuses),
+            rng.choice(consumos), rng.choice(['TELCEL', 'MOVISTAR'])
+        )
+        for _ in range(20000)
+    ]
+    assert_same(data)
+
+def test_empty():
+    assert_same([])
@@ -0,0 +1,84 @@
+"""Historial incremental (history.stage_snapshot / apply_snapshot / changes_since) sobre 'sims'."""
+import pytest
+
+from sims_plataformas.history import apply_snapshot, apply_snapshot_if_newer, changes_since, open_history, stage_snapshot
+
+def sim(iccid, estado='activa', compania='TELCEL', telefono=None):
+    return (iccid, telefono or f"55{iccid}", estado, None, None, compania)
+
+def apply(conn, snapshot_date, rows):
+    stage_snapshot(conn, 'sims', rows)
+    return apply_snapshot(conn, 'sims', snapshot_date)
+
+def versions(conn):
+    return conn.execute(
+        "SELECT ICCID, ESTADO_DEL_SIM, valid_from, valid_to FROM sims ORDER BY ICCID, valid_from"
+    ).fetchall()
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = open_history(str(tmp_path / 'historial.db'))
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def day_two(conn):
+    apply(conn, '2024-05-01', [sim('1'), sim('2'), sim('3'), sim('4', compania='MOVISTAR')])
+    # Solo TELCEL: '1' igual, '2' cambia, '3' desaparece, '5' es nuevo; '4' (MOVISTAR) no viene
+    return apply(conn, '2024-05-02', [sim('1'), sim('2', 'suspendida'), sim('5')])
+
+def test_new_changed_unchanged_and_removed(conn, day_two):
+    assert day_two == {'nuevos': 1, 'modificados': 1, 'sin_cambios': 1, 'eliminados': 1}
+    assert versions(conn) == [
+        ('1', 'activa', '2024-05-01', None),
+        ('2', 'activa', '2024-05-01', '2024-05-02'),
+        ('2', 'suspendida', '2024-05-02', None),
+        ('3', 'activa', '2024-05-01', '2024-05-02'),
+        ('4', 'activa', '2024-05-01', None),
+        ('5', 'activa', '2024-05-02', None)
+    ]
+
+def test_only_scopes_in_the_snapshot_are_closed(conn, day_two):
+    # Una foto solo de MOVISTAR sin el '4' lo da de baja y no toca las SIMs de TELCEL
+    stats = apply(conn, '2024-05-03', [sim('6', compania='MOVISTAR')])
+    assert stats == {'nuevos': 1, 'modificados': 0, 'sin_cambios': 0, 'eliminados': 1}
+    open_iccids = [iccid for (iccid,) in conn.execute("SELECT ICCID FROM sims WHERE valid_to IS NULL ORDER BY ICCID")]
+    assert open_iccids == ['1', '2', '5', '6']
+
+def test_changes_since(conn, day_two):
+    changes = changes_since(conn, 'sims', '2024-05-01')
+    assert sorted(zip(changes['Cambio'], changes['ICCID'], changes['ESTADO_DEL_SIM'])) == [
+        ('eliminado', '3', 'activa'), ('modificado', '2', 'suspendida'), ('nuevo', '5', 'activa')
+    ]
+    assert changes_since(conn, 'sims', '2024-05-02').empty
+
+def test_same_day_snapshot_replaces_the_day(conn, day_two):
+    # Segunda foto del día: '2' vuelve a cambiar y '5' ya no viene
+    stats = apply(conn, '2024-05-02', [sim('1'), sim('2', 'baja')])
+    assert stats == {'nuevos': 0, 'modificados': 1, 'sin_cambios': 1, 'eliminados': 1}
+    assert versions(conn) == [
+        ('1', 'activa', '2024-05-01', None),
+        ('2', 'activa', '2024-05-01', '2024-05-02'),
+        ('2', 'baja', '2024-05-02', None),
+        ('3', 'activa', '2024-05-01', '2024-05-02'),
+        ('4', 'activa', '2024-05-01', None)
+    ]
+    assert conn.execute("SELECT COUNT(*) FROM sims WHERE valid_from = valid_to").fetchone()[0] == 0
+    changes = changes_since(conn, 'sims', '2024-05-01')
+    assert sorted(zip(changes['Cambio'], changes['ICCID'])) == [('eliminado', '3'), ('modificado', '2')]
+
+def test_null_keys_and_repeated_keys(conn):
+    # Una clave sin teléfono coincide consigo misma (IS) y una clave repetida conserva la primera
+    no_phone = ('7', None, 'activa', None, None, 'TELCEL')
+    assert apply(conn, '2024-05-01', [no_phone, sim('8'), sim('8', 'baja')])['nuevos'] == 2
+    assert apply(conn, '2024-05-02', [no_phone, sim('8')]) == {
+        'nuevos': 0, 'modificados': 0, 'sin_cambios': 2, 'eliminados': 0
+    }
+
+def test_older_snapshot_is_rejected(conn, day_two):
+    stage_snapshot(conn, 'sims', [sim('1', 'baja')])
+    with pytest.raises(ValueError):
+        apply_snapshot(conn, 'sims', '2024-04-30')
+    stage_snapshot(conn, 'sims', [sim('1', 'baja')])
+    assert apply_snapshot_if_newer(conn, 'sims', '2024-04-30') is None
+    assert conn.execute("SELECT COUNT(*) FROM sims WHERE ESTADO_DEL_SIM = 'baja'").fetchone()[0] == 0
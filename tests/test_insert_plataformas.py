@@ -0,0 +1,82 @@
+"""Paridad de la inserción por lotes de plataformas (bulk_insert_data_plataformas) con la inserción
+con un execute por fila que reemplazó (bench._insert_row_wise)."""
+import random
+from datetime import datetime
+
+from sims_plataformas.bench import _insert_row_wise
+from sims_plataformas.plataformas import bulk_insert_data_plataformas, columns_plataformas, create_database_plataformas
+from sims_plataformas.storage import connect
+
+def make_record(nombre, cliente, telefono, origen='Wialon'):
+    values = dict.fromkeys(columns_plataformas)
+    values.update(Nombre=nombre, Cliente_Cuenta=cliente, Telefono=telefono, Origen=origen, Fecha_Archivo='2024-05-03')
+    return tuple(values[column] for column in columns_plataformas)
+
+def insert_both(tmp_path, batches):
+    results = []
+    for name, insert in (('lotes', bulk_insert_data_plataformas), ('filas', _insert_row_wise)):
+        db_path = str(tmp_path / f"{name}.db")
+        create_database_plataformas(db_path)
+        conn = connect(db_path)
+        try:
+            outcome = [insert(conn, batch) for batch in batches]
+            # Los rowids pueden tener huecos donde se ignoró un duplicado: se compara el orden
+            rows = conn.execute("SELECT * FROM datos ORDER BY rowid").fetchall()
+        finally:
+            conn.close()
+        results.append((outcome, rows))
+    return results
+
+def assert_same(tmp_path, batches):
+    batched, row_wise = insert_both(tmp_path, batches)
+    assert batched == row_wise
+
+def test_no_duplicates(tmp_path):
+    assert_same(tmp_path, [[make_record(f"U{index}", 'C1', f"55{index:08d}") for index in range(300)]])
+
+def test_duplicates_in_batch_and_against_table(tmp_path):
+    first = [make_record(f"U{index}", 'C1', f"55{index:08d}") for index in range(100)]
+    second = [make_record(f"U{index}", 'C1', f"55{index:08d}", origen='ADAS') for index in range(50, 150)]
+    second += second[:10]
+    assert_same(tmp_path, [first, second])
+
+def test_null_keys_never_collide(tmp_path):
+    batch = [make_record(None, 'C1', '5500000001')] * 3 + [make_record('U1', 'C1', None)] * 2
+    assert_same(tmp_path, [batch, batch])
+
+def test_excel_values_compared_as_stored(tmp_path):
+    # Un número del Excel se guarda como texto (afinidad TEXT): 123 y '123' son la misma clave
+    batch = [
+        make_record(123, 'C1', '5500000001'), make_record('123', 'C1', '5500000001'),
+        make_record(12.5, 7, '5500000002'), make_record('12.5', '7', '5500000002'),
+        make_record(datetime(2024, 5, 3), 'C1', '5500000003'), make_record(True, 'C1', '5500000004')
+    ]
+    assert_same(tmp_path, [batch])
+
+def test_random_mix(tmp_path):
+    rng = random.Random(0)
+    keys = [None, '', 'U1', 'U2', 1, 2, 2.0, 'C1']
+    batches = [
+        [make_record(rng.choice(keys), rng.choice(keys), rng.choice(['5500000001', '5500000002', None])) for _ in range(400)]
+        for _ in range(3)
+    ]
+    assert_same(tmp_path, batches)
+
+def test_rowids_of_inserted_rows(tmp_path):
+    db_path = str(tmp_path / 'datos.db')
+    create_database_plataformas(db_path)
+    conn = connect(db_path)
+    try:
+        bulk_insert_data_plataformas(conn, [make_record('U1', 'C1', '1'), make_record('U2', 'C1', '2')])
+        rowids = []
+        inserted, _ = bulk_insert_data_plataformas(
+            conn, [make_record('U2', 'C1', '2'), make_record('U3', 'C1', '3'), make_record('U4', 'C1', '4')],
+            rowids=rowids
+        )
+        expected = [
+            rowid for (rowid,) in conn.execute("SELECT rowid FROM datos WHERE Nombre IN ('U3', 'U4') ORDER BY rowid")
+        ]
+    finally:
+        conn.close()
+    assert [record[0] for record in inserted] == ['U3', 'U4']
+    assert rowids == expected
@@ -0,0 +1,53 @@
+"""Normalización del ICCID de plataformas al conciliar con 'sims' (reconcile._prepare_script): se
+quita una sola 'F' final, también en minúscula."""
+from sims_plataformas.plataformas import create_database_plataformas
+from sims_plataformas.reconcile import reconcile_databases
+from sims_plataformas.sims import create_database_sims
+from sims_plataformas.storage import connect
+
+# ICCID de 18 dígitos: con 19 o más la 'F' quedaría fuera de los iccid_key_digits comparados
+sim_iccids = ['895200000000000001', '895200000000000002', '895200000000000003', '895200000000000004']
+platform_iccids = {
+    'una_f': '895200000000000001F',
+    'dos_f': '895200000000000002FF',
+    'f_minuscula': '895200000000000003f',
+    'f_intermedia': '8952000000000F00004'
+}
+
+def reconcile(tmp_path):
+    plataformas_db = str(tmp_path / 'plataformas.db')
+    sims_db = str(tmp_path / 'sims.db')
+    create_database_plataformas(plataformas_db)
+    create_database_sims(sims_db)
+    conn = connect(plataformas_db)
+    with conn:
+        conn.executemany(
+            "INSERT INTO datos (Nombre, Cliente_Cuenta, ICCID, Origen) VALUES (?, 'C1', ?, 'Wialon')",
+            platform_iccids.items()
+        )
+    conn.close()
+    conn = connect(sims_db)
+    with conn:
+        # Teléfonos que no coinciden con los de plataformas (sin teléfono): se cruza solo por ICCID
+        conn.executemany(
+            "INSERT INTO sims (ICCID, TELEFONO, ESTADO_DEL_SIM, Compania) VALUES (?, ?, 'activa', 'TELCEL')",
+            [(iccid, f"55000000{index:02d}") for index, iccid in enumerate(sim_iccids)]
+        )
+    conn.close()
+    return reconcile_databases(plataformas_db, sims_db)
+
+def test_single_trailing_f_is_stripped(tmp_path):
+    reports = reconcile(tmp_path)
+    unmatched = set(reports['dispositivos_sin_sim']['Nombre'])
+    assert 'una_f' not in unmatched
+    assert 'f_minuscula' not in unmatched
+
+def test_only_one_f_is_stripped(tmp_path):
+    reports = reconcile(tmp_path)
+    assert 'dos_f' in set(reports['dispositivos_sin_sim']['Nombre'])
+    assert '895200000000000002' in set(reports['sims_sin_plataforma']['ICCID'])
+
+def test_f_inside_the_iccid_is_kept(tmp_path):
+    reports = reconcile(tmp_path)
+    assert 'f_intermedia' in set(reports['dispositivos_sin_sim']['Nombre'])
+    assert set(reports['sims_sin_plataforma']['ICCID']) == {'895200000000000002', '895200000000000004'}
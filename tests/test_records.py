@@ -0,0 +1,24 @@
+"""Columnas 'category' de records.RecordStore con nulos de pandas (NaN, NaT, pd.NA) además de None."""
+import math
+
+import pandas as pd
+
+from sims_plataformas.records import RecordStore
+
+def test_nan_is_a_null_category():
+    store = RecordStore(['Origen', 'Grupo'], {'Origen': 'category', 'Grupo': 'category'})
+    # Cada float('nan') es un objeto distinto: ninguno debe volverse una categoría
+    store.extend([('Wialon', float('nan')), (float('nan'), 'G1'), (None, math.nan)])
+    store.extend([('Wialon', pd.NA), (pd.NaT, 'G1')])
+    frame = store.to_frame()
+    assert list(frame['Origen'].cat.categories) == ['Wialon']
+    assert list(frame['Grupo'].cat.categories) == ['G1']
+    assert frame['Origen'].isna().tolist() == [False, True, True, False, True]
+    assert frame['Grupo'].isna().tolist() == [True, False, True, True, False]
+    assert list(store) == [('Wialon', None), (None, 'G1'), (None, None), ('Wialon', None), (None, 'G1')]
+
+def test_nan_does_not_change_the_column_type():
+    store = RecordStore(['Cliente_Cuenta'], {'Cliente_Cuenta': 'category'})
+    store.extend([('C1',), (float('nan'),), ('C2',)])
+    assert store.kinds == ['category']
+    assert store.to_frame()['Cliente_Cuenta'].tolist()[::2] == ['C1', 'C2']
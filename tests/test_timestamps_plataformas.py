@@ -0,0 +1,74 @@
+"""Fechas normalizadas de plataformas (timestamp_epochs_plataformas): formatos mezclados, valores
+vacíos o inválidos y los formatos detectados que una carga comparte entre lotes."""
+from calendar import timegm
+from datetime import datetime
+
+from sims_plataformas.plataformas import (
+    columns_plataformas, epoch_columns_plataformas, timestamp_columns_plataformas, timestamp_epochs_plataformas
+)
+
+activacion = epoch_columns_plataformas.index(timestamp_columns_plataformas['Fecha_de_Activacion'])
+ultima_actividad = len(epoch_columns_plataformas) - 1
+
+def make_record(fecha, origen='Wialon', mensaje=None, reporte=None):
+    values = dict.fromkeys(columns_plataformas)
+    values.update(
+        Nombre='U1', Origen=origen, Fecha_de_Activacion=fecha,
+        Hora_de_Ultimo_Mensaje=mensaje, Ultimo_Reporte=reporte
+    )
+    return tuple(values[column] for column in columns_plataformas)
+
+def epoch(*parts):
+    # Hora local de la plataforma tal como viene, sin zona horaria
+    return timegm(datetime(*parts).timetuple())
+
+def activations(fechas, detected_formats=None, origen='Wialon'):
+    epochs = timestamp_epochs_plataformas([make_record(fecha, origen) for fecha in fechas], detected_formats)
+    return [row[activacion] for row in epochs]
+
+def test_mixed_formats_in_one_column():
+    assert activations([
+        '2024-05-03', '2024-05-03 10:15:30', '15.05.2024 08:30', '25/12/2024', '25/12/2024 07:05',
+        ' 2024-01-15 ', datetime(2024, 5, 3, 10)
+    ]) == [
+        epoch(2024, 5, 3), epoch(2024, 5, 3, 10, 15, 30), epoch(2024, 5, 15, 8, 30), epoch(2024, 12, 25),
+        epoch(2024, 12, 25, 7, 5), epoch(2024, 1, 15), epoch(2024, 5, 3, 10)
+    ]
+
+def test_blank_and_invalid_dates():
+    assert activations([None, '', '   ', 'sin fecha', '31/02/2024', '2024-05-03']) == [
+        None, None, None, None, None, epoch(2024, 5, 3)
+    ]
+    assert activations([None, None]) == [None, None]
+
+def test_ambiguous_day_month_is_left_empty():
+    # Sin ningún texto que decida el orden solo vale la fecha que es igual en ambos
+    assert activations(['03/05/2024', '04/06/2024', '05/05/2024']) == [None, None, epoch(2024, 5, 5)]
+
+def test_last_activity_is_the_latest():
+    epochs = timestamp_epochs_plataformas([
+        make_record(None, mensaje='2024-05-03 10:00:00', reporte='2024-05-04'),
+        make_record(None, mensaje='2024-05-05', reporte=None),
+        make_record(None)
+    ])
+    assert [row[ultima_actividad] for row in epochs] == [epoch(2024, 5, 4), epoch(2024, 5, 5), None]
+
+def test_detected_formats_carry_over_between_batches():
+    detected_formats = {}
+    assert activations(['25/12/2024'], detected_formats) == [epoch(2024, 12, 25)]
+    assert detected_formats[('Wialon', 'Fecha_de_Activacion')] == ['%d/%m/%Y']
+    # El lote siguiente ya no es ambiguo: usa el orden día/mes elegido en el primero
+    assert activations(['03/05/2024'], detected_formats) == [epoch(2024, 5, 3)]
+    # y nunca elige el orden contrario
+    assert activations(['12/25/2024'], detected_formats) == [None]
+    # Sin los formatos del lote anterior el mismo texto es ambiguo
+    assert activations(['03/05/2024'], {}) == [None]
+
+def test_detected_formats_are_per_platform():
+    detected_formats = {}
+    activations(['25/12/2024'], detected_formats, origen='Wialon')
+    assert activations(['12/25/2024', '03/05/2024'], detected_formats, origen='ADAS') == [
+        epoch(2024, 12, 25), epoch(2024, 3, 5)
+    ]
+    assert detected_formats[('ADAS', 'Fecha_de_Activacion')] == ['%m/%d/%Y']
+    assert detected_formats[('Wialon', 'Fecha_de_Activacion')] == ['%d/%m/%Y']
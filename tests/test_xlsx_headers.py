@@ -0,0 +1,113 @@
+"""Paridad de la lectura de encabezados directa del XML (sims._xlsx_first_rows) con openpyxl en modo
+solo lectura (iter_rows(max_row=1)), que es como se leen los encabezados si falla la primera."""
+import io
+import zipfile
+from datetime import date, datetime, time
+
+import openpyxl
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+
+from sims_plataformas.sims import _xlsx_first_rows
+
+main_ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+def openpyxl_headers(content):
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        return {
+            sheet_name: [col if col else "" for col in next(workbook[sheet_name].iter_rows(max_row=1, values_only=True), ())]
+            for sheet_name in workbook.sheetnames
+        }
+    finally:
+        workbook.close()
+
+def save(workbook):
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def rewrite(content, parts):
+    # Reemplaza o agrega partes del paquete: openpyxl no escribe el valor calculado de las
+    # fórmulas y guarda los textos en línea, sin tabla de textos compartidos
+    source = zipfile.ZipFile(io.BytesIO(content))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as target:
+        for item in source.infolist():
+            if item.filename not in parts:
+                target.writestr(item, source.read(item))
+        for name, data in parts.items():
+            target.writestr(name, data)
+    return buffer.getvalue()
+
+def with_shared_strings(content, sheet_xml, strings):
+    source = zipfile.ZipFile(io.BytesIO(content))
+    items = "".join(f"<si><t>{text}</t></si>" for text in strings)
+    return rewrite(content, {
+        'xl/worksheets/sheet1.xml': sheet_xml,
+        # Con otro nombre que el de Excel: se llega a ella por la relación del libro
+        'xl/textos.xml': f'<sst xmlns="{main_ns}" count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>',
+        'xl/_rels/workbook.xml.rels': source.read('xl/_rels/workbook.xml.rels').decode().replace(
+            '</Relationships>',
+            '<Relationship Id="rIdTextos" Target="textos.xml" Type="http://schemas.openxmlformats.org/'
+            'officeDocument/2006/relationships/sharedStrings"/></Relationships>'
+        ),
+        '[Content_Types].xml': source.read('[Content_Types].xml').decode().replace(
+            '</Types>',
+            '<Override PartName="/xl/textos.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>'
+        )
+    })
+
+def assert_same(content):
+    assert _xlsx_first_rows(io.BytesIO(content)) == openpyxl_headers(content)
+
+def test_values_dates_and_empty_leading_cells():
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'Telcel'
+    # C1 y D1 vacías entre valores; A1 vacía al inicio
+    sheet['B1'] = 'ICCID'
+    sheet['E1'] = datetime(2024, 5, 3, 14, 30)
+    sheet['F1'] = date(2024, 5, 3)
+    sheet['G1'] = time(8, 15)
+    sheet['H1'] = 12
+    sheet['I1'] = 1.5
+    sheet['J1'] = True
+    sheet['K1'] = 0
+    sheet['L1'] = '=1+1'
+    sheet['B2'] = 'no es encabezado'
+    sheet['M2'] = 'amplía la dimensión'
+    sheet['H1'].number_format = '0.00%'
+    assert_same(save(workbook))
+
+def test_sheet_without_row_one_and_empty_sheet():
+    workbook = openpyxl.Workbook()
+    workbook.active.title = 'Datos'
+    workbook.active['A1'] = 'TELEFONO'
+    workbook.create_sheet('Sin fila 1')['B3'] = 'ICCID'
+    workbook.create_sheet('Vacía')
+    assert_same(save(workbook))
+
+def test_1904_calendar():
+    workbook = openpyxl.Workbook()
+    workbook.epoch = CALENDAR_MAC_1904
+    workbook.active['A1'] = datetime(2024, 5, 3)
+    workbook.active['B1'] = 'ICCID'
+    assert_same(save(workbook))
+
+def test_inline_and_shared_strings_and_formulas():
+    workbook = openpyxl.Workbook()
+    workbook.active['A1'] = 'se reemplaza'
+    sheet_xml = (
+        f'<worksheet xmlns="{main_ns}"><dimension ref="A1:G2"/><sheetData>'
+        '<row r="1">'
+        '<c r="B1" t="s"><v>1</v></c>'
+        '<c r="C1" t="inlineStr"><is><t>ICCID</t></is></c>'
+        '<c r="D1" t="inlineStr"><is><r><t>TELE</t></r><r><t xml:space="preserve">FONO </t></r></is></c>'
+        '<c r="E1" t="str"><f>UPPER("compania")</f><v>COMPANIA</v></c>'
+        '<c r="F1"><f>1+1</f><v>2</v></c>'
+        '</row>'
+        '<row r="2"><c r="A2" t="s"><v>2</v></c></row>'
+        '</sheetData></worksheet>'
+    )
+    assert_same(with_shared_strings(save(workbook), sheet_xml, ['cero', 'ESTADO', 'no es encabezado']))